@@ -50,6 +50,15 @@ receivers:
       load:
       network:
       processes:
+  prometheus:
+    config:
+      scrape_configs:
+        # Stage latency histograms, error and cache counters from the bot's /metrics route
+        - job_name: polybot
+          scrape_interval: 15s
+          metrics_path: /metrics
+          static_configs:
+            - targets: ["localhost:8443"]
 
 exporters:
   prometheus:
@@ -61,7 +70,7 @@ exporters:
 service:
   pipelines:
     metrics:
-      receivers: [hostmetrics]
+      receivers: [hostmetrics, prometheus]
       exporters: [prometheus]
   telemetry:
     logs:
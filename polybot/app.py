@@ -1,7 +1,16 @@
 import flask
 from flask import request
 import os
-from polybot.bot import Bot, ImageProcessingBot
+import sys
+import atexit
+import signal
+from polybot.bot import Bot, ImageProcessingBot, WEBHOOK_REGISTRATION, estimate_cost
+from polybot.job_queue import JobQueue
+from polybot.scheduler import FairScheduler, build_chat_limits
+from polybot.media_group import MediaGroupCollector, build_media_group_store
+from polybot.filter_pool import FilterPool
+from polybot.cache import ResultCache, PredictionCache
+from polybot import metrics
 #from bot import Bot, QuoteBot, ImagessProcesssssingBotddddddd
 #S3 update 1 1
 app = flask.Flask(__name__)
@@ -9,6 +18,27 @@ app = flask.Flask(__name__)
 TELEGRAM_BOT_TOKEN = os.environ['TELEGRAM_BOT_TOKEN']
 BOT_APP_URL = "https://khaled.fursa.click"
 # BOT_APP_URL = os.environ['BOT_APP_URL']
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', 100))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+# Seconds shutdown() waits for the queued updates, then again for the S3 uploads they queued
+JOB_DRAIN_TIMEOUT = float(os.getenv('JOB_DRAIN_TIMEOUT', 60))
+# Take turns between chats and rate limit each of them by the estimated cost of its photos,
+# 0 runs the updates in arrival order. SCHEDULER_STORE=sqlite shares the limits between worker processes.
+FAIR_SCHEDULING = os.getenv('FAIR_SCHEDULING', '1') == '1'
+# Number of filter worker processes, 0 runs the filters in the webhook worker threads.
+# Under gunicorn this is the total for the host, split between the worker processes.
+FILTER_WORKERS = int(os.getenv('FILTER_WORKERS', os.cpu_count() or 1))
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 1024))
+# Optional directory for the on-disk result cache tier
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR')
+PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', 3600))
+BUSY_MESSAGE = "The bot is busy right now, please try again later."
+
+# Built per process by init_worker(), by __main__ here or by gunicorn's post_fork hook
+bot = None
+job_queue = None
+filter_pool = None
+media_groups = None
 
 
 @app.route('/', methods=['GET'])
@@ -16,13 +46,96 @@ def index():
     return 'Ok'
 
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    # 503 until the bot is built and the Telegram webhook points at it, for health checks and rolling deploys
+    if bot is None or not bot.webhook_ready.is_set():
+        return 'Starting', 503
+    return 'Ok'
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Scraped by the OpenTelemetry collector, see otelcol-config.yaml
+    body, content_type = metrics.render()
+    return flask.Response(body, content_type=content_type)
+
+
 @app.route(f'/{TELEGRAM_BOT_TOKEN}/', methods=['POST'])
 def webhook():
     req = request.get_json()
-    bot.handle_message(req['message'])
+    msg = req['message']
+    # The photos of an album are collected first and queued together as one job
+    if media_groups is not None and media_groups.add(msg):
+        return 'Ok'
+    # Reply to Telegram right away, the update is handled by the job queue workers
+    submit(msg)
     return 'Ok'
 
 
+def submit(msg):
+    if not job_queue.submit(msg) and 'chat' in msg:
+        bot.send_text(msg['chat']['id'], BUSY_MESSAGE)
+
+
+def init_worker(webhook_registration=WEBHOOK_REGISTRATION, filter_workers=FILTER_WORKERS):
+    """
+    Build the bot, its job queue and filter pool for this process
+
+    Parameters:
+    webhook_registration (str): 'background', 'sync' or 'skip', see polybot.bot.
+                                Worker processes of one host take turns through WEBHOOK_LOCK_PATH,
+                                only the first sets the webhook and the others find it set.
+    filter_workers (int): Filter processes of this worker, 0 runs the filters in its threads
+    """
+    global bot, job_queue, filter_pool, media_groups
+    filter_pool = FilterPool(filter_workers) if filter_workers > 0 else None
+    result_cache = ResultCache(max_entries=RESULT_CACHE_SIZE, disk_dir=RESULT_CACHE_DIR)
+    prediction_cache = PredictionCache(ttl=PREDICTION_CACHE_TTL)
+    bot = ImageProcessingBot(TELEGRAM_BOT_TOKEN, BOT_APP_URL, filter_pool=filter_pool, result_cache=result_cache,
+                             prediction_cache=prediction_cache, webhook_registration=webhook_registration)
+    job_queue = build_job_queue(bot)
+    media_groups = MediaGroupCollector(submit, store=build_media_group_store())
+
+
+def build_job_queue(bot, max_size=JOB_QUEUE_SIZE, workers=JOB_WORKERS):
+    """The queue the webhook hands updates to, see FAIR_SCHEDULING"""
+    if FAIR_SCHEDULING:
+        return FairScheduler(bot.handle_message, key=chat_key, cost=estimate_cost, max_size=max_size,
+                             workers=workers, name='webhook', limits=build_chat_limits(), position=message_position)
+    return JobQueue(bot.handle_message, max_size=max_size, workers=workers, name='webhook')
+
+
+def chat_key(msg):
+    return msg.get('chat', {}).get('id')
+
+
+def message_position(msg):
+    # Telegram numbers the messages of a chat in the order they were sent
+    return msg.get('message_id', 0)
+
+
+def shutdown():
+    """
+    Queue the albums being collected, drain the queued updates and the pending S3 uploads, stop the filter pool.
+    Each drain waits up to JOB_DRAIN_TIMEOUT, so this takes at most twice that.
+    """
+    if media_groups is not None:
+        media_groups.flush_all()
+    if job_queue:
+        job_queue.shutdown(JOB_DRAIN_TIMEOUT)
+    if bot:
+        bot.archiver.shutdown(JOB_DRAIN_TIMEOUT)
+    if filter_pool:
+        filter_pool.shutdown()
+
+
 if __name__ == "__main__":
-    bot = ImageProcessingBot(TELEGRAM_BOT_TOKEN,"https://khaled.fursa.click")
-    app.run(host='0.0.0.0', port=8443)
\ No newline at end of file
+    # Flask's development server, one process. Production runs gunicorn with polybot/gunicorn.conf.py.
+    init_worker()
+
+    # Drain queued updates on shutdown, SIGTERM is turned into a normal exit so atexit runs
+    atexit.register(shutdown)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    app.run(host='0.0.0.0', port=8443)
@@ -0,0 +1,90 @@
+"""
+Benchmark image decode/encode: the Pillow codec against the original matplotlib imread/imsave path
+
+Reports decode and encode throughput in megapixels per second and the encoded output size,
+for the image at full size and upscaled to larger photo sizes. Pillow is also timed with
+draft-mode decoding down to a quarter of the size.
+
+Usage:
+    python -m polybot.benchmarks.bench_codec [--image photo.jpg] [--scales 1 2 4] [--repeat 5] [--json results.json]
+"""
+import argparse
+import io
+import json
+import os
+import time
+from PIL import Image
+from polybot.codec import MatplotlibCodec, PillowCodec
+from polybot.img_proc import rgb2gray
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test', 'beatles.jpeg')
+
+
+def make_photo(path, scale):
+    with Image.open(path) as image:
+        image = image.convert('RGB')
+        if scale != 1:
+            image = image.resize((image.width * scale, image.height * scale), Image.BICUBIC)
+        buffer = io.BytesIO()
+        image.save(buffer, format='jpeg', quality=90)
+        return buffer.getvalue(), image.width * image.height
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench(name, codec, photo, pixel_count, repeat, max_size=None):
+    decode_s, rgb = best_of(repeat, lambda: codec.decode(photo, 'jpeg', max_size))
+    pixels = rgb2gray(rgb)
+    encode_s, encoded = best_of(repeat, lambda: codec.encode(pixels, 'jpeg'))
+
+    return {
+        'codec': name,
+        'megapixels': pixel_count / 1e6,
+        'decode_mp_s': pixel_count / 1e6 / decode_s,
+        'encode_mp_s': pixels.size / 1e6 / encode_s,
+        'output_kb': len(encoded) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default=DEFAULT_IMAGE, help='source photo')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 2, 4], help='upscale factors of the photo')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, the best is kept')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    pillow = PillowCodec()
+    matplotlib = MatplotlibCodec()
+
+    results = []
+    for scale in args.scales:
+        photo, pixel_count = make_photo(args.image, scale)
+        with Image.open(io.BytesIO(photo)) as image:
+            draft_size = (image.width // 4, image.height // 4)
+
+        runs = [
+            bench('matplotlib', matplotlib, photo, pixel_count, args.repeat),
+            bench('pillow', pillow, photo, pixel_count, args.repeat),
+            bench('pillow-draft-1/4', pillow, photo, pixel_count, args.repeat, max_size=draft_size),
+        ]
+        for result in runs:
+            results.append(result)
+            print(f"{result['codec']:>17} {result['megapixels']:6.1f} MP  decode {result['decode_mp_s']:7.1f} MP/s  "
+                  f"encode {result['encode_mp_s']:7.1f} MP/s  output {result['output_kb']:8.1f} KB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark S3 transfers against a local moto server
+
+Compares boto3's default transfer settings with the tuned TransferConfig of the bot, for single
+objects of increasing size and for a batch of photo-sized objects moved one by one vs concurrently.
+
+Usage:
+    pip install 'moto[server]'
+    python -m polybot.benchmarks.bench_s3_transfer [--sizes-mb 1 8 32] [--batch 32] [--json results.json]
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import time
+import boto3
+from boto3.s3.transfer import TransferConfig
+from polybot.s3_transfer import MB, BatchTransfer, build_client_config, build_transfer_config
+
+BUCKET = 'polybot-bench'
+
+
+def start_stand_in():
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        raise SystemExit("moto is required for this benchmark: pip install 'moto[server]'")
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    client = boto3.client('s3', region_name='us-east-1', endpoint_url=f'http://{host}:{port}', config=build_client_config())
+    client.create_bucket(Bucket=BUCKET)
+    return server, client
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_single(client, size_mb, name, config):
+    data = os.urandom(size_mb * MB)
+    key = f'single/{name}/{size_mb}mb'
+
+    upload = timed(lambda: client.upload_fileobj(io.BytesIO(data), BUCKET, key, Config=config))
+    download = timed(lambda: client.download_fileobj(BUCKET, key, io.BytesIO(), Config=config))
+
+    return {
+        'config': name,
+        'size_mb': size_mb,
+        'upload_mb_s': size_mb / upload,
+        'download_mb_s': size_mb / download,
+    }
+
+
+def bench_batch(client, count, photo_kb, config):
+    photos = [(os.urandom(photo_kb * 1024), f'batch/{i}.jpg') for i in range(count)]
+
+    sequential = timed(lambda: [client.upload_fileobj(io.BytesIO(data), BUCKET, key, Config=config) for data, key in photos])
+
+    batch = BatchTransfer(client, BUCKET, config)
+    concurrent = timed(lambda: batch.upload_many(photos))
+    concurrent_download = timed(lambda: batch.download_many([key for _, key in photos]))
+    batch.shutdown()
+
+    return {
+        'objects': count,
+        'object_kb': photo_kb,
+        'sequential_upload_s': sequential,
+        'batch_upload_s': concurrent,
+        'batch_download_s': concurrent_download,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--batch', type=int, default=32, help='objects in the batch benchmark')
+    parser.add_argument('--photo-kb', type=int, default=300, help='size of each batch object')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    server, client = start_stand_in()
+    configs = {'boto3-default': TransferConfig(), 'tuned': build_transfer_config()}
+
+    try:
+        results = {'single': [], 'batch': None}
+        for size_mb in args.sizes_mb:
+            for name, config in configs.items():
+                result = bench_single(client, size_mb, name, config)
+                results['single'].append(result)
+                print(f"{name:>14} {size_mb:>4} MB  upload {result['upload_mb_s']:8.1f} MB/s  "
+                      f"download {result['download_mb_s']:8.1f} MB/s")
+
+        results['batch'] = bench_batch(client, args.batch, args.photo_kb, configs['tuned'])
+        batch = results['batch']
+        print(f"{batch['objects']} x {batch['object_kb']} KB  sequential upload {batch['sequential_upload_s']:.2f}s  "
+              f"batch upload {batch['batch_upload_s']:.2f}s  batch download {batch['batch_download_s']:.2f}s")
+    finally:
+        server.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
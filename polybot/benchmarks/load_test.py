@@ -0,0 +1,343 @@
+"""
+Load test the webhook end to end with synthetic Telegram updates
+
+Runs app.py's Flask app with the real ImageProcessingBot and job queue. Telegram, S3 and the
+YOLO service are replaced by local stand-ins. Updates modeled on the test messages (photos with
+every caption, concat pairs, predict and plain text) are posted to the webhook at the given
+concurrency. The latency of an update runs from the webhook POST to the bot's last reply in
+that chat. Reports throughput and p50/p95/p99 latency per filter, plus the mean of every stage
+recorded in polybot.metrics.
+
+Usage:
+    pip install 'moto[server]'
+    python -m polybot.benchmarks.load_test [--requests 200] [--concurrency 16] [--mix blur predict text]
+                                           [--job-workers 4] [--yolo-delay 0.2] [--json /tmp/load.json]
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import requests
+from loguru import logger
+from PIL import Image
+from polybot.benchmarks.bench_s3_transfer import BUCKET, start_stand_in
+
+TOKEN = '123456:load-test'
+DEFAULT_PHOTO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test', 'beatles.jpeg')
+CAPTIONS = {
+    'blur': 'Blur 16',
+    'contour': 'Contour',
+    'rotate': 'Rotate 2',
+    'segment': 'Segment 100',
+    'salt and pepper': 'Salt and pepper',
+    'flip': 'Flip vertical',
+    'chain': 'Blur 8 | Contour | Segment 100',
+    'concat': 'Concat',
+    'predict': 'Predict',
+}
+KINDS = (*CAPTIONS, 'text')
+# Sides of the smaller sizes Telegram keeps next to the original photo
+THUMBNAIL_SIDES = (90, 320, 800, 1280)
+
+
+class TelegramStandIn(ThreadingHTTPServer):
+    """
+    Just enough of the Bot API, Telegram's file storage and the YOLO service for the bot to run
+
+    Every reply the bot sends is recorded per chat with the time it arrived.
+    """
+    daemon_threads = True
+
+    def __init__(self, photo, yolo_delay=0.0):
+        super().__init__(('127.0.0.1', 0), _StandInHandler)
+        self.sizes = photo_sizes(photo)
+        self.yolo_delay = yolo_delay
+        self.replies = defaultdict(list)
+        self.replied = threading.Condition()
+        self.message_ids = itertools.count(1)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def record(self, chat_id, method, text):
+        with self.replied:
+            self.replies[chat_id].append((time.perf_counter(), method, text))
+            self.replied.notify_all()
+
+    def wait_for_reply(self, chat_id, count, timeout):
+        """Block until the chat got at least `count` replies"""
+        with self.replied:
+            return self.replied.wait_for(lambda: len(self.replies[chat_id]) >= count, timeout)
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def handle_request(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        # Drain the body so keep-alive connections stay usable, telebot sends the files as multipart
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        if url.path.startswith('/file/'):
+            side = int(os.path.splitext(os.path.basename(url.path))[0])
+            data = self.server.sizes[side]['data']
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif url.path == '/predict':
+            time.sleep(self.server.yolo_delay)
+            self.reply_json({'detections': [{'label': 'person', 'confidence': 0.93}, {'label': 'guitar', 'confidence': 0.71}]})
+        else:
+            self.reply_json({'ok': True, 'result': self.bot_api(url.path.rsplit('/', 1)[-1], params)})
+
+    def bot_api(self, method, params):
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'LoadTestBot', 'username': 'load_test_bot'}
+        if method == 'getWebhookInfo':
+            return {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        if method == 'getFile':
+            side = int(params['file_id'].rsplit('-', 1)[-1])
+            size = self.server.sizes[side]
+            return {'file_id': params['file_id'], 'file_unique_id': params['file_id'],
+                    'file_size': len(size['data']), 'file_path': f'photos/{side}.jpg'}
+        if method in ('sendMessage', 'sendPhoto'):
+            chat_id = int(params['chat_id'])
+            self.server.record(chat_id, method, params.get('text', ''))
+            message = {'message_id': next(self.server.message_ids), 'date': int(time.time()),
+                       'chat': {'id': chat_id, 'type': 'private'}}
+            if method == 'sendMessage':
+                message['text'] = params.get('text', '')
+            else:
+                file_id = f'sent-{uuid.uuid4().hex}'
+                message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1, 'height': 1}]
+            return message
+        return True
+
+
+def photo_sizes(path):
+    """
+    Encode the photo at the sizes Telegram would keep of it
+
+    Returns:
+    dict: Longer side -> {'width', 'height', 'data'}, the original is keyed by its own longer side
+    """
+    sizes = {}
+    with Image.open(path) as image:
+        image = image.convert('RGB')
+        longest = max(image.size)
+        for side in [s for s in THUMBNAIL_SIDES if s < longest] + [longest]:
+            scaled = image.copy()
+            scaled.thumbnail((side, side))
+            buffer = io.BytesIO()
+            scaled.save(buffer, format='jpeg', quality=87)
+            sizes[side] = {'width': scaled.width, 'height': scaled.height, 'data': buffer.getvalue()}
+    return sizes
+
+
+def make_update(kind, chat_id, sizes, unique_id):
+    """A Telegram update like mock_msg in test_telegram_bot.py"""
+    message = {
+        'message_id': chat_id,
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Load'},
+        'chat': {'id': chat_id, 'first_name': 'Load', 'type': 'private'},
+        'date': int(time.time()),
+    }
+    if kind == 'text':
+        message['text'] = '/help'
+    else:
+        message['caption'] = CAPTIONS[kind]
+        message['photo'] = [
+            {'file_id': f'{unique_id}-{side}', 'file_unique_id': f'{unique_id}-{side}', 'file_size': len(size['data']),
+             'width': size['width'], 'height': size['height']}
+            for side, size in sorted(sizes.items())
+        ]
+    return {'update_id': chat_id, 'message': message}
+
+
+def percentiles(samples):
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if samples else (0, 0, 0)
+    return {'p50_ms': p50 * 1000, 'p95_ms': p95 * 1000, 'p99_ms': p99 * 1000}
+
+
+def stage_means():
+    """Mean seconds per stage from the bot's own histograms"""
+    from prometheus_client import REGISTRY
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for metric in REGISTRY.collect():
+        if metric.name != 'polybot_stage_seconds':
+            continue
+        for sample in metric.samples:
+            if sample.name.endswith('_sum'):
+                totals[sample.labels['stage']][0] += sample.value
+            elif sample.name.endswith('_count'):
+                totals[sample.labels['stage']][1] += sample.value
+    return {stage: total / count for stage, (total, count) in sorted(totals.items()) if count}
+
+
+def start_app(args, s3_client):
+    """Build the bot and job queue the way app.py does and serve the Flask app on a free port"""
+    from werkzeug.serving import make_server
+    from polybot import app as app_module
+    from polybot.bot import ImageProcessingBot
+    from polybot.filter_pool import FilterPool
+    from polybot.s3_transfer import BatchTransfer
+
+    filter_pool = FilterPool(args.filter_workers) if args.filter_workers > 0 else None
+    bot = ImageProcessingBot(TOKEN, 'https://load.test', filter_pool=filter_pool)
+    bot.s3_client = s3_client
+    bot.batch_transfer = BatchTransfer(s3_client, BUCKET, bot.transfer_config)
+
+    app_module.bot = bot
+    app_module.job_queue = app_module.build_job_queue(bot, max_size=args.queue_size, workers=args.job_workers)
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, app_module, filter_pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='updates to send, a concat pair counts as one')
+    parser.add_argument('--concurrency', type=int, default=16, help='updates posted at the same time')
+    parser.add_argument('--mix', nargs='+', choices=KINDS, default=list(KINDS), help='kinds of updates, sent round robin')
+    parser.add_argument('--photo', default=DEFAULT_PHOTO, help='photo attached to every update')
+    parser.add_argument('--repeat-photos', action='store_true', help='reuse the same file_unique_id so results can be cached')
+    parser.add_argument('--job-workers', type=int, default=4)
+    parser.add_argument('--queue-size', type=int, default=100)
+    parser.add_argument('--filter-workers', type=int, default=0, help='filter worker processes, 0 runs filters in the job workers')
+    parser.add_argument('--yolo-delay', type=float, default=0.2, help='seconds the YOLO stand-in takes per prediction')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds to wait for the bot to finish')
+    parser.add_argument('--log-level', default='WARNING', help="the bot's log level while the test runs")
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    telegram = TelegramStandIn(args.photo, args.yolo_delay)
+    threading.Thread(target=telegram.serve_forever, daemon=True).start()
+    moto_server, s3_client = start_stand_in()
+
+    certificate = tempfile.NamedTemporaryFile(suffix='.crt', delete=False)
+    certificate.close()
+    os.environ.update(TELEGRAM_BOT_TOKEN=TOKEN, TELEGRAM_CERT_PATH=certificate.name,
+                      S3_BUCKET_NAME=BUCKET, YOLO_URL=f'{telegram.url}/predict')
+
+    from telebot import apihelper
+    apihelper.API_URL = telegram.url + '/bot{0}/{1}'
+    apihelper.FILE_URL = telegram.url + '/file/bot{0}/{1}'
+
+    server, app_module, filter_pool = start_app(args, s3_client)
+    webhook_url = f'http://127.0.0.1:{server.server_port}/{TOKEN}/'
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    submitted = {}
+    accept_times = []
+
+    def post(update):
+        start = time.perf_counter()
+        session.post(webhook_url, json=update, timeout=30).raise_for_status()
+        accept_times.append(time.perf_counter() - start)
+        return start
+
+    def run(index):
+        kind = args.mix[index % len(args.mix)]
+        chat_id = 100000 + index
+        unique_id = 'photo' if args.repeat_photos else uuid.uuid4().hex
+        update = make_update(kind, chat_id, telegram.sizes, unique_id)
+        submitted[chat_id] = (kind, post(update))
+        if kind == 'concat':
+            # The second half only makes sense once the first one was stored: greeting + 'First image received'
+            telegram.wait_for_reply(chat_id, 2, args.timeout)
+            post(make_update(kind, chat_id, telegram.sizes, uuid.uuid4().hex))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(run, range(args.requests)))
+
+    app_module.job_queue.shutdown(args.timeout)
+    app_module.bot.archiver.shutdown(args.timeout)
+    if filter_pool:
+        filter_pool.shutdown()
+    server.shutdown()
+    telegram.shutdown()
+    moto_server.stop()
+    os.remove(certificate.name)
+
+    latencies = defaultdict(list)
+    outcomes = defaultdict(lambda: defaultdict(int))
+    finished = started
+    for chat_id, (kind, start) in submitted.items():
+        replies = telegram.replies.get(chat_id)
+        if not replies:
+            outcomes[kind]['unanswered'] += 1
+            continue
+        last_time, method, text = replies[-1]
+        finished = max(finished, last_time)
+        latencies[kind].append(last_time - start)
+        if text.startswith('Error processing image'):
+            outcomes[kind]['errors'] += 1
+        elif text == app_module.BUSY_MESSAGE:
+            outcomes[kind]['busy'] += 1
+
+    elapsed = finished - started
+    results = {
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'elapsed_s': elapsed,
+        'throughput_per_s': sum(map(len, latencies.values())) / elapsed if elapsed else 0,
+        'webhook_accept': percentiles(accept_times),
+        'filters': {
+            kind: {'count': len(latencies[kind]), **percentiles(latencies[kind]), **outcomes[kind]}
+            for kind in sorted({kind for kind, _ in submitted.values()})
+        },
+        'stage_mean_ms': {stage: mean * 1000 for stage, mean in stage_means().items()},
+    }
+
+    print(f"{args.requests} updates, concurrency {args.concurrency}: {results['throughput_per_s']:.1f} updates/s "
+          f"in {elapsed:.1f}s, webhook accept p99 {results['webhook_accept']['p99_ms']:.1f} ms")
+    for kind, result in results['filters'].items():
+        extra = ''.join(f'  {name} {result[name]}' for name in ('errors', 'busy', 'unanswered') if result.get(name))
+        print(f"{kind:>16} {result['count']:5d}  p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms  "
+              f"p99 {result['p99_ms']:8.1f} ms{extra}")
+    for stage, mean in results['stage_mean_ms'].items():
+        print(f"{'stage ' + stage:>24} mean {mean:8.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
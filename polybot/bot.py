@@ -1,27 +1,349 @@
-import telebot
 from loguru import logger
 import os
+import io
+import json
 import time
 import tempfile
-from telebot.types import InputFile
-from polybot.img_proc import Img
-import requests
-import boto3
-from botocore.exceptions import ClientError
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from polybot.img_proc import Img, BLUR_MODES, NOISE_OPERATIONS, rotation_turns
+from polybot.cache import ResultCache, PredictionCache, content_hash
+from polybot.http_session import get_session, use_for_telegram
+from polybot.s3_archiver import S3Archiver
+from polybot.s3_transfer import BatchTransfer, build_client_config, build_transfer_config
+from polybot.concat_store import build_concat_store
+from polybot.tiled import TiledImg, TILED_OPERATIONS, image_size
+from polybot.codec import get_codec
+from polybot.metrics import count_cache, count_error, count_request, set_filter_label, timed
 import uuid
 from datetime import datetime
 
+# Self-signed certificate uploaded with the webhook registration
+TELEGRAM_CERT_PATH = os.getenv('TELEGRAM_CERT_PATH', '/app/polybot-prod.crt')
+# 'background' registers the webhook after the bot is built so the port binds right away,
+# 'sync' registers it before, 'skip' leaves it to a deploy script that sets it once
+WEBHOOK_REGISTRATION = os.getenv('WEBHOOK_REGISTRATION', 'background')
+WEBHOOK_REGISTRATION_MODES = ('background', 'sync', 'skip')
+# Attempts of a background registration, waiting twice as long after each failure
+WEBHOOK_RETRIES = int(os.getenv('WEBHOOK_RETRIES', 5))
+# Lock file that lets the worker processes of one host register the webhook one at a time,
+# so only the first one sets it and the others find it set
+WEBHOOK_LOCK_PATH = os.getenv('WEBHOOK_LOCK_PATH')
+# Photos larger than this are spilled to a temp file while processed, 0 keeps every photo in memory
+PHOTO_SPILL_BYTES = int(os.getenv('PHOTO_SPILL_BYTES', 0))
+S3_ARCHIVE_QUEUE = int(os.getenv('S3_ARCHIVE_QUEUE', 200))
+S3_ARCHIVE_WORKERS = int(os.getenv('S3_ARCHIVE_WORKERS', 2))
+S3_ARCHIVE_RETRIES = int(os.getenv('S3_ARCHIVE_RETRIES', 3))
+# Images with more pixels than this are filtered band by band from a memory-mapped scratch file when every
+# step can be streamed, and downscaled to it while decoding otherwise, since the other filters need the whole
+# image in memory as float32. Telegram photos stay below it (at most 2560px on the longer side), images sent
+# as files go above it.
+TILED_MIN_PIXELS = int(os.getenv('TILED_MIN_PIXELS', 8_000_000))
+# Even streaming decodes the image once (3 bytes per pixel for a JPEG), larger images are refused
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 50_000_000))
+# Telegram lets bots download files up to 20MB
+TELEGRAM_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+# Heavy filters on photos with at least this many pixels first get a quick preview, 0 disables previews
+PREVIEW_MIN_PIXELS = int(os.getenv('PREVIEW_MIN_PIXELS', 1_000_000))
+# The preview is computed on the largest size Telegram keeps of the photo that fits this side
+PREVIEW_MAX_SIDE = int(os.getenv('PREVIEW_MAX_SIDE', 800))
+PREVIEW_CAPTION = 'Preview, the full resolution result is on its way...'
+# Per-filter photo size policy, keyed by Img operation with an optional 'default' entry, e.g.
+# {"segment": {"min_side": 1280}, "contour": {"max_pixels": 2000000}}
+# min_side downloads the smallest Telegram size whose longer side reaches it,
+# max_pixels downscales the photo on load to at most that many pixels
+PHOTO_SIZE_POLICY = json.loads(os.getenv('PHOTO_SIZE_POLICY', '{}'))
+# Photos of an album downloaded and filtered at the same time
+MEDIA_GROUP_WORKERS = int(os.getenv('MEDIA_GROUP_WORKERS', 4))
+# Rotations, flips and concat keep the photo in color unless this is turned off
+KEEP_COLOR = os.getenv('KEEP_COLOR', '1') == '1'
+# Steps that only move pixels around, so they need no grayscale conversion
+COLOR_OPERATIONS = ('rotate', 'flip_horizontal', 'flip_vertical', 'transpose')
+
+AVAILABLE_FILTERS = ['blur', 'contour', 'rotate', 'flip', 'transpose', 'segment', 'salt and pepper', 'gaussian',
+                     'speckle', 'concat', 'predict']
+# Filters that can be chained in one caption, e.g. 'blur 8 | contour | segment 100'
+CHAINABLE_FILTERS = ['blur', 'contour', 'rotate', 'flip', 'transpose', 'segment', 'salt and pepper', 'gaussian',
+                     'speckle']
+# Estimated cost of a caption filter per megapixel, relative to a blur, used by the job scheduler.
+# The blur cost does not depend on the level since it is computed from a summed-area table.
+FILTER_COSTS = {'blur': 1.0, 'contour': 1.0, 'rotate': 0.3, 'flip': 0.3, 'transpose': 0.3, 'segment': 0.5,
+                'salt and pepper': 0.5, 'gaussian': 1.0, 'speckle': 1.0, 'concat': 0.5, 'predict': 2.0}
+# Cost of a message without a photo or with an unknown caption, and the least a photo costs
+MIN_JOB_COST = 0.1
+
+
+def parse_caption(caption):
+    """
+    Split a caption into its filter steps, steps are separated by '|'
+
+    Returns:
+    list: (filter, params) pairs, or None if a step does not start with a known filter
+    """
+    steps = []
+    for part in caption.strip().lower().split('|'):
+        part = part.strip()
+        matched_filter = next((f for f in AVAILABLE_FILTERS if part.startswith(f)), None)
+        if not matched_filter:
+            return None
+        steps.append((matched_filter, part[len(matched_filter):].strip().split()))
+    return steps
+
+
+def is_path(photo):
+    return isinstance(photo, (str, os.PathLike))
+
+
+def sent_photo_file_id(sent_message):
+    """Telegram file_id of the largest size of a photo we sent, None if it can't be read"""
+    try:
+        return sent_message.photo[-1].file_id
+    except (AttributeError, IndexError, TypeError):
+        return None
+
+
+def filter_operations(matched_filter, params):
+    """
+    Translate a caption step into the Img operations it runs
+
+    Returns:
+    list: (operation, *args) tuples
+    """
+    if matched_filter == 'blur':
+        blur_level = int(params[0]) if params and params[0].isdigit() else 16
+        blur_mode = params[1] if len(params) > 1 and params[1] in BLUR_MODES else 'valid'
+        return [('blur', blur_level, blur_mode)]
+
+    if matched_filter == 'rotate':
+        # 'rotate 3' counts quarter turns, 'rotate 270 deg' gives an angle, either way it is one rotation
+        rotation = int(params[0]) if params and params[0].lstrip('-').isdigit() else 1
+        if len(params) > 1 and params[1] in ('deg', 'degrees'):
+            return [('rotate', rotation_turns(angle=rotation))]
+        return [('rotate', rotation_turns(rotation))]
+
+    if matched_filter == 'flip':
+        return [('flip_vertical',)] if params and params[0] == 'vertical' else [('flip_horizontal',)]
+
+    if matched_filter == 'segment':
+        threshold = int(params[0]) if params and params[0].isdigit() else 128
+        return [('segment', threshold)]
+
+    if matched_filter == 'salt and pepper':
+        return [('salt_n_pepper',)]
+
+    if matched_filter in ('gaussian', 'speckle'):
+        try:
+            return [(matched_filter, float(params[0]))] if params else [(matched_filter,)]
+        except ValueError:
+            return [(matched_filter,)]
+
+    return [(matched_filter,)]
+
+
+def preview_size(photo_sizes, max_side=PREVIEW_MAX_SIDE):
+    """
+    Pick the size of a Telegram photo to compute a preview on
+
+    Parameters:
+    photo_sizes (list): The msg['photo'] sizes, smallest first
+
+    Returns:
+    dict: The largest size no wider or taller than max_side, None when only the full size qualifies
+    """
+    candidates = [size for size in photo_sizes[:-1] if max(size['width'], size['height']) <= max_side]
+    return candidates[-1] if candidates else None
+
+
+def scale_operations(operations, scale):
+    """
+    Adapt the steps to an image scaled by `scale`, so a preview looks like the full result
+
+    Returns:
+    list: The steps, with the blur level scaled and at least 1
+    """
+    return [(op[0], max(1, round(op[1] * scale)), *op[2:]) if op[0] == 'blur' else op for op in operations]
+
+
+def size_policy(operations, policy=None):
+    """
+    Combine the size policies of the steps, the most demanding step wins
+
+    Returns:
+    dict: 'min_side' and 'max_pixels', None where a step needs the full photo
+    """
+    policy = PHOTO_SIZE_POLICY if policy is None else policy
+    rules = [policy.get(op[0], policy.get('default', {})) for op in operations]
+
+    def combined(name):
+        limits = [rule.get(name) for rule in rules]
+        return max(limits) if limits and all(limits) else None
+
+    return {'min_side': combined('min_side'), 'max_pixels': combined('max_pixels')}
+
+
+def select_photo_size(photo_sizes, min_side=None):
+    """
+    The smallest Telegram size whose longer side is at least min_side, the largest one otherwise
+    """
+    if min_side:
+        for size in photo_sizes:
+            if max(size['width'], size['height']) >= min_side:
+                return size
+    return photo_sizes[-1]
+
+
+def checked_pixels(photo):
+    """
+    Pixel count of a downloaded image, read from its header
+
+    Raises:
+    RuntimeError: When the image has more than MAX_IMAGE_PIXELS pixels
+    """
+    width, height = image_size(photo)
+    pixels = width * height
+    if pixels > MAX_IMAGE_PIXELS:
+        raise RuntimeError(f'the image has more than the {MAX_IMAGE_PIXELS // 1_000_000} megapixels the bot can process')
+    return pixels
+
+
+def document_as_photo(msg):
+    """
+    Present an image sent as a file like a photo message, so it is filtered at its full resolution
+
+    Returns:
+    dict: The message with a one-size msg['photo'] whose width and height are 0, Telegram does not
+          send the dimensions of a document. Other messages are returned as they are.
+    """
+    if 'media_group' in msg:
+        msg = dict(msg, media_group=[document_as_photo(photo_msg) for photo_msg in msg['media_group']])
+    document = msg.get('document')
+    if 'photo' in msg or not document or not (document.get('mime_type') or '').startswith('image/'):
+        return msg
+    size = {'file_id': document['file_id'], 'file_unique_id': document['file_unique_id'],
+            'file_size': document.get('file_size', 0), 'width': 0, 'height': 0}
+    return dict(msg, photo=[size])
+
+
+def estimate_cost(msg):
+    """
+    Estimate how expensive an update is before downloading its photo, from the largest photo size
+    and the caption filters
+
+    Returns:
+    float: Cost units, about the megapixels a blur would go through
+    """
+    if 'media_group' in msg:
+        return sum(estimate_cost(dict(photo_msg, caption=msg['caption'])) for photo_msg in msg['media_group'])
+    msg = document_as_photo(msg)
+    steps = parse_caption(msg.get('caption') or '') if msg.get('photo') else None
+    if not steps:
+        return MIN_JOB_COST
+    largest = msg['photo'][-1]
+    pixels = largest.get('width', 0) * largest.get('height', 0)
+    if not pixels:
+        # A document only has its file size, a camera JPEG takes about half a byte per pixel
+        pixels = largest.get('file_size', 0) * 2
+    megapixels = pixels / 1_000_000
+    return max(MIN_JOB_COST, megapixels * sum(FILTER_COSTS.get(f, 1.0) for f, _ in steps))
+
+
+@contextmanager
+def webhook_lock():
+    """Hold WEBHOOK_LOCK_PATH, when one is configured, for the duration of the block"""
+    if not WEBHOOK_LOCK_PATH:
+        yield
+        return
+
+    import fcntl
+
+    with open(WEBHOOK_LOCK_PATH, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
 class Bot:
-    def __init__(self, token, telegram_chat_url):
-        self.telegram_bot_client = telebot.TeleBot(token)
-        self.telegram_bot_client.remove_webhook()
-        time.sleep(0.5)
-        self.telegram_bot_client.set_webhook(
-            url=f'{telegram_chat_url}/{token}/',
-            timeout=60,
-            certificate=open("/app/polybot-prod.crt", 'r')
-        )
+    def __init__(self, token, telegram_chat_url, http_session=None, webhook_registration=WEBHOOK_REGISTRATION):
+        if webhook_registration not in WEBHOOK_REGISTRATION_MODES:
+            raise ValueError(f"Webhook registration must be one of {WEBHOOK_REGISTRATION_MODES}")
+        # Every outbound HTTP call, Telegram included, goes through one pooled session
+        self.http_session = http_session or get_session()
+        self.token = token
+        self.webhook_url = f'{telegram_chat_url}/{token}/'
+        self._telegram_bot_client = None
+        self._telegram_lock = threading.Lock()
+        # Set once the webhook points at us, the app's /ready route reports it
+        self.webhook_ready = threading.Event()
+
+        if webhook_registration == 'sync':
+            self.register_webhook()
+            self.warm_up()
+        elif webhook_registration == 'background':
+            threading.Thread(target=self._register_in_background, name='webhook-registration', daemon=True).start()
+        else:
+            self.webhook_ready.set()
+
+    @property
+    def telegram_bot_client(self):
+        """The TeleBot client, telebot is imported and the client built on first use"""
+        if self._telegram_bot_client is None:
+            with self._telegram_lock:
+                if self._telegram_bot_client is None:
+                    import telebot
+
+                    use_for_telegram(self.http_session)
+                    self._telegram_bot_client = telebot.TeleBot(self.token)
+        return self._telegram_bot_client
+
+    @telegram_bot_client.setter
+    def telegram_bot_client(self, client):
+        self._telegram_bot_client = client
+
+    def register_webhook(self):
+        """
+        Point the Telegram webhook at this bot, unless it already does
+
+        Returns:
+        bool: True if the webhook had to be set
+        """
+        has_certificate = os.path.exists(TELEGRAM_CERT_PATH)
+        with webhook_lock():
+            info = self.telegram_bot_client.get_webhook_info()
+            if info.url == self.webhook_url and bool(info.has_custom_certificate) == has_certificate:
+                logger.info('Telegram webhook is already set')
+                self.webhook_ready.set()
+                return False
+
+            # set_webhook replaces the old webhook, there is no need to remove it first
+            if has_certificate:
+                with open(TELEGRAM_CERT_PATH, 'r') as certificate:
+                    self.telegram_bot_client.set_webhook(url=self.webhook_url, timeout=60, certificate=certificate)
+            else:
+                self.telegram_bot_client.set_webhook(url=self.webhook_url, timeout=60)
         logger.info(f'Telegram Bot information\n\n{self.telegram_bot_client.get_me()}')
+        self.webhook_ready.set()
+        return True
+
+    def warm_up(self):
+        """Build the clients the first message would otherwise wait for"""
+
+    def _register_in_background(self, delay=1.0):
+        for attempt in range(1, WEBHOOK_RETRIES + 1):
+            try:
+                self.register_webhook()
+                break
+            except Exception as e:
+                logger.error(f"Webhook registration attempt {attempt} failed: {e}")
+                if attempt < WEBHOOK_RETRIES:
+                    time.sleep(delay)
+                    delay *= 2
+        try:
+            self.warm_up()
+        except Exception as e:
+            logger.error(f"Warm up failed: {e}")
 
     def send_text(self, chat_id, text):
         try:
@@ -37,7 +359,7 @@ class Bot:
 
     def download_user_photo(self, msg):
         if not self.is_current_msg_photo(msg):
-            raise RuntimeError(f'Message content of type \'photo\' expected')
+            raise RuntimeError('Message content of type \'photo\' expected')
 
         file_info = self.telegram_bot_client.get_file(msg['photo'][-1]['file_id'])
         data = self.telegram_bot_client.download_file(file_info.file_path)
@@ -54,11 +376,70 @@ class Bot:
 
         return file_path
 
-    def send_photo(self, chat_id, img_path):
-        if not os.path.exists(img_path):
-            raise RuntimeError("Image path doesn't exist")
+    def download_user_photo_data(self, msg, size=None):
+        """
+        Download a photo without writing it to disk
+
+        Parameters:
+        size (dict, optional): One of the msg['photo'] sizes, the largest by default
+
+        Returns:
+        tuple: (photo, file_name), photo is the bytes, or the path of a temp file when the photo
+               is larger than PHOTO_SPILL_BYTES
+        """
+        if not self.is_current_msg_photo(msg):
+            raise RuntimeError('Message content of type \'photo\' expected')
+        size = size or msg['photo'][-1]
+        if size.get('file_size', 0) > TELEGRAM_DOWNLOAD_LIMIT:
+            raise RuntimeError(f'the file is larger than the {TELEGRAM_DOWNLOAD_LIMIT // (1024 * 1024)}MB Telegram lets bots download')
 
-        self.telegram_bot_client.send_photo(chat_id, InputFile(img_path))
+        with timed('telegram_download'):
+            file_info = self.telegram_bot_client.get_file(size['file_id'])
+            data = self.telegram_bot_client.download_file(file_info.file_path)
+        file_name = os.path.basename(file_info.file_path)
+
+        if PHOTO_SPILL_BYTES and len(data) > PHOTO_SPILL_BYTES:
+            with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file_name)[1], delete=False) as spill:
+                spill.write(data)
+            return spill.name, file_name
+
+        return data, file_name
+
+    def send_photo(self, chat_id, photo, file_name='photo.jpg', caption=None):
+        """Send a photo given as a file path or as bytes"""
+        from telebot.types import InputFile
+
+        options = {'caption': caption} if caption else {}
+        if is_path(photo):
+            if not os.path.exists(photo):
+                raise RuntimeError("Image path doesn't exist")
+            photo = InputFile(photo)
+        else:
+            photo = InputFile(io.BytesIO(photo), file_name=file_name)
+
+        with timed('send_photo'):
+            return self.telegram_bot_client.send_photo(chat_id, photo, **options)
+
+    def send_media_group(self, chat_id, photos, file_name='photo.jpg'):
+        """
+        Send photos as one album
+
+        Parameters:
+        photos (list): Bytes, or Telegram file_ids of photos sent before, at most 10
+
+        Returns:
+        list: The sent messages, one per photo
+        """
+        from telebot.types import InputFile, InputMediaPhoto
+
+        if len(photos) == 1:
+            # Telegram albums need at least two photos
+            return [self.send_photo(chat_id, photos[0], file_name) if not isinstance(photos[0], str)
+                    else self.telegram_bot_client.send_photo(chat_id, photos[0])]
+        media = [InputMediaPhoto(photo if isinstance(photo, str) else InputFile(io.BytesIO(photo), file_name=file_name))
+                 for photo in photos]
+        with timed('send_photo'):
+            return self.telegram_bot_client.send_media_group(chat_id, media)
 
     def handle_message(self, msg):
         logger.info(f'Incoming message: {msg}')
@@ -66,34 +447,99 @@ class Bot:
 
 
 class ImageProcessingBot(Bot):
-    def __init__(self, token, telegram_chat_url):
-        super().__init__(token, telegram_chat_url)
-        self.concat_buffer = {}
-        
-        # Initialize S3 client
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('AWS_REGION', 'eu-central-1')
-        )
+    def __init__(self, token, telegram_chat_url, filter_pool=None, result_cache=None, prediction_cache=None, http_session=None,
+                 archiver=None, transfer_config=None, concat_store=None, webhook_registration=WEBHOOK_REGISTRATION):
+        # The S3 client, transfer config and batch transfer are built on first use, see the properties below.
+        # They are set up before Bot.__init__, which may start warming them up in the background.
         self.s3_bucket = os.getenv('S3_BUCKET_NAME')
-        
         if not all([os.getenv('AWS_ACCESS_KEY_ID'), os.getenv('AWS_SECRET_ACCESS_KEY'), self.s3_bucket]):
             logger.error("Missing AWS credentials or S3 bucket name in environment variables")
             raise ValueError("AWS S3 configuration is incomplete")
+        self._s3_client = None
+        self._transfer_config = transfer_config
+        self._batch_transfer = None
+        self._s3_lock = threading.Lock()
+
+        super().__init__(token, telegram_chat_url, http_session, webhook_registration)
+        # Pending first halves of concats, see polybot.concat_store
+        self.concat_buffer = concat_store if concat_store is not None else build_concat_store()
+        # Optional FilterPool, when set the Img filters run in worker processes
+        self.filter_pool = filter_pool
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        self.prediction_cache = prediction_cache if prediction_cache is not None else PredictionCache()
+
+        # Background uploads of originals and results
+        self.archiver = archiver if archiver is not None else S3Archiver(
+            self.upload_to_s3, max_queue=S3_ARCHIVE_QUEUE, workers=S3_ARCHIVE_WORKERS, retries=S3_ARCHIVE_RETRIES
+        )
+
+    @property
+    def s3_client(self):
+        """The boto3 S3 client, boto3 is imported and the client built on first use"""
+        if self._s3_client is None:
+            with self._s3_lock:
+                if self._s3_client is None:
+                    import boto3
+
+                    self._s3_client = boto3.client(
+                        's3',
+                        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+                        region_name=os.getenv('AWS_REGION', 'eu-central-1'),
+                        config=build_client_config()
+                    )
+        return self._s3_client
+
+    @s3_client.setter
+    def s3_client(self, client):
+        self._s3_client = client
+        self._batch_transfer = None
+
+    @property
+    def transfer_config(self):
+        """Multipart threshold, chunk size and concurrency for every transfer"""
+        if self._transfer_config is None:
+            self._transfer_config = build_transfer_config()
+        return self._transfer_config
+
+    @property
+    def batch_transfer(self):
+        if self._batch_transfer is None:
+            client, transfer_config = self.s3_client, self.transfer_config
+            with self._s3_lock:
+                if self._batch_transfer is None:
+                    self._batch_transfer = BatchTransfer(client, self.s3_bucket, transfer_config)
+        return self._batch_transfer
+
+    @batch_transfer.setter
+    def batch_transfer(self, batch_transfer):
+        self._batch_transfer = batch_transfer
+
+    def warm_up(self):
+        """Build the S3 client and the image codec before the first photo needs them"""
+        self.batch_transfer
+        get_codec()
+
+    def new_object_name(self, source):
+        """Generate a unique S3 key with timestamp and UUID"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        unique_id = str(uuid.uuid4())[:8]
+        file_extension = os.path.splitext(source)[1] if is_path(source) else '.jpg'
+        return f"images/{timestamp}_{unique_id}{file_extension}"
+
+    def upload_to_s3(self, source, object_name=None):
+        """Upload a file to S3 bucket, source is a file path or bytes"""
+        from botocore.exceptions import ClientError
 
-    def upload_to_s3(self, file_path, object_name=None):
-        """Upload a file to S3 bucket"""
         if object_name is None:
-            # Generate unique filename with timestamp and UUID
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())[:8]
-            file_extension = os.path.splitext(file_path)[1]
-            object_name = f"images/{timestamp}_{unique_id}{file_extension}"
+            object_name = self.new_object_name(source)
 
         try:
-            self.s3_client.upload_file(file_path, self.s3_bucket, object_name)
+            with timed('s3_upload'):
+                if is_path(source):
+                    self.s3_client.upload_file(source, self.s3_bucket, object_name, Config=self.transfer_config)
+                else:
+                    self.s3_client.upload_fileobj(io.BytesIO(source), self.s3_bucket, object_name, Config=self.transfer_config)
             logger.info(f"File uploaded successfully to S3: {object_name}")
             return object_name
         except ClientError as e:
@@ -102,16 +548,195 @@ class ImageProcessingBot(Bot):
 
     def download_from_s3(self, object_name, local_path):
         """Download a file from S3 bucket"""
+        from botocore.exceptions import ClientError
+
         try:
-            self.s3_client.download_file(self.s3_bucket, object_name, local_path)
+            with timed('s3_download'):
+                self.s3_client.download_file(self.s3_bucket, object_name, local_path, Config=self.transfer_config)
             logger.info(f"File downloaded successfully from S3: {object_name}")
             return True
         except ClientError as e:
             logger.error(f"Failed to download file from S3: {e}")
             return False
 
-    def send_to_yolo_service(self, image_name):
-        """Send image name to YOLO service instead of image file"""
+    def upload_many_to_s3(self, photos):
+        """
+        Upload several photos (bytes) concurrently
+
+        Returns:
+        list: The S3 key of each photo, None for the ones that failed
+        """
+        return self.batch_transfer.upload_many([(photo, self.new_object_name(photo)) for photo in photos])
+
+    def download_many_from_s3(self, object_names):
+        """
+        Download several objects concurrently
+
+        Returns:
+        list: The bytes of each object, None for the ones that failed
+        """
+        return self.batch_transfer.download_many(object_names)
+
+    def archive_to_s3(self, source):
+        """
+        Upload a photo in the background, for uploads the reply does not depend on.
+        A file path source is deleted once the upload is done.
+        """
+        self.archiver.archive(source, self.new_object_name(source), remove_after=is_path(source))
+
+    def download_from_s3_to_memory(self, object_name):
+        """Download an object from S3 bucket as bytes, returns None on failure"""
+        from botocore.exceptions import ClientError
+
+        buffer = io.BytesIO()
+        try:
+            with timed('s3_download'):
+                self.s3_client.download_fileobj(self.s3_bucket, object_name, buffer, Config=self.transfer_config)
+            logger.info(f"File downloaded successfully from S3: {object_name}")
+            return buffer.getvalue()
+        except ClientError as e:
+            logger.error(f"Failed to download file from S3: {e}")
+            return None
+
+    def load_img(self, photo, file_name, mode='gray', max_pixels=None):
+        """
+        Decode a photo kept in memory, or read it from its spill file.
+        Images larger than TILED_MIN_PIXELS are downscaled to it while decoding.
+        """
+        if checked_pixels(photo) > TILED_MIN_PIXELS:
+            max_pixels = min(max_pixels or TILED_MIN_PIXELS, TILED_MIN_PIXELS)
+        with timed('decode'):
+            if is_path(photo):
+                return Img(photo, mode=mode, max_pixels=max_pixels)
+            return Img.from_bytes(photo, file_name, mode=mode, max_pixels=max_pixels)
+
+    @staticmethod
+    def color_mode(operations):
+        """'color' when every step can run on the RGB channels as they are, 'gray' otherwise"""
+        return 'color' if KEEP_COLOR and all(op[0] in COLOR_OPERATIONS for op in operations) else 'gray'
+
+    def use_tiled(self, photo, operations):
+        """
+        Whether every step can be streamed and the downloaded photo is large enough to stream.
+        The size comes from the image header, documents arrive without one in the message.
+        """
+        return all(op[0] in TILED_OPERATIONS for op in operations) and checked_pixels(photo) > TILED_MIN_PIXELS
+
+    def run_tiled(self, photo, operations):
+        """
+        Apply the steps band by band so peak memory stays bounded for very large photos
+
+        Returns:
+        bytes: The encoded result
+        """
+        with timed('filter', 'tiled'), TiledImg(photo) as img:
+            for operation, *args in operations:
+                getattr(img, operation)(*args)
+            return img.encode()
+
+    @staticmethod
+    def wants_preview(msg, operations):
+        """Whether the photo is big and the steps heavy enough for a preview to be worth sending"""
+        full = msg['photo'][-1]
+        heavy = len(operations) > 1 or any(op[0] == 'blur' for op in operations)
+        return bool(PREVIEW_MIN_PIXELS) and heavy and full.get('width', 0) * full.get('height', 0) >= PREVIEW_MIN_PIXELS
+
+    def send_preview(self, chat_id, msg, operations):
+        """
+        Run the steps on a smaller size of the photo Telegram already has and send the result right away
+
+        Returns:
+        bool: Whether a preview was sent, a failed preview is logged and never fails the request
+        """
+        size = preview_size(msg['photo'])
+        if size is None:
+            return False
+
+        try:
+            with timed('preview'):
+                file_info = self.telegram_bot_client.get_file(size['file_id'])
+                data = self.telegram_bot_client.download_file(file_info.file_path)
+                img = Img.from_bytes(data, os.path.basename(file_info.file_path), mode=self.color_mode(operations))
+                img.run_pipeline(scale_operations(operations, size['width'] / msg['photo'][-1]['width']))
+                self.send_photo(chat_id, img.encode(), 'preview.jpg', caption=PREVIEW_CAPTION)
+            return True
+        except Exception as e:
+            logger.warning(f'Preview failed: {e}')
+            return False
+
+    def filter_photo(self, msg, photo, photo_name, operations, policy):
+        """
+        Run the steps on a downloaded photo
+
+        Parameters:
+        policy (dict): The size_policy() of the steps
+
+        Returns:
+        bytes: The encoded result
+        """
+        if not policy['max_pixels'] and self.use_tiled(photo, operations):
+            return self.run_tiled(photo, operations)
+
+        img = self.load_img(photo, photo_name, self.color_mode(operations), policy['max_pixels'])
+        # Blur levels are relative to the original, so they shrink with a smaller photo.
+        # Documents have no width in the message, it comes from the image itself.
+        scale = img.pixels.shape[1] / (msg['photo'][-1]['width'] or image_size(photo)[0])
+        if scale < 1:
+            operations = scale_operations(operations, scale)
+        if len(operations) == 1:
+            self.apply_filter(img, *operations[0])
+        else:
+            self.apply_filter(img, 'run_pipeline', operations)
+        with timed('encode'):
+            return img.encode()
+
+    def apply_filter(self, img, operation, *args):
+        """Run an Img filter, in the filter pool when one is configured"""
+        with timed('filter', 'pipeline' if operation == 'run_pipeline' else operation):
+            if self.filter_pool:
+                self.filter_pool.apply(img, operation, *args)
+            else:
+                getattr(img, operation)(*args)
+
+    def send_cached_photo(self, chat_id, cached):
+        """Resend a cached result, by Telegram file_id when known so the bytes are not uploaded again"""
+        if cached['file_id']:
+            return self.telegram_bot_client.send_photo(chat_id, cached['file_id'])
+        return self.send_photo(chat_id, cached['path'])
+
+    def cached_prediction(self, image_hash):
+        """
+        Look up an earlier prediction of the same image bytes
+
+        Returns:
+        The result send_to_yolo_service returned for it, or None on a miss
+        """
+        entry = self.prediction_cache.get(image_hash)
+        if not entry:
+            return None
+
+        result = entry['result']
+        if isinstance(result, tuple) and not os.path.exists(result[1]):
+            # The local copy of the annotated image is gone, fetch it again but skip YOLO
+            if not (entry['s3_key'] and self.download_from_s3(entry['s3_key'], result[1])):
+                return None
+        return result
+
+    def send_prediction(self, chat_id, prediction_result):
+        # Check if we got back both detection results and predicted image
+        if isinstance(prediction_result, tuple):
+            detection_text, predicted_image_path = prediction_result
+            self.send_text(chat_id, detection_text)
+            self.send_photo(chat_id, predicted_image_path)
+        else:
+            self.send_text(chat_id, prediction_result)
+
+    def send_to_yolo_service(self, image_name, image_hash=None):
+        """
+        Send image name to YOLO service instead of image file
+
+        When image_hash is given, successful predictions are stored in the prediction cache under it
+        """
         try:
             yolo_url = os.getenv("YOLO_URL")
             if not yolo_url:
@@ -129,14 +754,18 @@ class ImageProcessingBot(Bot):
             }
             
             logger.info(f"Sending request to YOLO service with payload: {payload}")
-            response = requests.post(yolo_url, json=payload, headers=headers, timeout=30)
+            with timed('yolo'):
+                response = self.http_session.post(yolo_url, json=payload, headers=headers, timeout=30)
             
             if response.status_code == 200:
                 result = response.json()
                 # Format the detection results into a readable message
                 detections = result.get('detections', [])
                 if not detections:
-                    return "No objects detected in the image."
+                    no_detections_text = "No objects detected in the image."
+                    if image_hash:
+                        self.prediction_cache.put(image_hash, no_detections_text)
+                    return no_detections_text
                 
                 # Create a summary of detected objects
                 detection_summary = []
@@ -151,16 +780,126 @@ class ImageProcessingBot(Bot):
                     # Download the predicted image
                     predicted_local_path = os.path.join(tempfile.gettempdir(), f'predicted_{os.path.basename(image_name)}')
                     if self.download_from_s3(predicted_s3_key, predicted_local_path):
+                        if image_hash:
+                            self.prediction_cache.put(image_hash, (detection_summary, predicted_local_path), predicted_s3_key)
                         return detection_summary, predicted_local_path
-                
-                return "Detected objects:\n" + "\n".join(f"• {item}" for item in detection_summary)
+
+                detection_text = "Detected objects:\n" + "\n".join(f"• {item}" for item in detection_summary)
+                if image_hash:
+                    self.prediction_cache.put(image_hash, detection_text)
+                return detection_text
             else:
+                count_error('yolo')
                 logger.error(f"YOLO service returned status {response.status_code}: {response.text}")
                 return f"Prediction failed: YOLO service returned status {response.status_code}"
         except Exception as e:
             logger.error(f"Failed to get prediction from YOLO service: {str(e)}")
             return "Prediction failed due to server error."
 
+    def handle_media_group(self, chat_id, msg):
+        """
+        Handle an album as one job, see polybot.media_group
+
+        The caption is parsed once, the photos are downloaded and filtered in parallel, and the
+        results go back as one album. Concat arranges all the photos in a grid.
+        """
+        messages = msg['media_group']
+        try:
+            steps = parse_caption(msg['caption'] or '')
+            if not steps:
+                self.send_text(chat_id, f"Please caption the album with a filter. Available: "
+                                        f"{', '.join(f.title() for f in AVAILABLE_FILTERS)}")
+                return
+            if any(f == 'predict' for f, _ in steps):
+                self.send_text(chat_id, "Predict works on one photo at a time, please send the photos separately.")
+                return
+            if len(steps) > 1 and any(f not in CHAINABLE_FILTERS for f, _ in steps):
+                self.send_text(chat_id, "Concat and Predict can't be chained with other filters, please send them on their own.")
+                return
+
+            label = steps[0][0] if len(steps) == 1 else 'chain'
+            set_filter_label(label)
+            for _ in messages:
+                count_request(label)
+
+            if label == 'concat':
+                self.concat_media_group(chat_id, messages)
+                return
+
+            operations = [operation for f, p in steps for operation in filter_operations(f, p)]
+            self.send_text(chat_id, f"Applying {' | '.join(f.title() for f, _ in steps)} filter to {len(messages)} photos...")
+            with ThreadPoolExecutor(max_workers=min(MEDIA_GROUP_WORKERS, len(messages))) as executor:
+                results = list(executor.map(lambda photo_msg: self._filter_album_photo(photo_msg, operations, label), messages))
+
+            sent = self.send_media_group(chat_id, [output for output, _, _ in results], 'album_filtered.jpg')
+            for sent_message, (output, cache_key, is_new) in zip(sent, results):
+                if is_new:
+                    if cache_key:
+                        self.result_cache.put(cache_key, file_id=sent_photo_file_id(sent_message), data=output)
+                    self.archive_to_s3(output)
+
+        except Exception as e:
+            count_error('handle_message')
+            logger.error(f"Error processing album: {str(e)}")
+            self.send_text(chat_id, f"Error processing image: {str(e)}")
+        finally:
+            set_filter_label('')
+
+    def _filter_album_photo(self, msg, operations, label):
+        """
+        Filter one photo of an album, in a worker thread
+
+        Returns:
+        tuple: (result, cache key, is_new), result is a Telegram file_id when served from the cache
+        """
+        set_filter_label(label)
+        photo = None
+        try:
+            cache_key = None
+            if not any(op[0] in NOISE_OPERATIONS for op in operations):
+                cache_key = self.result_cache.make_key(msg['photo'][-1]['file_unique_id'], operations)
+                cached = self.result_cache.get(cache_key)
+                count_cache('result', bool(cached))
+                if cached:
+                    if cached['file_id']:
+                        return cached['file_id'], cache_key, False
+                    with open(cached['path'], 'rb') as f:
+                        return f.read(), cache_key, False
+
+            policy = size_policy(operations)
+            photo_size = select_photo_size(msg['photo'], policy['min_side'])
+            photo, photo_name = self.download_user_photo_data(msg, photo_size)
+            output = self.filter_photo(msg, photo, photo_name, operations, policy)
+            self.archive_to_s3(photo)
+            photo = None  # the archiver owns a spilled photo from here on
+            return output, cache_key, True
+        finally:
+            set_filter_label('')
+            if photo and is_path(photo) and os.path.exists(photo):
+                os.remove(photo)
+
+    def concat_media_group(self, chat_id, messages):
+        """Concatenate the photos of an album into one grid image"""
+        concat_mode = 'color' if KEEP_COLOR else 'gray'
+
+        def load(photo_msg):
+            photo, photo_name = self.download_user_photo_data(photo_msg)
+            return photo, self.load_img(photo, photo_name, concat_mode)
+
+        with ThreadPoolExecutor(max_workers=min(MEDIA_GROUP_WORKERS, len(messages))) as executor:
+            photos, images = zip(*executor.map(load, messages))
+
+        with timed('filter', 'concat'):
+            images[0].concat_grid(list(images[1:]))
+        with timed('encode'):
+            result = images[0].encode()
+
+        self.send_text(chat_id, f"{len(images)} images concatenated successfully!")
+        self.send_photo(chat_id, result, f'concat_{int(time.time())}.jpg')
+        self.archive_to_s3(result)
+        for photo in photos:
+            self.archive_to_s3(photo)
+
     def handle_message(self, msg):
         logger.info(f'Incoming message: {msg}')
         
@@ -170,123 +909,146 @@ class ImageProcessingBot(Bot):
         
         chat_id = msg['chat']['id']
         self.send_text(chat_id, f"Hello {msg['from']['first_name']}! Welcome to the Image Processing Bot.")
+        msg = document_as_photo(msg)
+
+        # A lone photo of an album, e.g. one that arrived after the album was handed over, is handled like any photo
+        if len(msg.get('media_group', ())) > 1:
+            self.handle_media_group(chat_id, msg)
 
-        if self.is_current_msg_photo(msg):
+        elif self.is_current_msg_photo(msg):
+            photo = None
             try:
                 if 'caption' not in msg or not msg['caption']:
                     self.send_text(
                         chat_id,
                         "Please provide a caption with the image. Available filters are: "
-                        "Blur, Contour, Rotate, Segment, Salt and pepper, Concat, Predict"
+                        "Blur, Contour, Rotate, Flip, Transpose, Segment, Salt and pepper, Gaussian, Speckle, Concat, Predict"
                     )
                     return
 
-                caption = msg['caption'].strip().lower()
-                available_filters = ['blur', 'contour', 'rotate', 'segment', 'salt and pepper', 'concat', 'predict']
-                matched_filter = None
-                params = []
-
-                for f in available_filters:
-                    if caption.startswith(f):
-                        matched_filter = f
-                        params = caption[len(f):].strip().split()
-                        break
+                steps = parse_caption(msg['caption'])
+                if not steps:
+                    self.send_text(chat_id, f"Invalid filter. Available: {', '.join(f.title() for f in AVAILABLE_FILTERS)}")
+                    return
 
-                if not matched_filter:
-                    self.send_text(chat_id, f"Invalid filter. Available: {', '.join(f.title() for f in available_filters)}")
+                if len(steps) > 1 and any(f not in CHAINABLE_FILTERS for f, _ in steps):
+                    self.send_text(chat_id, "Concat and Predict can't be chained with other filters, please send them on their own.")
                     return
 
-                # Download the photo locally first
-                photo_path = self.download_user_photo(msg)
-                logger.info(f'Photo downloaded to: {photo_path}')
+                matched_filter, params = steps[0]
+                operations = [operation for f, p in steps for operation in filter_operations(f, p)]
+                # Chains share one label so arbitrary captions can't create new metric series
+                set_filter_label(matched_filter if len(steps) == 1 else 'chain')
+                count_request(matched_filter if len(steps) == 1 else 'chain')
 
-                # Upload image to S3
-                self.send_text(chat_id, "Uploading image to S3...")
-                s3_object_name = self.upload_to_s3(photo_path)
-                
-                if not s3_object_name:
-                    self.send_text(chat_id, "Failed to upload image to S3. Please try again.")
-                    return
+                # Filtered results are deterministic (except for the random noise), so a photo seen
+                # before with the same steps is answered from the cache without downloading it again
+                cache_key = None
+                if matched_filter not in ('concat', 'predict') and not any(op[0] in NOISE_OPERATIONS for op in operations):
+                    cache_key = self.result_cache.make_key(msg['photo'][-1]['file_unique_id'], operations)
+                    cached = self.result_cache.get(cache_key)
+                    count_cache('result', bool(cached))
+                    if cached:
+                        logger.info(f'Result cache hit: {cache_key}')
+                        self.send_cached_photo(chat_id, cached)
+                        return
+
+                # Big photos get a preview from a smaller size before the full one is even downloaded
+                if matched_filter not in ('concat', 'predict') and self.wants_preview(msg, operations):
+                    self.send_preview(chat_id, msg, operations)
 
-                logger.info(f'Image uploaded to S3: {s3_object_name}')
+                # Filters only download the photo size their policy needs, the others need the original
+                policy = {'min_side': None, 'max_pixels': None}
+                if matched_filter not in ('concat', 'predict'):
+                    policy = size_policy(operations)
+                photo_size = select_photo_size(msg['photo'], policy['min_side'])
+
+                # Download the photo into memory, it never touches the disk unless it is spilled
+                photo, photo_name = self.download_user_photo_data(msg, photo_size)
+                logger.info(f'Photo downloaded: {photo_name}')
 
                 if matched_filter == 'predict':
-                    self.send_text(chat_id, "Sending image to YOLO prediction service...")
-                    prediction_result = self.send_to_yolo_service(s3_object_name)
-                    
-                    # Check if we got back both detection results and predicted image
-                    if isinstance(prediction_result, tuple):
-                        detection_text, predicted_image_path = prediction_result
-                        self.send_text(chat_id, detection_text)
-                        self.send_photo(chat_id, predicted_image_path)
-                    else:
-                        self.send_text(chat_id, prediction_result)
+                    image_hash = content_hash(photo)
+                    prediction_result = self.cached_prediction(image_hash)
+                    count_cache('prediction', prediction_result is not None)
+                    if prediction_result is not None:
+                        logger.info(f'Prediction cache hit: {image_hash}')
+                        self.send_prediction(chat_id, prediction_result)
+                        return
 
-                elif matched_filter != 'concat':
-                    img = Img(photo_path)
-                    self.send_text(chat_id, f"Applying {matched_filter.title()} filter...")
+                # Only predict reads the original back from S3,
+                # everything else archives it in the background once the reply is sent
+                if matched_filter == 'predict':
+                    self.send_text(chat_id, "Uploading image to S3...")
+                    s3_object_name = self.upload_to_s3(photo)
 
-                    if matched_filter == 'blur':
-                        blur_level = int(params[0]) if params and params[0].isdigit() else 16
-                        img.blur(blur_level)
+                    if not s3_object_name:
+                        self.send_text(chat_id, "Failed to upload image to S3. Please try again.")
+                        return
 
-                    elif matched_filter == 'contour':
-                        img.contour()
+                    logger.info(f'Image uploaded to S3: {s3_object_name}')
 
-                    elif matched_filter == 'rotate':
-                        rotation_count = int(params[0]) if params and params[0].isdigit() else 1
-                        for _ in range(rotation_count):
-                            img.rotate()
+                if matched_filter == 'predict':
+                    self.send_text(chat_id, "Sending image to YOLO prediction service...")
+                    prediction_result = self.send_to_yolo_service(s3_object_name, image_hash)
+                    self.send_prediction(chat_id, prediction_result)
 
-                    elif matched_filter == 'segment' and hasattr(img, 'segment'):
-                        img.segment()
+                elif matched_filter != 'concat':
+                    self.send_text(chat_id, f"Applying {' | '.join(f.title() for f, _ in steps)} filter...")
 
-                    elif matched_filter == 'salt and pepper' and hasattr(img, 'salt_n_pepper'):
-                        img.salt_n_pepper()
+                    output = self.filter_photo(msg, photo, photo_name, operations, policy)
+                    output_name = os.path.splitext(photo_name)[0] + '_filtered.jpg'
 
-                    else:
-                        self.send_text(chat_id, f"{matched_filter.title()} filter is not implemented.")
-                        return
+                    sent = self.send_photo(chat_id, output, output_name)
+                    if cache_key:
+                        self.result_cache.put(cache_key, file_id=sent_photo_file_id(sent), data=output)
 
-                    output_path = os.path.join(tempfile.gettempdir(), os.path.basename(photo_path).split('.')[0] + '_filtered.jpg')
-                    new_image_path = img.save_img(output_path)
-                    
-                    # Upload processed image to S3
-                    processed_s3_name = self.upload_to_s3(new_image_path)
-                    if processed_s3_name:
-                        logger.info(f'Processed image uploaded to S3: {processed_s3_name}')
-                    
-                    self.send_photo(chat_id, new_image_path)
+                    self.archive_to_s3(output)
+                    self.archive_to_s3(photo)
+                    photo = None  # the archiver owns a spilled photo from here on
 
                 else:  # concat
-                    if chat_id in self.concat_buffer:
-                        first_s3_name = self.concat_buffer.pop(chat_id)
-                        
-                        # Download first image from S3
-                        first_temp_path = os.path.join(tempfile.gettempdir(), f'concat_first_{int(time.time())}.jpg')
-                        if self.download_from_s3(first_s3_name, first_temp_path):
-                            img1 = Img(first_temp_path)
-                            img2 = Img(photo_path)
-                            img1.concat(img2)
-                            output_path = os.path.join(tempfile.gettempdir(), f'concat_{int(time.time())}.jpg')
-                            result = img1.save_img(output_path)
-                            
-                            # Upload concatenated image to S3
-                            concat_s3_name = self.upload_to_s3(result)
-                            if concat_s3_name:
-                                logger.info(f'Concatenated image uploaded to S3: {concat_s3_name}')
-                            
+                    concat_mode = 'color' if KEEP_COLOR else 'gray'
+                    session = self.concat_buffer.pop(chat_id)
+                    if session:
+                        # The first image is kept locally, S3 is only the fallback
+                        first_photo = session['photo'] or self.download_from_s3_to_memory(session['s3_key'])
+                        img1 = self.load_img(first_photo, session['s3_key'], concat_mode) if first_photo else None
+
+                        if img1:
+                            img2 = self.load_img(photo, photo_name, concat_mode)
+                            self.apply_filter(img1, 'concat', img2)
+                            with timed('encode'):
+                                result = img1.encode()
+
                             self.send_text(chat_id, "Images concatenated successfully!")
-                            self.send_photo(chat_id, result)
+                            self.send_photo(chat_id, result, f'concat_{int(time.time())}.jpg')
+
+                            self.archive_to_s3(result)
+                            self.archive_to_s3(photo)
+                            photo = None  # the archiver owns a spilled photo from here on
                         else:
                             self.send_text(chat_id, "Failed to download first image from S3.")
                     else:
-                        self.concat_buffer[chat_id] = s3_object_name
-                        self.send_text(chat_id, "First image received and uploaded to S3. Please send the second image with caption 'concat'.")
+                        photo_bytes = photo
+                        if is_path(photo):
+                            with open(photo, 'rb') as f:
+                                photo_bytes = f.read()
+
+                        s3_object_name = self.new_object_name(photo)
+                        self.concat_buffer.put(chat_id, s3_object_name, photo_bytes)
+                        self.archiver.archive(photo, s3_object_name, remove_after=is_path(photo))
+                        photo = None  # the archiver owns a spilled photo from here on
+                        self.send_text(chat_id, "First image received. Please send the second image with caption 'concat'.")
 
             except Exception as e:
+                count_error('handle_message')
                 logger.error(f"Error processing image: {str(e)}")
                 self.send_text(chat_id, f"Error processing image: {str(e)}")
+            finally:
+                set_filter_label('')
+                if photo and is_path(photo) and os.path.exists(photo):
+                    os.remove(photo)
 
         elif 'text' in msg:
             if msg['text'].startswith('/'):
@@ -295,13 +1057,20 @@ class ImageProcessingBot(Bot):
                         chat_id,
                         "Welcome to the Image Processing Bot!\n\n"
                         "Send me a photo with one of these captions:\n"
-                        "- Blur [level]\n"
+                        "- Blur [level] [edge|reflect|constant]\n"
                         "- Contour\n"
-                        "- Rotate [count]\n"
-                        "- Segment\n"
+                        "- Rotate [count], or Rotate [angle] deg\n"
+                        "- Flip [horizontal|vertical]\n"
+                        "- Transpose\n"
+                        "- Segment [threshold]\n"
                         "- Salt and pepper\n"
+                        "- Gaussian [sigma]\n"
+                        "- Speckle [variance]\n"
                         "- Concat (requires two images)\n"
-                        "- Predict (runs YOLO prediction)\n"
+                        "- Predict (runs YOLO prediction)\n\n"
+                        "Chain filters with '|', e.g. Blur 8 | Contour | Segment 100\n"
+                        "Caption an album to filter all of its photos, Concat puts them in a grid\n"
+                        "Send a photo as a file (up to 20MB) to filter it at full resolution\n"
                     )
                 else:
                     self.send_text(chat_id, "Unknown command. Send /help for options.")
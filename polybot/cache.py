@@ -0,0 +1,163 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from loguru import logger
+
+
+class ResultCache:
+    """
+    LRU cache of filtered photos, keyed on the Telegram file_unique_id plus the normalized filter steps
+
+    The memory tier keeps the Telegram file_id of the photo we already sent, so a hit resends it
+    without uploading the bytes again. With disk_dir set, the encoded result is also written to disk
+    and survives restarts and memory evictions.
+
+    Parameters:
+    max_entries (int): Entries kept in memory before the least recently used one is evicted
+    disk_dir (str, optional): Directory for the on-disk tier, disabled when not set
+    max_disk_entries (int): Files kept in the on-disk tier before the oldest ones are removed
+    """
+
+    def __init__(self, max_entries=1024, disk_dir=None, max_disk_entries=10000):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(file_unique_id, operations):
+        """
+        Build a cache key from the photo id and the (operation, *args) steps applied to it
+        """
+        spec = '|'.join(' '.join(str(part) for part in operation) for operation in operations)
+        return f'{file_unique_id}:{spec}'
+
+    def _disk_path(self, key, suffix):
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode()).hexdigest() + suffix)
+
+    def get(self, key):
+        """
+        Returns:
+        dict: {'file_id': ..., 'path': ...} with whichever of the two is known, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                return dict(entry)
+
+        if self.disk_dir and os.path.exists(self._disk_path(key, '.jpg')):
+            entry = {'file_id': None, 'path': self._disk_path(key, '.jpg')}
+            if os.path.exists(self._disk_path(key, '.file_id')):
+                with open(self._disk_path(key, '.file_id')) as f:
+                    entry['file_id'] = f.read().strip() or None
+            self._remember(key, entry)
+            return dict(entry)
+
+        return None
+
+    def put(self, key, file_id=None, data=None):
+        """
+        Store a result, file_id is the Telegram id of the sent photo and data its encoded bytes.
+        The bytes are only kept when the on-disk tier is enabled.
+        """
+        entry = {'file_id': file_id, 'path': None}
+
+        if self.disk_dir and data:
+            try:
+                disk_path = self._disk_path(key, '.jpg')
+                with open(disk_path, 'wb') as f:
+                    f.write(data)
+                if file_id:
+                    with open(self._disk_path(key, '.file_id'), 'w') as f:
+                        f.write(file_id)
+                entry['path'] = disk_path
+                self._evict_disk()
+            except OSError as e:
+                logger.error(f"Failed to write result cache entry to disk: {e}")
+
+        if entry['file_id'] or entry['path']:
+            self._remember(key, entry)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _evict_disk(self):
+        images = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith('.jpg')]
+        if len(images) <= self.max_disk_entries:
+            return
+
+        images.sort(key=os.path.getmtime)
+        for image in images[:len(images) - self.max_disk_entries]:
+            for path in (image, image[:-len('.jpg')] + '.file_id'):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def content_hash(source):
+    """SHA-256 of image bytes, or of a file's bytes read in chunks when given a path"""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Cache of YOLO predictions keyed on the hash of the image bytes, entries expire after ttl seconds
+
+    Entries hold the prediction result as returned by send_to_yolo_service and the S3 key of the
+    annotated image, so a missing local copy can be fetched again without calling YOLO.
+
+    Parameters:
+    ttl (float): Seconds an entry stays valid
+    max_entries (int): Entries kept before the least recently used one is evicted
+    """
+
+    def __init__(self, ttl=3600, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_hash):
+        """
+        Returns:
+        dict: {'result': ..., 's3_key': ...}, or None on a miss or when the entry expired
+        """
+        with self._lock:
+            entry = self._entries.get(image_hash)
+            if not entry:
+                return None
+            if time.monotonic() - entry['stored_at'] > self.ttl:
+                del self._entries[image_hash]
+                return None
+            self._entries.move_to_end(image_hash)
+            return {'result': entry['result'], 's3_key': entry['s3_key']}
+
+    def put(self, image_hash, result, s3_key=None):
+        with self._lock:
+            self._entries[image_hash] = {'result': result, 's3_key': s3_key, 'stored_at': time.monotonic()}
+            self._entries.move_to_end(image_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,210 @@
+import io
+import math
+import os
+import numpy as np
+
+IMAGE_CODEC = os.getenv('IMAGE_CODEC', 'pillow')
+JPEG_QUALITY = int(os.getenv('JPEG_QUALITY', 75))
+JPEG_PROGRESSIVE = os.getenv('JPEG_PROGRESSIVE', '1') == '1'
+JPEG_OPTIMIZE = os.getenv('JPEG_OPTIMIZE', '1') == '1'
+
+
+def to_gray8(pixels):
+    """
+    Stretch a grayscale matrix to 0-255 like imsave(cmap='gray') does, min becomes black and max white
+
+    Returns:
+    ndarray: uint8 pixels
+    """
+    pixels = np.asarray(pixels, dtype=np.float32)
+    if pixels.size == 0:
+        return np.zeros(pixels.shape, dtype=np.uint8)
+    low, high = float(pixels.min()), float(pixels.max())
+    if high <= low:
+        return np.zeros(pixels.shape, dtype=np.uint8)
+    return np.round((pixels - low) * (255 / (high - low))).astype(np.uint8)
+
+
+def to_rgb8(pixels):
+    """
+    Clip RGB pixels to 0-255, color values are not stretched
+
+    Returns:
+    ndarray: uint8 pixels
+    """
+    return np.clip(np.round(pixels), 0, 255).astype(np.uint8)
+
+
+def fit_pixels(width, height, max_pixels):
+    """
+    The largest (width, height) with the same aspect ratio and at most max_pixels pixels
+    """
+    if width * height <= max_pixels:
+        return width, height
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, math.floor(width * scale)), max(1, math.floor(height * scale))
+
+
+def _format(path, default='jpeg'):
+    suffix = os.path.splitext(str(path))[1].lstrip('.').lower()
+    return {'jpg': 'jpeg', '': default}.get(suffix, suffix)
+
+
+class PillowCodec:
+    """
+    Decode and encode with Pillow, writing true single-channel grayscale
+
+    Parameters:
+    quality (int): JPEG quality, 1-95
+    progressive (bool): Write progressive JPEGs, smaller and shown sooner on slow links
+    optimize (bool): Optimize the JPEG Huffman tables, smaller at a small CPU cost
+    """
+
+    def __init__(self, quality=JPEG_QUALITY, progressive=JPEG_PROGRESSIVE, optimize=JPEG_OPTIMIZE):
+        from PIL import Image
+        self._image = Image
+        self.quality = quality
+        self.progressive = progressive
+        self.optimize = optimize
+
+    def decode(self, source, format=None, max_size=None, max_pixels=None):
+        """
+        Decode an image to an RGB uint8 array
+
+        Parameters:
+        source (str, bytes or file-like): Encoded image
+        format (str, optional): Unused, Pillow detects the format from the data
+        max_size (tuple, optional): (width, height) the image only needs to cover. JPEGs are then
+                                    downscaled by 1/2, 1/4 or 1/8 while decoding, which is much cheaper
+                                    than decoding at full size. The result is never smaller than max_size.
+        max_pixels (int, optional): Downscale larger images to at most this many pixels, keeping the
+                                    aspect ratio. JPEGs use draft mode for the bulk of the reduction.
+
+        Returns:
+        ndarray: (height, width, 3) pixels
+        """
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        with self._image.open(source) as image:
+            if max_size:
+                image.draft('RGB', max_size)
+            if max_pixels and image.width * image.height > max_pixels:
+                image.thumbnail(fit_pixels(image.width, image.height, max_pixels))
+            return np.asarray(image.convert('RGB'))
+
+    def encode_gray8(self, gray, format='jpeg', **options):
+        """
+        Encode uint8 grayscale pixels as a single-channel image
+
+        Returns:
+        bytes: The encoded image
+        """
+        buffer = io.BytesIO()
+        self._image.fromarray(gray, mode='L').save(buffer, format=format, **self._options(format, options))
+        return buffer.getvalue()
+
+    def encode(self, pixels, format='jpeg', **options):
+        """
+        Encode a grayscale matrix stretched to 0-255, or an RGB matrix clipped to 0-255
+
+        Parameters:
+        pixels (ndarray): 2D grayscale or (height, width, 3) RGB pixels
+        format (str): Any format Pillow can write, e.g. 'jpeg' or 'png'
+        options: Overrides for quality, progressive and optimize
+
+        Returns:
+        bytes: The encoded image
+        """
+        if np.ndim(pixels) == 3:
+            buffer = io.BytesIO()
+            image = self._image.fromarray(to_rgb8(pixels), mode='RGB')
+            image.save(buffer, format=format, **self._options(format, options))
+            return buffer.getvalue()
+        return self.encode_gray8(to_gray8(pixels), format, **options)
+
+    def save(self, pixels, path, **options):
+        with open(path, 'wb') as f:
+            f.write(self.encode(pixels, _format(path), **options))
+
+    def _options(self, format, options):
+        if format.lower() not in ('jpeg', 'jpg'):
+            return {}
+        return {
+            'quality': options.get('quality', self.quality),
+            'progressive': options.get('progressive', self.progressive),
+            'optimize': options.get('optimize', self.optimize),
+        }
+
+
+class MatplotlibCodec:
+    """
+    The original matplotlib imread/imsave path, writes RGBA through the gray colormap
+    """
+
+    def __init__(self, **options):
+        # Imported here so the default Pillow codec never pays for importing matplotlib
+        from matplotlib.image import imread, imsave
+        self._imread = imread
+        self._imsave = imsave
+
+    def decode(self, source, format=None, max_size=None, max_pixels=None):
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        # matplotlib assumes PNG for buffers unless told otherwise
+        rgb = self._imread(source, format=format or 'jpeg')
+        if rgb.dtype != np.uint8:
+            rgb = (rgb * 255).astype(np.uint8)
+        if rgb.ndim == 2:
+            rgb = np.stack([rgb] * 3, axis=-1)
+        if max_pixels and rgb.shape[0] * rgb.shape[1] > max_pixels:
+            # No resampling here, keep every n-th pixel
+            step = math.ceil(math.sqrt(rgb.shape[0] * rgb.shape[1] / max_pixels))
+            rgb = rgb[::step, ::step]
+        return rgb[:, :, :3]
+
+    def encode_gray8(self, gray, format='jpeg', **options):
+        buffer = io.BytesIO()
+        self._imsave(buffer, gray, cmap='gray', format=format, vmin=0, vmax=255)
+        return buffer.getvalue()
+
+    def encode(self, pixels, format='jpeg', **options):
+        buffer = io.BytesIO()
+        self.save(pixels, buffer, format=format)
+        return buffer.getvalue()
+
+    def save(self, pixels, path, format=None, **options):
+        if np.ndim(pixels) == 3:
+            self._imsave(path, to_rgb8(pixels), format=format)
+        else:
+            self._imsave(path, pixels, cmap='gray', format=format)
+
+
+CODECS = {'pillow': PillowCodec, 'matplotlib': MatplotlibCodec}
+_codecs = {}
+
+
+def register_codec(name, codec_class):
+    """
+    Make a codec available to get_codec(), e.g. a faster JPEG library
+
+    Parameters:
+    name (str): Name used by get_codec() and the IMAGE_CODEC env var
+    codec_class (type): Class with decode, encode, encode_gray8 and save methods like PillowCodec
+    """
+    CODECS[name] = codec_class
+    _codecs.pop(name, None)
+
+
+def get_codec(name=None):
+    """
+    The shared codec instance, created on first use
+
+    Parameters:
+    name (str, optional): Codec name, defaults to the IMAGE_CODEC env var
+    """
+    name = name or IMAGE_CODEC
+    if name not in CODECS:
+        raise ValueError(f"Codec must be one of {tuple(CODECS)}")
+    if name not in _codecs:
+        _codecs[name] = CODECS[name]()
+    return _codecs[name]
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from polybot.sqlite_store import transaction
+
+CONCAT_STORE = os.getenv('CONCAT_STORE', 'memory')
+CONCAT_STORE_PATH = os.getenv('CONCAT_STORE_PATH', '/tmp/polybot_concat.sqlite3')
+CONCAT_TTL = float(os.getenv('CONCAT_TTL', 900))
+CONCAT_MAX_SESSIONS = int(os.getenv('CONCAT_MAX_SESSIONS', 1000))
+# Total size of the first images kept, a document can be 20MB so the session count alone doesn't bound it
+CONCAT_MAX_BYTES = int(os.getenv('CONCAT_MAX_BYTES', 256 * 1024 * 1024))
+
+
+class MemoryConcatStore:
+    """
+    First halves of pending concats, kept in this process
+
+    The first image is kept encoded, the second half decodes it without going to S3.
+    Sessions expire after ttl seconds, and past max_entries or max_bytes the oldest ones are evicted.
+    """
+
+    def __init__(self, ttl=CONCAT_TTL, max_entries=CONCAT_MAX_SESSIONS, max_bytes=CONCAT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, chat_id, s3_key, photo):
+        """
+        Parameters:
+        chat_id (int): Chat waiting for its second image
+        s3_key (str): Where the first image is archived, used when no local copy is left
+        photo (bytes): The encoded first image
+        """
+        with self._lock:
+            self._evict_expired()
+            self._remove(chat_id)
+            self._sessions[chat_id] = {'s3_key': s3_key, 'photo': photo, 'created_at': time.monotonic()}
+            self._bytes += len(photo)
+            while len(self._sessions) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._sessions)))
+
+    def pop(self, chat_id):
+        """
+        Returns:
+        dict: {'s3_key', 'photo'} of the chat's pending session, None when there is none
+        """
+        with self._lock:
+            self._evict_expired()
+            session = self._remove(chat_id)
+        if session:
+            del session['created_at']
+        return session
+
+    def _remove(self, chat_id):
+        session = self._sessions.pop(chat_id, None)
+        if session:
+            self._bytes -= len(session['photo'])
+        return session
+
+    def _evict_expired(self):
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            chat_id, session = next(iter(self._sessions.items()))
+            if session['created_at'] > deadline:
+                break
+            self._remove(chat_id)
+
+    def __contains__(self, chat_id):
+        with self._lock:
+            self._evict_expired()
+            return chat_id in self._sessions
+
+    def __len__(self):
+        with self._lock:
+            self._evict_expired()
+            return len(self._sessions)
+
+
+class SQLiteConcatStore:
+    """
+    First halves of pending concats in a SQLite file, shared by every worker process on the host
+
+    The encoded first image is stored with the session, so the second half does not download it from S3.
+    """
+
+    def __init__(self, path=CONCAT_STORE_PATH, ttl=CONCAT_TTL, max_entries=CONCAT_MAX_SESSIONS, max_bytes=CONCAT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        with transaction(self.path) as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS concat_sessions ('
+                'chat_id INTEGER PRIMARY KEY, s3_key TEXT, photo BLOB, created_at REAL NOT NULL)'
+            )
+
+    def put(self, chat_id, s3_key, photo):
+        """Same as MemoryConcatStore.put"""
+        with transaction(self.path) as db:
+            now = time.time()
+            db.execute('DELETE FROM concat_sessions WHERE created_at <= ?', (now - self.ttl,))
+            db.execute(
+                'INSERT OR REPLACE INTO concat_sessions (chat_id, s3_key, photo, created_at) VALUES (?, ?, ?, ?)',
+                (chat_id, s3_key, photo, now)
+            )
+            db.execute(
+                'DELETE FROM concat_sessions WHERE chat_id NOT IN '
+                '(SELECT chat_id FROM concat_sessions ORDER BY created_at DESC LIMIT ?)',
+                (self.max_entries,)
+            )
+            # Newest first, drop the sessions from where the running total passes max_bytes
+            db.execute(
+                'DELETE FROM concat_sessions WHERE chat_id IN (SELECT chat_id FROM ('
+                'SELECT chat_id, SUM(LENGTH(photo)) OVER (ORDER BY created_at DESC, chat_id) AS total '
+                'FROM concat_sessions) WHERE total > ?)',
+                (self.max_bytes,)
+            )
+
+    def pop(self, chat_id):
+        with transaction(self.path) as db:
+            row = db.execute(
+                'SELECT s3_key, photo FROM concat_sessions WHERE chat_id = ? AND created_at > ?',
+                (chat_id, time.time() - self.ttl)
+            ).fetchone()
+            db.execute('DELETE FROM concat_sessions WHERE chat_id = ?', (chat_id,))
+
+        if not row:
+            return None
+        return {'s3_key': row[0], 'photo': row[1]}
+
+    def __contains__(self, chat_id):
+        with transaction(self.path) as db:
+            return db.execute(
+                'SELECT 1 FROM concat_sessions WHERE chat_id = ? AND created_at > ?',
+                (chat_id, time.time() - self.ttl)
+            ).fetchone() is not None
+
+    def __len__(self):
+        with transaction(self.path) as db:
+            return db.execute(
+                'SELECT COUNT(*) FROM concat_sessions WHERE created_at > ?', (time.time() - self.ttl,)
+            ).fetchone()[0]
+
+
+def build_concat_store():
+    """The store selected by CONCAT_STORE: 'memory' for one process, 'sqlite' to share it across workers"""
+    if CONCAT_STORE == 'sqlite':
+        return SQLiteConcatStore()
+    if CONCAT_STORE == 'memory':
+        return MemoryConcatStore()
+    raise ValueError("CONCAT_STORE must be 'memory' or 'sqlite'")
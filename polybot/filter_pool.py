@@ -0,0 +1,106 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from polybot.img_proc import Img
+
+PIXEL_DTYPE = np.float32
+
+
+class _SharedImg:
+    """Picklable handle to an image whose pixels live in a shared memory block"""
+
+    def __init__(self, block_name, shape):
+        self.block_name = block_name
+        self.shape = shape
+
+
+def _share(pixels):
+    block = shared_memory.SharedMemory(create=True, size=max(pixels.nbytes, 1))
+    np.ndarray(pixels.shape, dtype=PIXEL_DTYPE, buffer=block.buf)[...] = pixels
+    return block
+
+
+def _run_filter(operation, target, args, kwargs, out_name, out_size):
+    """
+    Worker side: attach to the shared blocks, run the filter and write the result into the output block
+
+    Returns:
+    tuple: Shape of the result, the pixels themselves stay in the output block
+    """
+    blocks = []
+    try:
+        def attach(handle):
+            block = shared_memory.SharedMemory(name=handle.block_name)
+            blocks.append(block)
+            return Img.from_array(np.ndarray(handle.shape, dtype=PIXEL_DTYPE, buffer=block.buf))
+
+        img = attach(target)
+        args = [attach(arg) if isinstance(arg, _SharedImg) else arg for arg in args]
+        getattr(img, operation)(*args, **kwargs)
+
+        result = img.pixels
+        if result.size > out_size:
+            raise ValueError(f"{operation} result does not fit in the shared output block")
+        out_block = shared_memory.SharedMemory(name=out_name)
+        blocks.append(out_block)
+        np.ndarray(result.shape, dtype=PIXEL_DTYPE, buffer=out_block.buf)[...] = result
+        return result.shape
+    finally:
+        # Views on the shared buffers must be gone before the blocks can be closed
+        img = args = result = None
+        for block in blocks:
+            block.close()
+
+
+class FilterPool:
+    """
+    Runs Img filters in worker processes so several photos are processed in parallel across cores
+
+    Pixels travel through shared memory instead of being pickled. The output block is sized to
+    the total input pixels, counted over three channels when any input is in color, which is enough
+    for every Img filter (none of them grows the pixel count beyond spreading grayscale over color).
+
+    Parameters:
+    max_workers (int, optional): Number of worker processes, defaults to the number of CPUs
+    """
+
+    def __init__(self, max_workers=None):
+        # forkserver keeps workers clean of the threads running in the bot process
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+
+    def apply(self, img, operation, *args, **kwargs):
+        """
+        Run img.<operation>(*args, **kwargs) in a worker process and store the result back in img
+
+        Img arguments (like the second image of concat) are shared the same way as img itself.
+        """
+        blocks = []
+        try:
+            def share(image):
+                block = _share(image.pixels)
+                blocks.append(block)
+                return _SharedImg(block.name, image.pixels.shape)
+
+            target = share(img)
+            args = tuple(share(arg) if isinstance(arg, Img) else arg for arg in args)
+
+            shared = [image for image in [target, *args] if isinstance(image, _SharedImg)]
+            # concat spreads a grayscale image over three channels when the other one is in color
+            channels = 3 if any(len(image.shape) == 3 for image in shared) else 1
+            out_size = sum(int(np.prod(image.shape[:2], dtype=np.int64)) * channels for image in shared)
+            out_block = shared_memory.SharedMemory(create=True, size=max(out_size * PIXEL_DTYPE().itemsize, 1))
+            blocks.append(out_block)
+
+            future = self._executor.submit(_run_filter, operation, target, args, kwargs, out_block.name, out_size)
+            shape = future.result()
+
+            img.pixels = np.ndarray(shape, dtype=PIXEL_DTYPE, buffer=out_block.buf).copy()
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,70 @@
+"""
+gunicorn settings for production, run from the project root with
+
+    gunicorn -c polybot/gunicorn.conf.py polybot.app:app
+
+Every worker process builds its own bot, job queue and filter pool after the fork, and checks the
+Telegram webhook in the background. A lock file makes them take turns, so only the first one sets it,
+and a worker that replaces a dead one checks again. State the workers share lives outside the processes:
+pending concats, albums being collected and the per-chat scheduler limits in SQLite stores,
+and the metrics in PROMETHEUS_MULTIPROC_DIR.
+"""
+import os
+import shutil
+import tempfile
+
+# Set before the app is imported, the workers inherit them.
+# A concat's second photo and the photos of an album may reach different workers,
+# and a chat's updates are spread over the workers, its rate limits and order have to hold across them.
+os.environ.setdefault('CONCAT_STORE', 'sqlite')
+os.environ.setdefault('MEDIA_GROUP_STORE', 'sqlite')
+os.environ.setdefault('SCHEDULER_STORE', 'sqlite')
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'polybot_metrics'))
+os.environ.setdefault('WEBHOOK_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'polybot_webhook.lock'))
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8443')
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+# Each request only queues the update, so a few threads per worker are enough
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+# Long enough for app.shutdown(), which drains the job queue and then the S3 archiver for up to
+# JOB_DRAIN_TIMEOUT each
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 2 * float(os.getenv('JOB_DRAIN_TIMEOUT', 60)) + 10))
+# FILTER_WORKERS counts the filter processes of the whole host, each worker gets its share
+filter_workers = int(os.getenv('FILTER_WORKERS', os.cpu_count() or 1))
+filter_workers_per_worker = max(1, filter_workers // workers) if filter_workers > 0 else 0
+# Never import the app in the master: boto3, the Telegram session and the filter pool are not fork safe
+preload_app = False
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+
+def on_starting(server):
+    # Samples of workers from a previous run would otherwise be added to the new ones
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+    # Jobs left by workers of a previous run could carry the pids of the new ones
+    scheduler_store = os.getenv('SCHEDULER_STORE_PATH', '/tmp/polybot_scheduler.sqlite3')
+    for path in (scheduler_store, scheduler_store + '-wal', scheduler_store + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def post_fork(server, worker):
+    from polybot import app
+
+    app.init_worker(filter_workers=filter_workers_per_worker)
+
+
+def worker_exit(server, worker):
+    from polybot import app
+
+    app.shutdown()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,63 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 16))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 3))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', 0.5))
+HTTP_KEEP_ALIVE = os.getenv('HTTP_KEEP_ALIVE', 'true').lower() != 'false'
+
+# Responses worth retrying, only for idempotent methods so a POST is never sent twice
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def build_session(pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF, keep_alive=HTTP_KEEP_ALIVE):
+    """
+    Build a requests session with a connection pool and retry/backoff
+
+    Parameters:
+    pool_size (int): Connections kept open per host
+    retries (int): Retries for connection errors, and for retryable statuses on idempotent methods
+    backoff_factor (float): Exponential backoff factor between retries, in seconds
+    keep_alive (bool): Reuse connections between requests, False sends 'Connection: close'
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def get_session():
+    """The session shared by every outbound HTTP call of the bot, built on first use"""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = build_session()
+        return _shared_session
+
+
+def use_for_telegram(session):
+    """
+    Make pyTelegramBotAPI send its requests through the given session
+
+    By default the library opens one session per thread and recreates it every 10 minutes.
+    """
+    from telebot import apihelper
+
+    apihelper.session = session
+    apihelper.SESSION_TIME_TO_LIVE = None
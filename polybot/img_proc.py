@@ -1,8 +1,21 @@
 from pathlib import Path
-from matplotlib.image import imread, imsave
-import random
+import numpy as np
+import io
 import os
 import tempfile
+from polybot.codec import get_codec
+
+ENGINES = ('numpy', 'list')
+# 'gray' converts to one channel on load, 'color' keeps RGB and runs every filter on all channels
+COLOR_MODES = ('gray', 'color')
+BLUR_MODES = ('valid', 'edge', 'reflect', 'constant')
+PIPELINE_OPERATIONS = ('blur', 'contour', 'rotate', 'flip_horizontal', 'flip_vertical', 'transpose',
+                       'salt_n_pepper', 'gaussian', 'speckle', 'segment')
+# Operations whose output is random unless they are given a seed
+NOISE_OPERATIONS = ('salt_n_pepper', 'gaussian', 'speckle')
+# Elements per band when fused pipeline steps stream over the pixels, small enough to stay in cache
+FUSED_BAND_SIZE = 1 << 16
+
 
 def rgb2gray(rgb):
     r, g, b = rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2]
@@ -10,14 +23,370 @@ def rgb2gray(rgb):
     return gray
 
 
+def box_sum(pixels, size):
+    """
+    Sum every size x size window of a 2D array using a summed-area table
+
+    Each window costs four lookups, so the runtime does not depend on `size`.
+    The result has the 'valid' shape: (height - size + 1, width - size + 1).
+    Trailing axes, like the channels of a color image, are summed independently.
+    """
+    height, width = pixels.shape[:2]
+    table = np.zeros((height + 1, width + 1, *pixels.shape[2:]), dtype=np.float64)
+    np.cumsum(pixels, axis=0, dtype=np.float64, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+
+    return table[size:, size:] - table[:-size, size:] - table[size:, :-size] + table[:-size, :-size]
+
+
+def rotation_turns(turns=1, angle=None):
+    """
+    Reduce a rotation to the number of clockwise quarter turns it needs
+
+    Parameters:
+    turns (int): Clockwise quarter turns, negative turns rotate counterclockwise
+    angle (int, optional): Clockwise angle in degrees, overrides turns, must be a multiple of 90
+
+    Returns:
+    int: Quarter turns in 0..3
+    """
+    if angle is not None:
+        if angle % 90:
+            raise ValueError("Rotation angle must be a multiple of 90 degrees")
+        turns = angle // 90
+    return turns % 4
+
+
+def noise_indices(size, salt_prob, pepper_prob, seed=None):
+    """
+    Pick the flat pixel indices for salt and pepper noise in one vectorized draw
+
+    The indices are drawn without replacement, so no pixel gets both salt and pepper.
+
+    Parameters:
+    size (int): Number of pixels
+    salt_prob (float): Fraction of pixels turned white
+    pepper_prob (float): Fraction of pixels turned black
+    seed (int or numpy.random.Generator, optional): Seed or generator, None draws fresh entropy
+
+    Returns:
+    tuple: (salt, pepper) arrays of flat indices
+    """
+    if salt_prob < 0 or pepper_prob < 0 or salt_prob + pepper_prob > 1:
+        raise ValueError("Noise probabilities must be non-negative and add up to at most 1")
+
+    num_salt = int(size * salt_prob)
+    num_pepper = int(size * pepper_prob)
+    chosen = np.random.default_rng(seed).choice(size, num_salt + num_pepper, replace=False)
+    return chosen[:num_salt], chosen[num_salt:]
+
+
+def contour_kernel():
+    return lambda band: np.abs(np.diff(band, axis=1))
+
+
+def segment_kernel(threshold=128):
+    return lambda band: np.where(band > threshold, 255, 0).astype(np.float32)
+
+
+# Filters whose output rows only depend on the same input rows. Consecutive steps from this
+# table are fused by Pipeline into a single pass over the image.
+ROW_KERNELS = {
+    'contour': contour_kernel,
+    'segment': segment_kernel,
+}
+
+
+def run_fused(pixels, kernels):
+    """
+    Apply several row kernels in one pass, band by band, so the intermediate results stay in cache
+    """
+    height = pixels.shape[0]
+    band_rows = max(1, FUSED_BAND_SIZE // max(pixels[0].size, 1))
+    out = None
+
+    for start in range(0, height, band_rows):
+        band = pixels[start:start + band_rows]
+        for kernel in kernels:
+            band = kernel(band)
+        if out is None:
+            out = np.empty((height, *band.shape[1:]), dtype=np.float32)
+        out[start:start + band_rows] = band
+
+    return out
+
+
+class _PixelList(list):
+    """
+    The rows of a pixel array as nested lists, item assignments at any level are written back to the array
+    """
+
+    __slots__ = ('_array', '_prefix')
+
+    @classmethod
+    def of(cls, array, values=None, prefix=()):
+        """Lists of array[prefix], from its tolist() values when already known"""
+        values = array[prefix].tolist() if values is None else values
+        if len(prefix) + 2 < array.ndim:
+            values = [cls.of(array, row, prefix + (i,)) for i, row in enumerate(values)]
+        elif len(prefix) + 2 == array.ndim:
+            # The innermost lists, built inline since there is one per pixel in color mode
+            values = [cls(row) for row in values]
+            for i, row in enumerate(values):
+                row._array = array
+                row._prefix = prefix + (i,)
+        lists = cls(values)
+        lists._array = array
+        lists._prefix = prefix
+        return lists
+
+    def __setitem__(self, index, value):
+        self._array[self._prefix + (index,)] = value
+        for i in (range(len(self))[index] if isinstance(index, slice) else [index % len(self)]):
+            item = self._array[self._prefix + (i,)]
+            super().__setitem__(i, _PixelList.of(self._array, prefix=self._prefix + (i,)) if np.ndim(item) else float(item))
+
+
+class Pipeline:
+    """
+    Lazily chained Img filters, nothing runs until run() is called
+
+    Consecutive contour/segment steps are fused and applied in a single pass over the pixels.
+    """
+
+    def __init__(self, img):
+        self.img = img
+        self.steps = []
+
+    def add(self, operation, *args):
+        if operation not in PIPELINE_OPERATIONS:
+            raise ValueError(f"Pipeline operation must be one of {PIPELINE_OPERATIONS}")
+        self.steps.append((operation, *args))
+        return self
+
+    def encode(self, format='jpeg'):
+        """
+        Run the steps and encode the result in memory
+
+        Returns:
+        bytes: The encoded image
+        """
+        return self.run().encode(format)
+
+    def blur(self, blur_level=16, mode='valid'):
+        return self.add('blur', blur_level, mode)
+
+    def contour(self):
+        return self.add('contour')
+
+    def rotate(self, turns=1, angle=None):
+        return self.add('rotate', rotation_turns(turns, angle))
+
+    def flip_horizontal(self):
+        return self.add('flip_horizontal')
+
+    def flip_vertical(self):
+        return self.add('flip_vertical')
+
+    def transpose(self):
+        return self.add('transpose')
+
+    def salt_n_pepper(self, salt_prob=0.01, pepper_prob=0.01, seed=None):
+        return self.add('salt_n_pepper', salt_prob, pepper_prob, seed)
+
+    def gaussian(self, sigma=10, seed=None):
+        return self.add('gaussian', sigma, seed)
+
+    def speckle(self, variance=0.04, seed=None):
+        return self.add('speckle', variance, seed)
+
+    def segment(self, threshold=128):
+        return self.add('segment', threshold)
+
+    def run(self):
+        """
+        Apply the steps to the image
+
+        Returns:
+        Img: The image the pipeline was built on
+        """
+        if self.img.engine == 'list':
+            for operation, *args in self.steps:
+                getattr(self.img, operation)(*args)
+            return self.img
+
+        fused = []
+        for operation, *args in self._fold_rotations():
+            if operation in ROW_KERNELS:
+                fused.append(ROW_KERNELS[operation](*args))
+                continue
+            self._flush(fused)
+            getattr(self.img, operation)(*args)
+        self._flush(fused)
+
+        return self.img
+
+    def _fold_rotations(self):
+        """Merge back-to-back rotations into one, so 'rotate | rotate' copies the pixels once"""
+        steps = []
+        for operation, *args in self.steps:
+            if operation == 'rotate' and steps and steps[-1][0] == 'rotate':
+                steps[-1] = ('rotate', rotation_turns(steps[-1][1] + rotation_turns(*args)))
+            elif operation == 'rotate':
+                steps.append(('rotate', rotation_turns(*args)))
+            else:
+                steps.append((operation, *args))
+        return [step for step in steps if step != ('rotate', 0)]
+
+    def _flush(self, kernels):
+        if kernels:
+            self.img.pixels = run_fused(self.img.pixels, kernels)
+            kernels.clear()
+
+
 class Img:
 
-    def __init__(self, path):
+    def __init__(self, path, engine='numpy', max_size=None, mode='gray', max_pixels=None):
         """
-        Do not change the constructor implementation
+        Load an image from disk as a pixel matrix
+
+        Parameters:
+        path (str): Path of the image to load
+        engine (str): 'numpy' keeps the pixels in a contiguous float32 ndarray and runs
+                      vectorized filters on it, 'list' keeps the original nested-list engine
+        max_size (tuple, optional): (width, height) to cover, lets the codec downscale JPEGs while decoding
+        mode (str): 'gray' converts to grayscale on load, 'color' keeps the RGB channels (numpy engine only)
+        max_pixels (int, optional): Downscale on load so the image has at most this many pixels
+        """
+        self._setup(path, engine, mode)
+        self._load(get_codec().decode(path, self.path.suffix.lstrip('.') or None, max_size, max_pixels), mode)
+
+    @classmethod
+    def from_array(cls, pixels, path='image.jpg', engine='numpy'):
+        """
+        Build an image from an existing pixel matrix instead of reading a file
+
+        Parameters:
+        pixels (array-like): 2D grayscale or (height, width, 3) color pixel matrix
+        path (str): Name used by save_img() when no custom path is given
+        engine (str): 'numpy' or 'list', see Img()
         """
+        img = cls.__new__(cls)
+        img._setup(path, engine)
+        img.pixels = pixels
+        return img
+
+    @classmethod
+    def from_bytes(cls, source, path='image.jpg', engine='numpy', max_size=None, mode='gray', max_pixels=None):
+        """
+        Decode an image from memory instead of reading it from disk
+
+        Parameters:
+        source (bytes or file-like): Encoded image, e.g. a photo downloaded from Telegram
+        path (str): Name used by save_img() when no custom path is given
+        engine (str): 'numpy' or 'list', see Img()
+        max_size (tuple, optional): (width, height) to cover, see Img()
+        mode (str): 'gray' or 'color', see Img()
+        max_pixels (int, optional): Pixel cap applied while decoding, see Img()
+        """
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        else:
+            source.seek(0)
+
+        img = cls.__new__(cls)
+        img._setup(path, engine, mode)
+        img._load(get_codec().decode(source, img.path.suffix.lstrip('.') or 'jpeg', max_size, max_pixels), mode)
+        return img
+
+    def _setup(self, path, engine, mode='gray'):
+        if engine not in ENGINES:
+            raise ValueError(f"Engine must be one of {ENGINES}")
+        if mode not in COLOR_MODES:
+            raise ValueError(f"Mode must be one of {COLOR_MODES}")
+        if mode == 'color' and engine == 'list':
+            raise ValueError("Color mode requires the numpy engine")
+
         self.path = Path(path)
-        self.data = rgb2gray(imread(path)).tolist()
+        self.engine = engine
+        self._rows = None
+        self._pixels = None
+        self._data_view = None
+
+    def _load(self, rgb, mode):
+        self.pixels = rgb if mode == 'color' else rgb2gray(rgb)
+
+    @property
+    def mode(self):
+        """
+        'color' when the pixels have RGB channels, 'gray' otherwise
+        """
+        return 'color' if self.pixels.ndim == 3 else 'gray'
+
+    def to_gray(self):
+        """
+        Convert a color image to grayscale, a no-op for grayscale images
+        """
+        if self.mode == 'color':
+            self.pixels = rgb2gray(self._pixels)
+
+    @property
+    def pixels(self):
+        """
+        The image as a 2D ndarray, or (height, width, 3) in color mode.
+        For the 'list' engine this is a fresh copy of the rows.
+        """
+        if self.engine == 'list':
+            return np.asarray(self._rows, dtype=np.float32)
+        return self._pixels
+
+    @pixels.setter
+    def pixels(self, value):
+        if self.engine == 'list':
+            self._rows = np.asarray(value).tolist()
+        else:
+            self._pixels = np.ascontiguousarray(value, dtype=np.float32)
+            self._data_view = None
+
+    @property
+    def data(self):
+        """
+        The image as a list of rows, kept for backward compatibility.
+
+        With the 'numpy' engine the lists are built from the pixels after every filter, and
+        in-place edits such as img.data[0][0] = 255 are written through to `pixels`.
+        Read `data` again after changing `pixels` in place.
+        """
+        if self.engine == 'list':
+            return self._rows
+        if self._data_view is None:
+            self._data_view = _PixelList.of(self._pixels)
+        return self._data_view
+
+    @data.setter
+    def data(self, value):
+        if self.engine == 'list':
+            self._rows = value
+        else:
+            self.pixels = value
+
+    def pipeline(self):
+        """
+        Start a lazy filter chain on this image, e.g. img.pipeline().blur(8).contour().segment(100).run()
+        """
+        return Pipeline(self)
+
+    def run_pipeline(self, steps):
+        """
+        Apply a list of (operation, *args) steps as one fused pipeline
+
+        Parameters:
+        steps (list): Steps like [('blur', 8), ('contour',), ('segment', 100)]
+        """
+        pipeline = self.pipeline()
+        for operation, *args in steps:
+            pipeline.add(operation, *args)
+        pipeline.run()
 
     def save_img(self, custom_path=None):
         """
@@ -41,11 +410,52 @@ class Img:
         # Make sure directory exists
         os.makedirs(os.path.dirname(new_path), exist_ok=True)
         
-        imsave(new_path, self.data, cmap='gray')
+        get_codec().save(self.pixels, new_path)
         return new_path
 
-    def blur(self, blur_level=16):
+    def encode(self, format='jpeg', **options):
+        """
+        Encode the image in memory, grayscale stretched to 0-255 and color images as RGB clipped to 0-255
+
+        Parameters:
+        format (str): Image format, 'jpeg' by default
+        options: Codec overrides, e.g. quality=90 or progressive=False for JPEG
+
+        Returns:
+        bytes: The encoded image, ready to be uploaded or sent without touching the disk
+        """
+        return get_codec().encode(self.pixels, format, **options)
+
+    def blur(self, blur_level=16, mode='valid'):
+        """
+        Box blur the image, each output pixel is the floored mean of a blur_level x blur_level window
+
+        Parameters:
+        blur_level (int): Side of the averaging window, default 16
+        mode (str): 'valid' only keeps windows that fit inside the image, so the result shrinks
+                    by blur_level - 1 pixels. 'edge', 'reflect' and 'constant' (zeros) pad the
+                    image first so the result keeps the input dimensions.
+        """
+        if blur_level < 1:
+            raise ValueError("Blur level must be a positive integer")
+        if mode not in BLUR_MODES:
+            raise ValueError(f"Blur mode must be one of {BLUR_MODES}")
+
+        if self.engine == 'list':
+            if mode != 'valid':
+                raise ValueError("Padded blur modes require the numpy engine")
+            return self._blur_list(blur_level)
+
+        pixels = self._pixels
+        if mode != 'valid':
+            before = (blur_level - 1) // 2
+            after = blur_level - 1 - before
+            channels = ((0, 0),) * (pixels.ndim - 2)
+            pixels = np.pad(pixels, ((before, after), (before, after), *channels), mode=mode)
 
+        self.pixels = np.floor_divide(box_sum(pixels, blur_level), blur_level ** 2)
+
+    def _blur_list(self, blur_level):
         height = len(self.data)
         width = len(self.data[0])
         filter_sum = blur_level ** 2
@@ -62,6 +472,12 @@ class Img:
         self.data = result
 
     def contour(self):
+        if self.engine == 'list':
+            return self._contour_list()
+
+        self.pixels = contour_kernel()(self._pixels)
+
+    def _contour_list(self):
         for i, row in enumerate(self.data):
             res = []
             for j in range(1, len(row)):
@@ -69,10 +485,63 @@ class Img:
 
             self.data[i] = res
 
-    def rotate(self):
+    def rotate(self, turns=1, angle=None):
         """
-        Rotates the image 90 degrees clockwise
+        Rotates the image clockwise by quarter turns
+
+        np.rot90 returns a strided view, so any rotation costs a single copy into contiguous pixels.
+
+        Parameters:
+        turns (int): Clockwise quarter turns, reduced mod 4, negative turns rotate counterclockwise
+        angle (int, optional): Clockwise angle in degrees instead of turns, must be a multiple of 90
         """
+        turns = rotation_turns(turns, angle)
+        if turns == 0:
+            return
+
+        if self.engine == 'list':
+            return self._rotate_list(turns)
+
+        self.pixels = np.rot90(self._pixels, k=-turns)
+
+    def flip_horizontal(self):
+        """
+        Mirrors the image left to right
+        """
+        if self.engine == 'list':
+            self.data = [row[::-1] for row in self.data]
+            return
+
+        self.pixels = self._pixels[:, ::-1]
+
+    def flip_vertical(self):
+        """
+        Mirrors the image top to bottom
+        """
+        if self.engine == 'list':
+            self.data = self.data[::-1]
+            return
+
+        self.pixels = self._pixels[::-1]
+
+    def transpose(self):
+        """
+        Swaps rows and columns, mirroring the image over its main diagonal
+        """
+        if self.engine == 'list':
+            self.data = [list(column) for column in zip(*self.data)]
+            return
+
+        self.pixels = np.swapaxes(self._pixels, 0, 1)
+
+    def _rotate_list(self, turns=1):
+        if turns == 2:
+            self.data = [row[::-1] for row in self.data[::-1]]
+            return
+        if turns == 3:
+            self.data = [list(column) for column in zip(*self.data)][::-1]
+            return
+
         height = len(self.data)
         width = len(self.data[0])
         
@@ -86,30 +555,63 @@ class Img:
         
         self.data = rotated_data
 
-    def salt_n_pepper(self, salt_prob=0.01, pepper_prob=0.01):
+    def salt_n_pepper(self, salt_prob=0.01, pepper_prob=0.01, seed=None):
         """
         Add salt and pepper noise to the image
-        
+
+        Exactly salt_prob and pepper_prob of the pixels are changed, and no pixel gets both.
+        In color mode every channel of a noisy pixel is changed.
+
         Parameters:
         salt_prob (float): Probability of salt noise (white pixels), default 0.01
         pepper_prob (float): Probability of pepper noise (black pixels), default 0.01
-        """        
-        height = len(self.data)
+        seed (int or numpy.random.Generator, optional): Makes the noise reproducible
+        """
+        if self.engine == 'list':
+            return self._salt_n_pepper_list(salt_prob, pepper_prob, seed)
+
+        height, width = self._pixels.shape[:2]
+        salt, pepper = noise_indices(height * width, salt_prob, pepper_prob, seed)
+        pixels = self._pixels.copy()
+        channels = pixels.reshape(height * width, -1)
+        channels[salt] = 255
+        channels[pepper] = 0
+
+        self.pixels = pixels
+
+    def _salt_n_pepper_list(self, salt_prob, pepper_prob, seed=None):
         width = len(self.data[0])
-        
-        # Apply salt (white) noise
-        num_salt = int(height * width * salt_prob)
-        for _ in range(num_salt):
-            y = random.randint(0, height - 1)
-            x = random.randint(0, width - 1)
-            self.data[y][x] = 255  # White pixel
-        
-        # Apply pepper (black) noise
-        num_pepper = int(height * width * pepper_prob)
-        for _ in range(num_pepper):
-            y = random.randint(0, height - 1)
-            x = random.randint(0, width - 1)
-            self.data[y][x] = 0  # Black pixel
+        salt, pepper = noise_indices(len(self.data) * width, salt_prob, pepper_prob, seed)
+
+        for index in salt.tolist():
+            self.data[index // width][index % width] = 255  # White pixel
+
+        for index in pepper.tolist():
+            self.data[index // width][index % width] = 0  # Black pixel
+
+    def gaussian(self, sigma=10, seed=None):
+        """
+        Add gaussian noise to every pixel, clipped to 0-255
+
+        Parameters:
+        sigma (float): Standard deviation of the noise in gray levels, default 10
+        seed (int or numpy.random.Generator, optional): Makes the noise reproducible
+        """
+        pixels = self.pixels
+        noise = np.random.default_rng(seed).standard_normal(pixels.shape, dtype=np.float32)
+        self.pixels = np.clip(pixels + noise * sigma, 0, 255)
+
+    def speckle(self, variance=0.04, seed=None):
+        """
+        Add multiplicative speckle noise, each pixel is scaled by 1 + n with n ~ N(0, variance)
+
+        Parameters:
+        variance (float): Variance of the multiplicative noise, default 0.04
+        seed (int or numpy.random.Generator, optional): Makes the noise reproducible
+        """
+        pixels = self.pixels
+        noise = np.random.default_rng(seed).standard_normal(pixels.shape, dtype=np.float32)
+        self.pixels = np.clip(pixels * (1 + noise * np.sqrt(variance)), 0, 255)
 
     def segment(self, threshold=128):
         """
@@ -118,6 +620,12 @@ class Img:
         Parameters:
         threshold (int): Pixel values above this will be white, below will be black
         """
+        if self.engine == 'list':
+            return self._segment_list(threshold)
+
+        self.pixels = segment_kernel(threshold)(self._pixels)
+
+    def _segment_list(self, threshold):
         height = len(self.data)
         width = len(self.data[0])
         
@@ -140,7 +648,73 @@ class Img:
         """
         if direction not in ['horizontal', 'vertical']:
             raise ValueError("Direction must be 'horizontal' or 'vertical'")
-        
+
+        if self.engine == 'list':
+            return self._concat_list(other_img, direction)
+
+        pixels = self._pixels
+        other_pixels = other_img.pixels
+
+        # A grayscale half is spread over three channels so the color half keeps its color
+        if pixels.ndim != other_pixels.ndim:
+            pixels, other_pixels = (np.repeat(p[:, :, np.newaxis], 3, axis=2) if p.ndim == 2 else p
+                                    for p in (pixels, other_pixels))
+
+        if direction == 'horizontal':
+            # If heights are different, crop both to the smaller height
+            min_height = min(pixels.shape[0], other_pixels.shape[0])
+            self.pixels = np.hstack((pixels[:min_height], other_pixels[:min_height]))
+        else:
+            # If widths are different, crop both to the smaller width
+            min_width = min(pixels.shape[1], other_pixels.shape[1])
+            self.pixels = np.vstack((pixels[:, :min_width], other_pixels[:, :min_width]))
+
+    def concat_grid(self, other_imgs, columns=None):
+        """
+        Arrange this image and the others in a grid, row by row
+
+        Every cell is cropped to the smallest height and width among the images, the way concat
+        crops to the smaller side. Cells left over in the last row are black.
+
+        Parameters:
+        other_imgs (list): Img instances placed after this one
+        columns (int, optional): Images per row, defaults to a grid as close to square as possible
+        """
+        images = [self, *other_imgs]
+        columns = columns or int(np.ceil(np.sqrt(len(images))))
+        if columns < 1:
+            raise ValueError("A grid needs at least one column")
+        rows = -(-len(images) // columns)
+
+        if self.engine == 'list':
+            return self._concat_grid_list(images, rows, columns)
+
+        cells = [image.pixels for image in images]
+        height = min(cell.shape[0] for cell in cells)
+        width = min(cell.shape[1] for cell in cells)
+        # A grayscale image is spread over three channels when any of the others is in color
+        color = any(cell.ndim == 3 for cell in cells)
+        grid = np.zeros((rows * height, columns * width) + ((3,) if color else ()), dtype=np.float32)
+        for i, cell in enumerate(cells):
+            row, column = divmod(i, columns)
+            cell = cell[:height, :width]
+            if color and cell.ndim == 2:
+                cell = cell[:, :, np.newaxis]
+            grid[row * height:(row + 1) * height, column * width:(column + 1) * width] = cell
+        self.pixels = grid
+
+    def _concat_grid_list(self, images, rows, columns):
+        height = min(len(image.data) for image in images)
+        width = min(len(image.data[0]) for image in images)
+        cells = [[line[:width] for line in image.data[:height]] for image in images]
+        cells += [[[0] * width for _ in range(height)]] * (rows * columns - len(cells))
+
+        self.data = [
+            [value for cell in cells[row * columns:(row + 1) * columns] for value in cell[y]]
+            for row in range(rows) for y in range(height)
+        ]
+
+    def _concat_list(self, other_img, direction):
         # Convert other_img to grayscale if it's not already
         other_data = other_img.data
         
@@ -170,4 +744,4 @@ class Img:
             # Concatenate vertically
             result = self.data + other_data
         
-        self.data = result
\ No newline at end of file
+        self.data = result
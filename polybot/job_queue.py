@@ -0,0 +1,91 @@
+import queue
+import threading
+import time
+from loguru import logger
+
+_STOP = object()
+
+
+class JobQueue:
+    """
+    Bounded in-process queue that runs jobs on a pool of worker threads
+
+    Parameters:
+    handler (callable): Called by a worker with the arguments given to submit()
+    max_size (int): Number of jobs that may wait in the queue before submit() rejects new ones
+    workers (int): Number of worker threads
+    name (str): Prefix for the worker thread names, shows up in the logs
+    """
+
+    def __init__(self, handler, max_size=100, workers=4, name='job'):
+        if max_size < 1 or workers < 1:
+            raise ValueError("Queue size and worker count must be positive")
+
+        self.handler = handler
+        self._queue = queue.Queue(maxsize=max_size)
+        self._accepting = True
+        self._lock = threading.Lock()
+        self._workers = []
+
+        for i in range(workers):
+            worker = threading.Thread(target=self._work, name=f'{name}-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, *args):
+        """
+        Queue a job without blocking
+
+        Returns:
+        bool: False when the queue is full or shutting down, so the caller can apply backpressure
+        """
+        with self._lock:
+            if not self._accepting:
+                return False
+            try:
+                self._queue.put_nowait(args)
+            except queue.Full:
+                logger.warning(f"Job queue is full ({self._queue.maxsize} jobs), rejecting job")
+                return False
+        return True
+
+    @property
+    def pending(self):
+        """Number of jobs waiting for a worker"""
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is _STOP:
+                    return
+                self.handler(*job)
+            except Exception as e:
+                logger.error(f"Job failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, timeout=None):
+        """
+        Stop accepting jobs, let the workers finish everything already queued, then stop them
+
+        Parameters:
+        timeout (float, optional): Seconds to wait for all the workers to finish
+        """
+        with self._lock:
+            if not self._accepting:
+                return
+            self._accepting = False
+
+        logger.info(f"Draining job queue, {self.pending} jobs pending")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # A full queue only takes the stop markers as jobs finish, so they share the deadline too
+        for _ in self._workers:
+            try:
+                self._queue.put(_STOP, timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+            except queue.Full:
+                logger.warning(f"Job queue did not drain within {timeout}s, {self.pending} jobs left")
+                return
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(0, deadline - time.monotonic()))
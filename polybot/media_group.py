@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+from loguru import logger
+from polybot.sqlite_store import transaction
+
+# Seconds to wait for more photos of an album after its last one arrived
+MEDIA_GROUP_WINDOW = float(os.getenv('MEDIA_GROUP_WINDOW', 1.0))
+# Telegram albums hold at most 10 photos, a full album is handed over without waiting
+MEDIA_GROUP_MAX = 10
+# 'memory' collects albums in this process, 'sqlite' collects them across the worker processes of the host
+MEDIA_GROUP_STORE = os.getenv('MEDIA_GROUP_STORE', 'memory')
+MEDIA_GROUP_STORE_PATH = os.getenv('MEDIA_GROUP_STORE_PATH', '/tmp/polybot_media_groups.sqlite3')
+# Photos of albums nobody took, e.g. because the workers waiting on them died, are dropped after this long
+MEDIA_GROUP_MAX_AGE = 3600
+
+
+def group_message(messages):
+    """
+    Merge the updates of one album into a single message
+
+    Returns:
+    dict: The first message with the album caption, which Telegram puts on only one of the photos,
+          and every message of the album under 'media_group', in the order they were sent
+    """
+    messages = sorted(messages, key=lambda m: m.get('message_id', 0))
+    caption = next((m['caption'] for m in messages if m.get('caption')), None)
+    return dict(messages[0], caption=caption, media_group=messages)
+
+
+class MemoryMediaGroupStore:
+    """Photos of the albums being collected, kept in this process"""
+
+    def __init__(self):
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, msg):
+        """
+        Parameters:
+        key (tuple): (chat id, media_group_id) of the album
+        msg (dict): The update of one of its photos
+
+        Returns:
+        int: Photos of the album collected so far
+        """
+        with self._lock:
+            group = self._groups.setdefault(key, {'messages': [], 'updated': 0})
+            group['messages'].append(msg)
+            group['updated'] = time.monotonic()
+            return len(group['messages'])
+
+    def take(self, key, quiet):
+        """
+        Remove and return the album once no photo of it arrived for `quiet` seconds
+
+        Returns:
+        tuple: (messages, None) when the album was taken, (None, wait) with the seconds left to wait
+               when a photo arrived more recently, (None, None) when the album is gone
+        """
+        with self._lock:
+            group = self._groups.get(key)
+            if not group:
+                return None, None
+            wait = group['updated'] + quiet - time.monotonic()
+            if wait > 0:
+                return None, wait
+            return self._groups.pop(key)['messages'], None
+
+
+class SQLiteMediaGroupStore:
+    """
+    Photos of the albums being collected, in a SQLite file shared by every worker process on the host
+
+    Telegram sends each photo of an album as its own update, and under gunicorn they reach different
+    workers. Whichever worker takes the album once it is complete gets all of its photos.
+    """
+
+    def __init__(self, path=MEDIA_GROUP_STORE_PATH):
+        self.path = path
+        with transaction(self.path) as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS media_group_photos (chat_id TEXT NOT NULL, group_id TEXT NOT NULL, '
+                'message_id INTEGER NOT NULL, message TEXT NOT NULL, created_at REAL NOT NULL, '
+                'PRIMARY KEY (chat_id, group_id, message_id))'
+            )
+
+    def add(self, key, msg):
+        """Same as MemoryMediaGroupStore.add, an update Telegram sends again is only kept once"""
+        chat_id, group_id = str(key[0]), str(key[1])
+        with transaction(self.path) as db:
+            now = time.time()
+            db.execute('DELETE FROM media_group_photos WHERE created_at < ?', (now - MEDIA_GROUP_MAX_AGE,))
+            db.execute(
+                'INSERT OR REPLACE INTO media_group_photos (chat_id, group_id, message_id, message, created_at) '
+                'VALUES (?, ?, ?, ?, ?)', (chat_id, group_id, msg.get('message_id', 0), json.dumps(msg), now)
+            )
+            return db.execute(
+                'SELECT COUNT(*) FROM media_group_photos WHERE chat_id = ? AND group_id = ?', (chat_id, group_id)
+            ).fetchone()[0]
+
+    def take(self, key, quiet):
+        """Same as MemoryMediaGroupStore.take"""
+        chat_id, group_id = str(key[0]), str(key[1])
+        with transaction(self.path) as db:
+            count, updated = db.execute(
+                'SELECT COUNT(*), MAX(created_at) FROM media_group_photos WHERE chat_id = ? AND group_id = ?',
+                (chat_id, group_id)
+            ).fetchone()
+            if not count:
+                return None, None
+            wait = updated + quiet - time.time()
+            if wait > 0:
+                return None, wait
+            messages = [json.loads(row[0]) for row in db.execute(
+                'SELECT message FROM media_group_photos WHERE chat_id = ? AND group_id = ? ORDER BY message_id',
+                (chat_id, group_id)
+            )]
+            db.execute('DELETE FROM media_group_photos WHERE chat_id = ? AND group_id = ?', (chat_id, group_id))
+        return messages, None
+
+
+def build_media_group_store():
+    """The store selected by MEDIA_GROUP_STORE: 'memory' for one process, 'sqlite' to share it across workers"""
+    if MEDIA_GROUP_STORE == 'sqlite':
+        return SQLiteMediaGroupStore()
+    if MEDIA_GROUP_STORE == 'memory':
+        return MemoryMediaGroupStore()
+    raise ValueError("MEDIA_GROUP_STORE must be 'memory' or 'sqlite'")
+
+
+class MediaGroupCollector:
+    """
+    Collects the updates Telegram sends for each photo of an album, keyed by chat and media_group_id
+
+    An album is handed to on_group as one message (see group_message()) once no photo of it
+    arrived for `window` seconds, or when it is full. With a SQLiteMediaGroupStore the photos of an
+    album that reached different worker processes are handed over together, by one of them.
+
+    Parameters:
+    on_group (callable): Called with the merged message of each album, from a timer thread
+    window (float): Seconds to wait for the next photo of an album
+    max_size (int): Photos after which an album is handed over right away
+    store (optional): Keeps the photos, a MemoryMediaGroupStore by default
+    """
+
+    def __init__(self, on_group, window=MEDIA_GROUP_WINDOW, max_size=MEDIA_GROUP_MAX, store=None):
+        self.on_group = on_group
+        self.window = window
+        self.max_size = max_size
+        self.store = store or MemoryMediaGroupStore()
+        # Albums this process has photos of, each with the timer that tries to take it
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def add(self, msg):
+        """
+        Returns:
+        bool: True if the message is part of an album and was collected, False if it should be handled alone
+        """
+        if 'media_group_id' not in msg or 'chat' not in msg:
+            return False
+
+        key = (msg['chat']['id'], msg['media_group_id'])
+        if self.store.add(key, msg) >= self.max_size:
+            self._flush(key, quiet=0)
+        else:
+            self._schedule(key, self.window)
+        return True
+
+    def _schedule(self, key, delay):
+        with self._lock:
+            if key in self._timers:
+                self._timers[key].cancel()
+            timer = threading.Timer(delay, self._flush, (key,))
+            timer.daemon = True
+            self._timers[key] = timer
+            timer.start()
+
+    def _flush(self, key, quiet=None):
+        with self._lock:
+            timer = self._timers.pop(key, None)
+            if timer:
+                timer.cancel()
+        try:
+            messages, wait = self.store.take(key, self.window if quiet is None else quiet)
+            if wait:
+                # A photo reached another worker more recently, that worker's timer or this one takes it later
+                self._schedule(key, wait)
+            if messages:
+                self.on_group(group_message(messages))
+        except Exception as e:
+            logger.error(f"Failed to hand over media group {key[1]}: {e}")
+
+    def flush_all(self):
+        """Hand over every album this process has photos of, e.g. on shutdown"""
+        with self._lock:
+            keys = list(self._timers)
+        for key in keys:
+            self._flush(key, quiet=0)
+
+    def __len__(self):
+        """Albums this process has photos of that were not handed over yet"""
+        with self._lock:
+            return len(self._timers)
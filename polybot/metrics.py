@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# From a cached reply to a large blur on a full size photo
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    'polybot_stage_seconds', 'Time spent in each stage of handling a photo',
+    ['stage', 'filter'], buckets=LATENCY_BUCKETS,
+)
+STAGE_ERRORS = Counter('polybot_stage_errors_total', 'Stages that raised or failed', ['stage', 'filter'])
+CACHE_LOOKUPS = Counter('polybot_cache_lookups_total', 'Result and prediction cache lookups', ['cache', 'result'])
+REQUESTS = Counter('polybot_requests_total', 'Photo messages handled, by caption filter', ['filter'])
+ARCHIVE_UPLOADS = Counter('polybot_archive_uploads_total', 'Background S3 archive uploads, by outcome', ['result'])
+
+# The caption filter of the message the current thread is handling, each job worker handles one at a time
+_current = threading.local()
+
+
+def set_filter_label(filter):
+    """Label the stages timed from now on in this thread with `filter`, '' clears it"""
+    _current.filter = filter
+
+
+def count_request(filter):
+    REQUESTS.labels(filter).inc()
+
+
+@contextmanager
+def timed(stage, filter=None):
+    """
+    Record how long the block takes in the stage histogram, and count it as an error if it raises
+
+    Parameters:
+    stage (str): e.g. 'telegram_download', 'filter', 'yolo'
+    filter (str, optional): The filter the stage ran for, defaults to the label set for this thread
+    """
+    if filter is None:
+        filter = getattr(_current, 'filter', '')
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage, filter).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage, filter).observe(time.perf_counter() - start)
+
+
+def count_error(stage, filter=None):
+    """Count a failure that was handled without raising, e.g. a YOLO call that returned an error status"""
+    STAGE_ERRORS.labels(stage, getattr(_current, 'filter', '') if filter is None else filter).inc()
+
+
+def count_cache(cache, hit):
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def count_archive(result):
+    """Count a background archive upload event: 'queued', 'uploaded', 'retried', 'failed' or 'dropped'"""
+    ARCHIVE_UPLOADS.labels(result).inc()
+
+
+def render():
+    """
+    Under gunicorn every worker process writes its samples to PROMETHEUS_MULTIPROC_DIR,
+    and whichever worker serves /metrics adds up the samples of all of them
+
+    Returns:
+    tuple: (body, content type) of the Prometheus text exposition
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
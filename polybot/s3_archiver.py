@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+from loguru import logger
+from polybot.job_queue import JobQueue
+from polybot.metrics import count_archive
+
+
+class S3Archiver:
+    """
+    Uploads originals and results to S3 in the background, for uploads nobody has to wait on
+
+    Parameters:
+    upload (callable): upload(source, object_name), returns the object name or None on failure
+    max_queue (int): Uploads that may wait before new ones are dropped
+    workers (int): Number of upload threads
+    retries (int): Extra attempts for a failed upload
+    backoff (float): Seconds before the first retry, doubled on every attempt
+    """
+
+    def __init__(self, upload, max_queue=200, workers=2, retries=3, backoff=1.0):
+        self.upload = upload
+        self.retries = retries
+        self.backoff = backoff
+        self._counts = {'queued': 0, 'uploaded': 0, 'retried': 0, 'failed': 0, 'dropped': 0}
+        self._counts_lock = threading.Lock()
+        self._jobs = JobQueue(self._archive, max_size=max_queue, workers=workers, name='s3-archive')
+
+    def _count(self, name):
+        with self._counts_lock:
+            self._counts[name] += 1
+        count_archive(name)
+
+    @property
+    def metrics(self):
+        """Snapshot of this archiver's upload counters, /metrics exports them as polybot_archive_uploads_total"""
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def archive(self, source, object_name, remove_after=False):
+        """
+        Queue an upload without waiting for it
+
+        Parameters:
+        source (bytes or str): Bytes to upload, or a file path
+        object_name (str): S3 key, fixed up front so retries overwrite the same object
+        remove_after (bool): Delete the source file once it is uploaded or given up on
+
+        Returns:
+        bool: False when the queue is full and the upload was dropped
+        """
+        if not self._jobs.submit(source, object_name, remove_after):
+            self._count('dropped')
+            logger.error(f"S3 archive queue is full, dropping upload of {object_name}")
+            if remove_after:
+                os.remove(source)
+            return False
+
+        self._count('queued')
+        return True
+
+    def _archive(self, source, object_name, remove_after):
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self._count('retried')
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+                try:
+                    if self.upload(source, object_name):
+                        self._count('uploaded')
+                        return
+                except Exception as e:
+                    logger.error(f"Archive upload of {object_name} failed: {e}")
+
+            self._count('failed')
+            logger.error(f"Giving up on archive upload of {object_name} after {self.retries + 1} attempts")
+        finally:
+            if remove_after and os.path.exists(source):
+                os.remove(source)
+
+    def shutdown(self, timeout=None):
+        """Stop accepting uploads and finish the queued ones"""
+        self._jobs.shutdown(timeout)
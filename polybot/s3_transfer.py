@@ -0,0 +1,99 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from polybot.metrics import count_error
+
+MB = 1024 * 1024
+
+S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', 8 * MB))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv('S3_MULTIPART_CHUNKSIZE', 8 * MB))
+S3_MAX_CONCURRENCY = int(os.getenv('S3_MAX_CONCURRENCY', 10))
+S3_BATCH_WORKERS = int(os.getenv('S3_BATCH_WORKERS', 8))
+
+
+def build_transfer_config(multipart_threshold=S3_MULTIPART_THRESHOLD, multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+                          max_concurrency=S3_MAX_CONCURRENCY):
+    """
+    Transfer settings for single objects: objects over multipart_threshold are split into
+    multipart_chunksize parts that move over max_concurrency parallel streams
+    """
+    # boto3 is imported on first use so starting the bot does not wait for it
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=max_concurrency,
+        use_threads=max_concurrency > 1,
+    )
+
+
+def build_client_config(max_concurrency=S3_MAX_CONCURRENCY, batch_workers=S3_BATCH_WORKERS):
+    """
+    botocore client settings with enough pooled connections for every part of every batch transfer
+    """
+    from botocore.config import Config
+
+    return Config(max_pool_connections=max(10, max_concurrency * batch_workers))
+
+
+class BatchTransfer:
+    """
+    Uploads or downloads many S3 objects concurrently through one shared thread pool
+
+    Parameters:
+    s3_client: boto3 S3 client
+    bucket (str): Bucket name
+    transfer_config (TransferConfig): Settings used for every object
+    workers (int): Objects moved at the same time
+    """
+
+    def __init__(self, s3_client, bucket, transfer_config, workers=S3_BATCH_WORKERS):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.transfer_config = transfer_config
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='s3-batch')
+
+    def _upload(self, data, object_name):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.s3_client.upload_fileobj(io.BytesIO(data), self.bucket, object_name, Config=self.transfer_config)
+            return object_name
+        except ClientError as e:
+            logger.error(f"Failed to upload file to S3: {e}")
+            count_error('s3_upload')
+            return None
+
+    def _download(self, object_name):
+        from botocore.exceptions import ClientError
+
+        buffer = io.BytesIO()
+        try:
+            self.s3_client.download_fileobj(self.bucket, object_name, buffer, Config=self.transfer_config)
+            return buffer.getvalue()
+        except ClientError as e:
+            logger.error(f"Failed to download file from S3: {e}")
+            count_error('s3_download')
+            return None
+
+    def upload_many(self, items):
+        """
+        Parameters:
+        items (list): (bytes, object_name) pairs
+
+        Returns:
+        list: The object name of each upload, None for the ones that failed
+        """
+        return list(self._executor.map(lambda item: self._upload(*item), items))
+
+    def download_many(self, object_names):
+        """
+        Returns:
+        list: The bytes of each object, None for the ones that failed
+        """
+        return list(self._executor.map(self._download, object_names))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,451 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from loguru import logger
+from polybot.sqlite_store import transaction
+
+# Cost units a chat earns per second, one unit is about a megapixel through a blur
+CHAT_RATE = float(os.getenv('CHAT_RATE', 2.0))
+# Cost units a chat can spend at once after being idle
+CHAT_BURST = float(os.getenv('CHAT_BURST', 10.0))
+# Jobs of one chat that may wait before its new ones are rejected
+CHAT_MAX_PENDING = int(os.getenv('CHAT_MAX_PENDING', 10))
+# Jobs of one chat that may run at the same time, 1 also keeps a chat's photos in order
+# (in each process with the memory store, across all of them with the sqlite one)
+CHAT_MAX_RUNNING = int(os.getenv('CHAT_MAX_RUNNING', 1))
+# 'memory' keeps the chat limits in this process, 'sqlite' shares them between the worker processes
+SCHEDULER_STORE = os.getenv('SCHEDULER_STORE', 'memory')
+SCHEDULER_STORE_PATH = os.getenv('SCHEDULER_STORE_PATH', '/tmp/polybot_scheduler.sqlite3')
+
+# Numbers the jobs of every scheduler in this process, so job ids stay unique in a shared SQLite file
+_job_numbers = itertools.count()
+
+
+class TokenBucket:
+    """
+    Allows `rate` cost units per second with bursts of up to `burst` units
+
+    A job costing more than the burst waits for a full bucket and leaves it in debt,
+    so its real cost still delays the next job.
+    """
+
+    def __init__(self, rate=CHAT_RATE, burst=CHAT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost):
+        """
+        Returns:
+        float: Seconds until a job of this cost may start, 0 if it may start now
+        """
+        self._refill()
+        return max(0.0, (min(cost, self.burst) - self.tokens) / self.rate)
+
+    def take(self, cost):
+        self._refill()
+        self.tokens -= cost
+
+
+class MemoryChatLimits:
+    """
+    Per-key token buckets and pending and running counts, kept in this process
+
+    With several worker processes each one has its own, so a chat gets the rate and limits once per process.
+    """
+    # Buckets kept before the ones of idle keys are forgotten
+    max_keys = 1000
+
+    def __init__(self, rate=CHAT_RATE, burst=CHAT_BURST, max_pending=CHAT_MAX_PENDING, max_running=CHAT_MAX_RUNNING):
+        self.rate = rate
+        self.burst = burst
+        self.max_pending = max_pending
+        self.max_running = max_running
+        self._buckets = {}
+        self._pending = {}
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key, job_id, position):
+        """
+        Count a new waiting job of the key
+
+        Parameters:
+        job_id (str): Unique id of the job
+        position (float): Order of the job among the key's jobs, e.g. the Telegram message_id
+
+        Returns:
+        bool: False when the key already has max_pending jobs waiting
+        """
+        with self._lock:
+            if self._pending.get(key, 0) >= self.max_pending:
+                return False
+            if key not in self._pending and len(self._buckets) > self.max_keys:
+                self._forget_idle_keys()
+            self._pending[key] = self._pending.get(key, 0) + 1
+            return True
+
+    def start(self, key, job_id, cost, rate_limited=True):
+        """
+        Move the key's next waiting job to running if its limits allow it
+
+        Parameters:
+        rate_limited (bool): False skips the token bucket, e.g. while draining on shutdown
+
+        Returns:
+        tuple: (True, None) when the job started, otherwise (False, wait) with the seconds until the
+               job should be tried again, wait is None if only running jobs of this process block it
+               (FairScheduler tries again when one of them finishes)
+        """
+        with self._lock:
+            if self._running.get(key, 0) >= self.max_running:
+                return False, None
+            if rate_limited:
+                delay = self._bucket(key).wait_time(cost)
+                if delay > 0:
+                    return False, delay
+                self._bucket(key).take(cost)
+
+            self._pending[key] -= 1
+            if not self._pending[key]:
+                del self._pending[key]
+            self._running[key] = self._running.get(key, 0) + 1
+            return True, None
+
+    def finish(self, key, job_id):
+        with self._lock:
+            self._running[key] -= 1
+            if not self._running[key]:
+                del self._running[key]
+
+    def _bucket(self, key):
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(self.rate, self.burst)
+        return self._buckets[key]
+
+    def _forget_idle_keys(self):
+        # A key with nothing waiting or running and a full bucket is the same as a new key
+        for key in [key for key, bucket in self._buckets.items()
+                    if key not in self._pending and key not in self._running and bucket.wait_time(self.burst) == 0]:
+            del self._buckets[key]
+
+
+class SQLiteChatLimits:
+    """
+    The same limits kept in a SQLite file, shared by every worker process on the host
+
+    A chat's rate, pending and running limits hold across the processes, whichever one its updates reach.
+    A job also waits until the chat's jobs with a lower position have started, so with CHAT_MAX_RUNNING=1
+    a chat's photos are handled in message order across the processes too.
+    Jobs of a worker process that died are forgotten the next time the chat is looked at.
+    """
+    # A process is not notified when a job of another one finishes, it checks again after this long
+    # while a job of another process blocks one of its own
+    poll_interval = 0.05
+
+    def __init__(self, path=SCHEDULER_STORE_PATH, rate=CHAT_RATE, burst=CHAT_BURST, max_pending=CHAT_MAX_PENDING,
+                 max_running=CHAT_MAX_RUNNING):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.max_pending = max_pending
+        self.max_running = max_running
+        self.pid = os.getpid()
+        # Jobs reserved here, their scheduler is notified when they finish and needs no polling
+        self._job_ids = set()
+        with transaction(self.path) as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS chat_jobs (job_id TEXT PRIMARY KEY, chat_id TEXT NOT NULL, '
+                'position REAL NOT NULL, pid INTEGER NOT NULL, running INTEGER NOT NULL DEFAULT 0)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS chat_jobs_chat ON chat_jobs (chat_id)')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS chat_buckets (chat_id TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+
+    def reserve(self, key, job_id, position):
+        """Same as MemoryChatLimits.reserve"""
+        with transaction(self.path) as db:
+            self._forget_dead_workers(db, str(key))
+            waiting = db.execute(
+                'SELECT COUNT(*) FROM chat_jobs WHERE chat_id = ? AND running = 0', (str(key),)
+            ).fetchone()[0]
+            if waiting >= self.max_pending:
+                return False
+            db.execute(
+                'INSERT INTO chat_jobs (job_id, chat_id, position, pid) VALUES (?, ?, ?, ?)',
+                (job_id, str(key), position, self.pid)
+            )
+        self._job_ids.add(job_id)
+        return True
+
+    def start(self, key, job_id, cost, rate_limited=True):
+        """
+        Same as MemoryChatLimits.start, a job also waits while an earlier job of the chat waits.
+        When a job reserved by other limits (another process) blocks it, wait is poll_interval.
+        """
+        chat_id = str(key)
+        with transaction(self.path) as db:
+            # The chat's running jobs and the ones waiting ahead of this one
+            others = db.execute(
+                'SELECT other.running, other.job_id FROM chat_jobs AS job '
+                'JOIN chat_jobs AS other ON other.chat_id = job.chat_id AND other.job_id != job.job_id '
+                'WHERE job.job_id = ? AND (other.running = 1 OR other.position < job.position '
+                'OR (other.position = job.position AND other.job_id < job.job_id))', (job_id,)
+            ).fetchall()
+            running = sum(row[0] for row in others)
+            if running >= self.max_running or running < len(others):
+                self._forget_dead_workers(db, chat_id)
+                if any(other_id not in self._job_ids for _, other_id in others):
+                    return False, self.poll_interval
+                return False, None
+
+            if rate_limited:
+                now = time.time()
+                row = db.execute('SELECT tokens, updated FROM chat_buckets WHERE chat_id = ?', (chat_id,)).fetchone()
+                tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+                delay = max(0.0, (min(cost, self.burst) - tokens) / self.rate)
+                if delay > 0:
+                    return False, delay
+                db.execute(
+                    'INSERT OR REPLACE INTO chat_buckets (chat_id, tokens, updated) VALUES (?, ?, ?)',
+                    (chat_id, tokens - cost, now)
+                )
+
+            db.execute('UPDATE chat_jobs SET running = 1 WHERE job_id = ?', (job_id,))
+        return True, None
+
+    def finish(self, key, job_id):
+        self._job_ids.discard(job_id)
+        with transaction(self.path) as db:
+            db.execute('DELETE FROM chat_jobs WHERE job_id = ?', (job_id,))
+            # A full bucket is the same as no bucket
+            db.execute(
+                'DELETE FROM chat_buckets WHERE tokens + (? - updated) * ? >= ?', (time.time(), self.rate, self.burst)
+            )
+
+    def _forget_dead_workers(self, db, chat_id):
+        pids = [row[0] for row in db.execute(
+            'SELECT DISTINCT pid FROM chat_jobs WHERE chat_id = ? AND pid != ?', (chat_id, self.pid)
+        )]
+        for pid in pids:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                logger.warning(f"Forgetting the scheduled jobs of worker {pid}, it is gone")
+                db.execute('DELETE FROM chat_jobs WHERE pid = ?', (pid,))
+            except PermissionError:
+                pass
+
+
+def build_chat_limits(rate=CHAT_RATE, burst=CHAT_BURST, max_pending=CHAT_MAX_PENDING, max_running=CHAT_MAX_RUNNING):
+    """The chat limits selected by SCHEDULER_STORE: 'memory' for one process, 'sqlite' to share them across workers"""
+    if SCHEDULER_STORE == 'sqlite':
+        return SQLiteChatLimits(rate=rate, burst=burst, max_pending=max_pending, max_running=max_running)
+    if SCHEDULER_STORE == 'memory':
+        return MemoryChatLimits(rate, burst, max_pending, max_running)
+    raise ValueError("SCHEDULER_STORE must be 'memory' or 'sqlite'")
+
+
+class FairScheduler:
+    """
+    Runs jobs on a pool of worker threads like JobQueue, taking turns between keys (chats)
+    instead of running jobs in arrival order
+
+    Each key has its own queue and token bucket, and every job has a cost. Workers go round-robin
+    over the keys and skip a key until its bucket covers the cost of its next job, so a chat that
+    sends many expensive photos is slowed down before they use any CPU, while other chats keep
+    getting their turns. The buckets and per-key limits live in `limits`, a SQLiteChatLimits
+    shares them between worker processes.
+
+    Parameters:
+    handler (callable): Called by a worker with the arguments given to submit()
+    key (callable): Returns the key of a job from the submit() arguments, e.g. the chat id
+    cost (callable): Returns the estimated cost of a job from the submit() arguments
+    max_size (int): Number of jobs that may wait in total before submit() rejects new ones
+    workers (int): Number of worker threads
+    name (str): Prefix for the worker thread names, shows up in the logs
+    rate (float): Cost units each key earns per second
+    burst (float): Cost units each key can save up
+    max_pending (int): Jobs of one key that may wait
+    max_running (int): Jobs of one key that may run at the same time
+    limits (optional): Keeps the buckets and counts, a MemoryChatLimits with the settings above by default
+    position (callable, optional): Returns the order of a job among its key's jobs from the submit()
+                                   arguments, defaults to the submit time
+    """
+
+    def __init__(self, handler, key, cost, max_size=100, workers=4, name='job', rate=CHAT_RATE, burst=CHAT_BURST,
+                 max_pending=CHAT_MAX_PENDING, max_running=CHAT_MAX_RUNNING, limits=None, position=None):
+        if max_size < 1 or workers < 1 or max_pending < 1 or max_running < 1:
+            raise ValueError("Queue sizes, worker and running counts must be positive")
+        if rate <= 0 or burst <= 0:
+            raise ValueError("Rate and burst must be positive")
+
+        self.handler = handler
+        self.key = key
+        self.cost = cost
+        self.max_size = max_size
+        self.limits = limits or MemoryChatLimits(rate, burst, max_pending, max_running)
+        self.position = position
+
+        # Keys with waiting jobs, in the order they get their next turn
+        self._turns = deque()
+        # Waiting jobs of each key, a heap ordered by position so a job that arrives late
+        # still goes before the key's jobs with a higher position
+        self._queues = {}
+        self._pending = 0
+        # Counts submitted and finished jobs, a worker that saw it change while it looked for a job looks again
+        self._changes = 0
+        self._accepting = True
+        self._draining = False
+        self._condition = threading.Condition()
+        self._workers = []
+
+        for i in range(workers):
+            worker = threading.Thread(target=self._work, name=f'{name}-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, *args):
+        """
+        Queue a job without blocking
+
+        Returns:
+        bool: False when the queue or the key's own queue is full, or when shutting down,
+              so the caller can apply backpressure
+        """
+        key = self.key(*args)
+        cost = max(0.0, float(self.cost(*args)))
+        position = self.position(*args) if self.position else time.time()
+        with self._condition:
+            if not self._accepting:
+                return False
+            if self._pending >= self.max_size:
+                logger.warning(f"Job queue is full ({self.max_size} jobs), rejecting job")
+                return False
+            # Hold the job's place while the limits are asked, without holding up the workers
+            self._pending += 1
+            number = next(_job_numbers)
+
+        job_id = f'{os.getpid()}-{number}'
+        reserved = False
+        try:
+            reserved = self.limits.reserve(key, job_id, position)
+            if not reserved:
+                logger.warning(f"{key} already has {self.limits.max_pending} jobs waiting, rejecting job")
+        finally:
+            with self._condition:
+                if reserved:
+                    jobs = self._queues.setdefault(key, [])
+                    if not jobs:
+                        self._turns.append(key)
+                    heapq.heappush(jobs, (position, number, job_id, cost, args))
+                    self._changes += 1
+                    self._condition.notify()
+                else:
+                    self._pending -= 1
+                    # Draining workers may be waiting for the last pending job
+                    self._condition.notify_all()
+        return reserved
+
+    @property
+    def pending(self):
+        """Number of jobs waiting for a worker"""
+        with self._condition:
+            return self._pending
+
+    def _next_job(self):
+        """
+        Pick the next job, called with the condition held. The condition is released while the limits
+        are asked, since the SQLite ones may wait on other processes, and the key being asked is
+        taken out of the turns meanwhile so no other worker asks for the same job.
+
+        Returns:
+        tuple: ((key, job_id, args), None) for the job to run, or (None, wait) when no key may run now,
+               wait is the seconds until a limit may allow one, None if only this process's running jobs block them
+        """
+        wait = None
+        for _ in range(len(self._turns)):
+            if not self._turns:
+                break
+            key = self._turns.popleft()
+            job = self._queues[key][0]
+            _, _, job_id, cost, args = job
+            self._condition.release()
+            try:
+                started, delay = self.limits.start(key, job_id, cost, rate_limited=not self._draining)
+            finally:
+                self._condition.acquire()
+            if not started:
+                self._turns.append(key)
+                if delay:
+                    wait = delay if wait is None else min(wait, delay)
+                continue
+
+            jobs = self._queues[key]
+            # A job submitted meanwhile may have become the first one
+            jobs.remove(job)
+            heapq.heapify(jobs)
+            if jobs:
+                self._turns.append(key)
+                self._changes += 1
+            else:
+                del self._queues[key]
+            self._pending -= 1
+            if wait is not None:
+                # Another worker takes over the keys this one found waiting on a limit
+                self._condition.notify()
+            return (key, job_id, args), None
+        return None, wait
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._draining and not self._pending:
+                        return
+                    changes = self._changes
+                    job, wait = self._next_job()
+                    if job:
+                        break
+                    if changes == self._changes:
+                        self._condition.wait(wait)
+            key, job_id, args = job
+            try:
+                self.handler(*args)
+            except Exception as e:
+                logger.error(f"Job failed: {e}")
+            finally:
+                self.limits.finish(key, job_id)
+                with self._condition:
+                    self._changes += 1
+                    self._condition.notify_all()
+
+    def shutdown(self, timeout=None):
+        """
+        Stop accepting jobs, let the workers finish everything already queued without waiting
+        for the rate limits, then stop them
+
+        Parameters:
+        timeout (float, optional): Seconds to wait for all the workers to finish
+        """
+        with self._condition:
+            if not self._accepting:
+                return
+            self._accepting = False
+            self._draining = True
+            self._condition.notify_all()
+
+        logger.info(f"Draining job queue, {self.pending} jobs pending")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(0, deadline - time.monotonic()))
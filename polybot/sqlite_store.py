@@ -0,0 +1,42 @@
+import sqlite3
+
+# Seconds a statement waits for another worker process to release the write lock
+SQLITE_TIMEOUT = 30
+
+
+class Transaction:
+    """
+    Runs a block of statements in one immediate transaction on its own connection, so a
+    read followed by a write can't race another worker process. The connection is closed after the block.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.db.close()
+
+
+def transaction(path):
+    """
+    Open the SQLite file shared by the worker processes for one transaction
+
+    WAL journaling lets readers carry on while a worker writes.
+
+    Parameters:
+    path (str): Path of the SQLite file, created if missing
+
+    Returns:
+    Transaction: Use as `with transaction(path) as db:`, commits at the end of the block
+                 and rolls back if it raises
+    """
+    db = sqlite3.connect(path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+    db.execute('PRAGMA journal_mode=WAL')
+    return Transaction(db)
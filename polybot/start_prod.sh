@@ -50,19 +50,9 @@ echo "→ Activating virtual environment..."
 source "$VENV_PATH/bin/activate"
 echo "✓ Virtual environment activated"
 
-# Set webhook URL (replace with your actual NGINX domain)
-WEBHOOK_URL="https://khaled.fursa.click/${TELEGRAM_BOT_TOKEN}/"
-echo "→ Setting webhook URL: $WEBHOOK_URL"
-
-curl -s -X POST \
-    "https://api.telegram.org/bot${TELEGRAM_BOT_TOKEN}/setWebhook" \
-    -d "url=$WEBHOOK_URL" > /dev/null
-
-if [ $? -eq 0 ]; then
-    echo "✓ Webhook set successfully"
-else
-    echo "⚠️  Warning: Failed to set webhook, but continuing..."
-fi
+# The bot registers the webhook itself in the background once the port is bound, and skips it
+# when Telegram already points at it. Poll /ready to know when it is done.
+export WEBHOOK_REGISTRATION="${WEBHOOK_REGISTRATION:-background}"
 
 # Start the bot
 echo "🤖 Launching bot..."
@@ -77,5 +67,6 @@ echo "Looking for polybot directory:"
 ls -la | grep polybot
 echo "========================"
 
-# Launch the bot - now from correct directory
-python3 -m polybot.app
\ No newline at end of file
+# Launch the bot - now from correct directory.
+# gunicorn runs GUNICORN_WORKERS processes, each with GUNICORN_THREADS threads, see polybot/gunicorn.conf.py
+exec gunicorn -c polybot/gunicorn.conf.py polybot.app:app
\ No newline at end of file
@@ -0,0 +1,49 @@
+import unittest
+from polybot.img_proc import Img, BLUR_MODES
+import os
+
+img_path = 'polybot/test/beatles.jpeg' if '/polybot/test' not in os.getcwd() else 'beatles.jpeg'
+
+
+class TestImgBlur(unittest.TestCase):
+
+    def setUp(self):
+        self.img = Img(img_path)
+        self.original_dimension = (len(self.img.data), len(self.img.data[0]))
+
+    def test_valid_blur_dimension(self):
+        self.img.blur(16)
+        actual_dimension = (len(self.img.data), len(self.img.data[0]))
+        expected_dimension = (self.original_dimension[0] - 15, self.original_dimension[1] - 15)
+        self.assertEqual(expected_dimension, actual_dimension)
+
+    def test_padded_blur_keeps_dimension(self):
+        for mode in BLUR_MODES[1:]:
+            img = Img(img_path)
+            img.blur(7, mode=mode)
+            self.assertEqual(self.original_dimension, (len(img.data), len(img.data[0])))
+
+    def test_blur_matches_list_engine(self):
+        list_img = Img(img_path, engine='list')
+        list_img.data = [[float(int(pixel)) for pixel in row[:40]] for row in list_img.data[:30]]
+        self.img.data = list_img.data
+
+        self.img.blur(4)
+        list_img.blur(4)
+
+        self.assertEqual(list_img.data, self.img.data)
+
+    def test_blur_level_one_is_identity_floor(self):
+        expected = [[float(int(pixel)) for pixel in row] for row in self.img.data]
+        self.img.blur(1)
+        self.assertEqual(expected, self.img.data)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            self.img.blur(0)
+        with self.assertRaises(ValueError):
+            self.img.blur(3, mode='wrap')
+
+
+if __name__ == '__main__':
+    unittest.main()
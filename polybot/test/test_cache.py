@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import os
+from polybot.cache import ResultCache, PredictionCache, content_hash
+
+img_path = 'polybot/test/beatles.jpeg' if '/polybot/test' not in os.getcwd() else 'beatles.jpeg'
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_key_depends_on_photo_and_steps(self):
+        key = ResultCache.make_key('AQAD', [('blur', 8, 'valid'), ('contour',)])
+        self.assertEqual(key, ResultCache.make_key('AQAD', [('blur', 8, 'valid'), ('contour',)]))
+        self.assertNotEqual(key, ResultCache.make_key('AQAD', [('blur', 9, 'valid'), ('contour',)]))
+        self.assertNotEqual(key, ResultCache.make_key('AQAE', [('blur', 8, 'valid'), ('contour',)]))
+
+    def test_lru_eviction(self):
+        cache = ResultCache(max_entries=2)
+        cache.put('a', file_id='file-a')
+        cache.put('b', file_id='file-b')
+        cache.get('a')
+        cache.put('c', file_id='file-c')
+
+        self.assertEqual(cache.get('a')['file_id'], 'file-a')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c')['file_id'], 'file-c')
+
+    def test_disk_tier_survives_memory_eviction(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = ResultCache(max_entries=1, disk_dir=disk_dir)
+            with open(img_path, 'rb') as f:
+                data = f.read()
+            cache.put('a', file_id='file-a', data=data)
+            cache.put('b', file_id='file-b', data=data)
+
+            entry = ResultCache(max_entries=1, disk_dir=disk_dir).get('a')
+            self.assertEqual(entry['file_id'], 'file-a')
+            with open(entry['path'], 'rb') as cached:
+                self.assertEqual(data, cached.read())
+
+    def test_disk_tier_is_bounded(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = ResultCache(disk_dir=disk_dir, max_disk_entries=2)
+            for key in 'abc':
+                cache.put(key, data=b'jpeg bytes')
+
+            self.assertEqual(len([name for name in os.listdir(disk_dir) if name.endswith('.jpg')]), 2)
+
+    def test_empty_entries_are_not_stored(self):
+        cache = ResultCache()
+        cache.put('a')
+        self.assertIsNone(cache.get('a'))
+
+
+class TestPredictionCache(unittest.TestCase):
+
+    def test_content_hash_depends_on_bytes(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            with open(img_path, 'rb') as original:
+                f.write(original.read())
+        try:
+            self.assertEqual(content_hash(img_path), content_hash(f.name))
+            with open(f.name, 'ab') as modified:
+                modified.write(b'\0')
+            self.assertNotEqual(content_hash(img_path), content_hash(f.name))
+        finally:
+            os.remove(f.name)
+
+    def test_hit_until_ttl_expires(self):
+        cache = PredictionCache(ttl=60)
+        with patch('polybot.cache.time.monotonic', return_value=1000):
+            cache.put('hash', (['person (90.00%)'], '/tmp/predicted.jpg'), 'predicted/key.jpg')
+        with patch('polybot.cache.time.monotonic', return_value=1059):
+            entry = cache.get('hash')
+            self.assertEqual(entry['result'], (['person (90.00%)'], '/tmp/predicted.jpg'))
+            self.assertEqual(entry['s3_key'], 'predicted/key.jpg')
+        with patch('polybot.cache.time.monotonic', return_value=1061):
+            self.assertIsNone(cache.get('hash'))
+
+    def test_size_bound(self):
+        cache = PredictionCache(max_entries=1)
+        cache.put('a', 'No objects detected in the image.')
+        cache.put('b', 'No objects detected in the image.')
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import io
+import os
+import sys
+import subprocess
+import numpy as np
+from PIL import Image
+from polybot.codec import CODECS, PillowCodec, get_codec, register_codec, to_gray8
+from polybot.img_proc import Img
+
+img_path = 'polybot/test/beatles.jpeg' if '/polybot/test' not in os.getcwd() else 'beatles.jpeg'
+
+
+class TestPillowCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = PillowCodec(quality=85, progressive=True, optimize=True)
+        with open(img_path, 'rb') as f:
+            self.photo = f.read()
+
+    def test_encode_is_single_channel(self):
+        data = Img(img_path).encode()
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertEqual('L', image.mode)
+            self.assertEqual('JPEG', image.format)
+            self.assertTrue(image.info.get('progressive') or image.info.get('progression'))
+
+    def test_png_round_trip_is_lossless(self):
+        pixels = np.arange(256, dtype=np.float32).reshape(16, 16)
+        decoded = self.codec.decode(self.codec.encode(pixels, 'png'))
+        np.testing.assert_array_equal(pixels.astype(np.uint8), decoded[:, :, 0])
+
+    def test_quality_controls_size(self):
+        pixels = Img(img_path).pixels
+        self.assertLess(len(self.codec.encode(pixels, quality=30)), len(self.codec.encode(pixels, quality=95)))
+
+    def test_draft_decode_downscales(self):
+        full = self.codec.decode(self.photo)
+        height, width = full.shape[:2]
+        small = self.codec.decode(self.photo, max_size=(width // 4, height // 4))
+        self.assertLess(small.shape[0], height)
+        self.assertGreaterEqual(small.shape[0], height // 4)
+        self.assertGreaterEqual(small.shape[1], width // 4)
+
+    def test_max_pixels_caps_the_decoded_size(self):
+        rgb = self.codec.decode(self.photo, max_pixels=50000)
+        full = self.codec.decode(self.photo)
+        self.assertLessEqual(rgb.shape[0] * rgb.shape[1], 50000)
+        self.assertAlmostEqual(full.shape[1] / full.shape[0], rgb.shape[1] / rgb.shape[0], places=1)
+
+    def test_to_gray8_stretches(self):
+        np.testing.assert_array_equal([[0, 128, 255]], to_gray8([[10, 20, 30]]))
+        np.testing.assert_array_equal([[0, 0]], to_gray8([[7, 7]]))
+
+    def test_matplotlib_is_not_imported(self):
+        code = 'import sys, polybot.img_proc; print("matplotlib" in sys.modules)'
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        self.assertEqual('False', result.stdout.strip())
+
+    def test_register_codec(self):
+        class LowQuality(PillowCodec):
+            def __init__(self):
+                super().__init__(quality=10)
+
+        register_codec('low', LowQuality)
+        self.addCleanup(CODECS.pop, 'low')
+        self.assertIsInstance(get_codec('low'), LowQuality)
+        with self.assertRaises(ValueError):
+            get_codec('missing')
+
+
+if __name__ == '__main__':
+    unittest.main()
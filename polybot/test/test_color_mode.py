@@ -0,0 +1,76 @@
+import unittest
+import io
+import os
+import numpy as np
+from PIL import Image
+from polybot.img_proc import Img
+
+img_path = 'polybot/test/beatles.jpeg' if '/polybot/test' not in os.getcwd() else 'beatles.jpeg'
+
+
+class TestColorMode(unittest.TestCase):
+
+    def setUp(self):
+        self.img = Img(img_path, mode='color')
+        self.gray = Img(img_path)
+
+    def test_color_keeps_channels(self):
+        self.assertEqual('color', self.img.mode)
+        self.assertEqual('gray', self.gray.mode)
+        self.assertEqual(self.gray.pixels.shape + (3,), self.img.pixels.shape)
+
+    def test_to_gray_is_explicit(self):
+        self.img.to_gray()
+        np.testing.assert_allclose(self.gray.pixels, self.img.pixels, rtol=1e-6)
+
+    def test_rotate_keeps_color(self):
+        expected = np.rot90(self.img.pixels, k=-1)
+        self.img.rotate()
+        np.testing.assert_array_equal(expected, self.img.pixels)
+
+    def test_transpose_keeps_channels_last(self):
+        self.img.transpose()
+        self.assertEqual((self.gray.pixels.shape[1], self.gray.pixels.shape[0], 3), self.img.pixels.shape)
+
+    def test_concat_keeps_color(self):
+        self.img.concat(Img(img_path, mode='color'))
+        height, width = self.gray.pixels.shape
+        self.assertEqual((height, width * 2, 3), self.img.pixels.shape)
+
+    def test_concat_with_gray_half(self):
+        self.img.concat(self.gray, 'vertical')
+        bottom = self.img.pixels[self.gray.pixels.shape[0]:]
+        np.testing.assert_array_equal(bottom[:, :, 0], bottom[:, :, 2])
+
+    def test_filters_run_per_channel(self):
+        red = Img.from_array(self.img.pixels[:, :, 0])
+        for operation, *args in [('blur', 5, 'edge'), ('contour',), ('segment', 30)]:
+            getattr(self.img, operation)(*args)
+            getattr(red, operation)(*args)
+        np.testing.assert_array_equal(red.pixels, self.img.pixels[:, :, 0])
+
+    def test_pipeline_per_channel(self):
+        red = Img.from_array(self.img.pixels[:, :, 0])
+        self.img.pipeline().blur(3).contour().segment(10).run()
+        red.pipeline().blur(3).contour().segment(10).run()
+        np.testing.assert_array_equal(red.pixels, self.img.pixels[:, :, 0])
+
+    def test_salt_n_pepper_changes_whole_pixels(self):
+        self.img.pixels = np.full_like(self.img.pixels, 128)
+        self.img.salt_n_pepper(0.1, 0.1, seed=1)
+        white = np.all(self.img.pixels == 255, axis=2)
+        self.assertEqual(int(white.size * 0.1), int(np.count_nonzero(white)))
+
+    def test_encode_rgb(self):
+        with Image.open(io.BytesIO(self.img.encode())) as image:
+            self.assertEqual('RGB', image.mode)
+
+    def test_color_requires_numpy_engine(self):
+        with self.assertRaises(ValueError):
+            Img(img_path, engine='list', mode='color')
+        with self.assertRaises(ValueError):
+            Img(img_path, mode='sepia')
+
+
+if __name__ == '__main__':
+    unittest.main()
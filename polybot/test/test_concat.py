@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 from polybot.img_proc import Img
 import os
 
@@ -37,5 +38,34 @@ class TestImgConcat(unittest.TestCase):
         self.assertEqual(left_half, right_half)
 
 
+class TestImgConcatGrid(unittest.TestCase):
+
+    def test_grid_of_three(self):
+        cells = [np.full((4, 6), value, dtype=np.float32) for value in (10, 20, 30)]
+        cells[1] = np.full((5, 7), 20, dtype=np.float32)
+        img = Img.from_array(cells[0])
+        img.concat_grid([Img.from_array(cells[1]), Img.from_array(cells[2])])
+
+        # Two columns, cells cropped to 4x6, the fourth cell is black
+        self.assertEqual((8, 12), img.pixels.shape)
+        self.assertEqual([10, 20, 30, 0], [img.pixels[y, x] for y, x in ((0, 0), (0, 6), (4, 0), (4, 6))])
+
+    def test_list_engine_matches_numpy(self):
+        pixels = [np.arange(20, dtype=np.float32).reshape(4, 5), np.arange(30, dtype=np.float32).reshape(5, 6) + 100]
+        expected = Img.from_array(pixels[0])
+        expected.concat_grid([Img.from_array(pixels[1]), Img.from_array(pixels[0])], columns=2)
+
+        img = Img.from_array(pixels[0].tolist(), engine='list')
+        img.concat_grid([Img.from_array(pixels[1].tolist(), engine='list'), Img.from_array(pixels[0].tolist(), engine='list')],
+                        columns=2)
+        self.assertEqual(expected.pixels.tolist(), img.data)
+
+    def test_gray_cells_are_spread_over_color(self):
+        img = Img(img_path)
+        img.concat_grid([Img(img_path, mode='color')], columns=1)
+        self.assertEqual(3, img.pixels.ndim)
+        np.testing.assert_array_equal(img.pixels[:10, :10, 0], img.pixels[:10, :10, 2])
+
+
 if __name__ == '__main__':
     unittest.main()
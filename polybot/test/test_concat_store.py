@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import patch
+import os
+import tempfile
+from polybot.concat_store import MemoryConcatStore, SQLiteConcatStore
+
+
+class ConcatStoreTests:
+
+    def make_store(self, **kwargs):
+        raise NotImplementedError
+
+    def test_put_and_pop(self):
+        store = self.make_store()
+        store.put(1, 'images/first.jpg', b'jpeg')
+
+        self.assertIn(1, store)
+        session = store.pop(1)
+        self.assertEqual(session['s3_key'], 'images/first.jpg')
+        self.assertEqual(session['photo'], b'jpeg')
+        self.assertNotIn(1, store)
+        self.assertIsNone(store.pop(1))
+
+    def test_sessions_expire(self):
+        store = self.make_store(ttl=60)
+        with patch(self.clock, return_value=1000):
+            store.put(1, 'images/first.jpg', b'jpeg')
+        with patch(self.clock, return_value=1061):
+            self.assertNotIn(1, store)
+            self.assertIsNone(store.pop(1))
+
+    def test_size_bound(self):
+        store = self.make_store(max_entries=2)
+        for chat_id in range(3):
+            with patch(self.clock, return_value=1000 + chat_id):
+                store.put(chat_id, f'images/{chat_id}.jpg', b'jpeg')
+
+        with patch(self.clock, return_value=1003):
+            self.assertEqual(len(store), 2)
+            self.assertNotIn(0, store)
+
+    def test_byte_bound(self):
+        store = self.make_store(max_bytes=10)
+        for chat_id in range(3):
+            with patch(self.clock, return_value=1000 + chat_id):
+                store.put(chat_id, f'images/{chat_id}.jpg', b'jpeg')
+
+        with patch(self.clock, return_value=1003):
+            self.assertEqual(len(store), 2)
+            self.assertNotIn(0, store)
+            store.put(1, 'images/1.jpg', b'a larger jpeg')
+            self.assertEqual(len(store), 0)
+
+
+class TestMemoryConcatStore(ConcatStoreTests, unittest.TestCase):
+    clock = 'polybot.concat_store.time.monotonic'
+
+    def make_store(self, **kwargs):
+        return MemoryConcatStore(**kwargs)
+
+class TestSQLiteConcatStore(ConcatStoreTests, unittest.TestCase):
+    clock = 'polybot.concat_store.time.time'
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'concat.sqlite3')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def make_store(self, **kwargs):
+        return SQLiteConcatStore(self.path, **kwargs)
+
+    def test_shared_between_instances(self):
+        self.make_store().put(1, 'images/first.jpg', b'jpeg')
+
+        session = self.make_store().pop(1)
+        self.assertEqual(session['photo'], b'jpeg')
+        self.assertIsNone(self.make_store().pop(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from polybot.img_proc import Img
+import os
+
+img_path = 'polybot/test/beatles.jpeg' if '/polybot/test' not in os.getcwd() else 'beatles.jpeg'
+
+
+class TestImgEngines(unittest.TestCase):
+
+    def setUp(self):
+        # Keep the crop small so the list engine stays fast
+        self.list_img = Img(img_path, engine='list')
+        self.list_img.data = [row[100:164] for row in self.list_img.data[200:248]]
+
+        self.numpy_img = Img(img_path)
+        self.numpy_img.data = self.list_img.data
+
+    def assertSameData(self):
+        self.assertEqual(self.numpy_img.pixels.shape, self.list_img.pixels.shape)
+        for numpy_row, list_row in zip(self.numpy_img.data, self.list_img.data):
+            for numpy_pixel, list_pixel in zip(numpy_row, list_row):
+                self.assertAlmostEqual(numpy_pixel, list_pixel, delta=1e-3)
+
+    def test_blur(self):
+        self.numpy_img.blur(5)
+        self.list_img.blur(5)
+        self.assertSameData()
+
+    def test_contour(self):
+        self.numpy_img.contour()
+        self.list_img.contour()
+        self.assertSameData()
+
+    def test_rotate(self):
+        self.numpy_img.rotate()
+        self.list_img.rotate()
+        self.assertSameData()
+
+    def test_multi_turn_rotate(self):
+        for turns in (2, 3, -1):
+            self.numpy_img.rotate(turns)
+            self.list_img.rotate(turns)
+            self.assertSameData()
+
+    def test_flips_and_transpose(self):
+        for operation in ('flip_horizontal', 'flip_vertical', 'transpose'):
+            getattr(self.numpy_img, operation)()
+            getattr(self.list_img, operation)()
+            self.assertSameData()
+
+    def test_segment(self):
+        self.numpy_img.segment(100)
+        self.list_img.segment(100)
+        self.assertSameData()
+
+    def test_concat(self):
+        other_list_img = Img(img_path, engine='list')
+        other_list_img.data = [list(row) for row in self.list_img.data]
+        other_numpy_img = Img(img_path)
+        other_numpy_img.data = self.numpy_img.data
+
+        self.numpy_img.concat(other_numpy_img, direction='vertical')
+        self.list_img.concat(other_list_img, direction='vertical')
+        self.assertSameData()
+
+    def test_data_is_list_view(self):
+        self.assertIsInstance(self.numpy_img.data, list)
+        self.assertIsInstance(self.numpy_img.data[0], list)
+
+    def test_data_edits_reach_the_pixels(self):
+        self.numpy_img.data[0][0] = 999
+        self.numpy_img.data[1] = [0] * len(self.numpy_img.data[1])
+        self.assertEqual(999, self.numpy_img.pixels[0, 0])
+        self.assertEqual(999, self.numpy_img.data[0][0])
+        self.assertEqual(0, self.numpy_img.pixels[1].max())
+
+        self.numpy_img.segment(500)
+        self.assertEqual(255, self.numpy_img.pixels[0, 0])
+        self.assertEqual(255, self.numpy_img.data[0][0])
+
+    def test_invalid_engine(self):
+        with self.assertRaises(ValueError):
+            Img(img_path, engine='gpu')
+
+
+if __name__ == '__main__':
+    unittest.main()
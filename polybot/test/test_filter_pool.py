@@ -0,0 +1,59 @@
+import unittest
+from polybot.img_proc import Img
+from polybot.filter_pool import FilterPool
+import os
+
+img_path = 'polybot/test/beatles.jpeg' if '/polybot/test' not in os.getcwd() else 'beatles.jpeg'
+
+
+class TestFilterPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = FilterPool(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def assertSameAsInProcess(self, operation, *args):
+        pooled_img = Img(img_path)
+        local_img = Img(img_path)
+
+        self.pool.apply(pooled_img, operation, *args)
+        getattr(local_img, operation)(*args)
+
+        self.assertEqual(local_img.data, pooled_img.data)
+
+    def test_blur(self):
+        self.assertSameAsInProcess('blur', 8)
+
+    def test_rotate(self):
+        self.assertSameAsInProcess('rotate')
+
+    def test_contour(self):
+        self.assertSameAsInProcess('contour')
+
+    def test_segment(self):
+        self.assertSameAsInProcess('segment', 100)
+
+    def test_concat(self):
+        self.assertSameAsInProcess('concat', Img(img_path))
+
+    def test_concat_of_gray_and_color(self):
+        pooled_img = Img(img_path)
+        local_img = Img(img_path)
+
+        self.pool.apply(pooled_img, 'concat', Img(img_path, mode='color'))
+        local_img.concat(Img(img_path, mode='color'))
+
+        self.assertEqual(local_img.pixels.shape, pooled_img.pixels.shape)
+        self.assertEqual(local_img.data, pooled_img.data)
+
+    def test_worker_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            self.pool.apply(Img(img_path), 'blur', 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from polybot.http_session import build_session
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.client_ports.add(self.client_address[1])
+        self.server.requests += 1
+        status = 503 if self.server.failures_left > 0 else 200
+        self.server.failures_left -= 1
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpSession(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.client_ports = set()
+        self.server.requests = 0
+        self.server.failures_left = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        session = build_session(pool_size=2, retries=0)
+        for _ in range(5):
+            self.assertEqual(session.get(self.url).status_code, 200)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_keep_alive_can_be_disabled(self):
+        session = build_session(retries=0, keep_alive=False)
+        for _ in range(3):
+            session.get(self.url)
+        self.assertEqual(len(self.server.client_ports), 3)
+
+    def test_idempotent_requests_are_retried(self):
+        self.server.failures_left = 2
+        session = build_session(retries=3, backoff_factor=0)
+        self.assertEqual(session.get(self.url).status_code, 200)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_post_is_not_retried_on_error_status(self):
+        self.server.failures_left = 1
+        session = build_session(retries=3, backoff_factor=0)
+        self.assertEqual(session.post(self.url, json={}).status_code, 503)
+        self.assertEqual(self.server.requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
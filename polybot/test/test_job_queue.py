@@ -0,0 +1,90 @@
+import unittest
+import threading
+import time
+from polybot.job_queue import JobQueue
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def test_jobs_run_on_workers(self):
+        results = []
+        jobs = JobQueue(results.append, max_size=10, workers=2)
+
+        for i in range(5):
+            self.assertTrue(jobs.submit(i))
+        jobs.shutdown()
+
+        self.assertEqual(sorted(results), [0, 1, 2, 3, 4])
+
+    def test_full_queue_rejects_jobs(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def handler(_):
+            started.set()
+            release.wait()
+
+        jobs = JobQueue(handler, max_size=1, workers=1)
+        self.assertTrue(jobs.submit('running'))
+        started.wait(5)
+        self.assertTrue(jobs.submit('queued'))
+        self.assertFalse(jobs.submit('rejected'))
+
+        release.set()
+        jobs.shutdown()
+
+    def test_shutdown_drains_queue(self):
+        release = threading.Event()
+        results = []
+
+        def handler(job):
+            release.wait()
+            results.append(job)
+
+        jobs = JobQueue(handler, max_size=10, workers=1)
+        for i in range(3):
+            jobs.submit(i)
+
+        threading.Timer(0.1, release.set).start()
+        jobs.shutdown()
+
+        self.assertEqual(results, [0, 1, 2])
+        self.assertFalse(jobs.submit(3))
+
+    def test_shutdown_of_a_full_queue_keeps_its_timeout(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def handler(_):
+            started.set()
+            release.wait()
+
+        jobs = JobQueue(handler, max_size=2, workers=1)
+        jobs.submit('running')
+        started.wait(5)
+        jobs.submit('queued')
+        jobs.submit('queued')
+
+        start = time.monotonic()
+        jobs.shutdown(0.5)
+        self.assertLess(time.monotonic() - start, 2)
+        release.set()
+
+    def test_failing_job_does_not_kill_worker(self):
+        results = []
+
+        def handler(job):
+            if job == 'bad':
+                raise RuntimeError('boom')
+            results.append(job)
+
+        jobs = JobQueue(handler, max_size=10, workers=1)
+        jobs.submit('bad')
+        jobs.submit('good')
+        jobs.shutdown()
+
+        self.assertEqual(results, ['good'])
+
+
+if __name__ == '__main__':
+    unittest.main()
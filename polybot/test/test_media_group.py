@@ -0,0 +1,89 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from polybot.media_group import MediaGroupCollector, SQLiteMediaGroupStore, group_message
+
+
+def album_photo(message_id, group='album-1', chat_id=7, caption=None):
+    msg = {'message_id': message_id, 'chat': {'id': chat_id}, 'media_group_id': group, 'photo': [{'file_id': str(message_id)}]}
+    if caption:
+        msg['caption'] = caption
+    return msg
+
+
+class TestMediaGroupCollector(unittest.TestCase):
+
+    def setUp(self):
+        self.groups = []
+        self.received = threading.Event()
+
+        def on_group(msg):
+            self.groups.append(msg)
+            self.received.set()
+
+        self.on_group = on_group
+
+    def test_album_is_handed_over_once(self):
+        collector = MediaGroupCollector(self.on_group, window=0.05)
+        for message_id in (12, 11, 13):
+            self.assertTrue(collector.add(album_photo(message_id, caption='Blur' if message_id == 12 else None)))
+
+        self.assertTrue(self.received.wait(5))
+        self.assertEqual(1, len(self.groups))
+        self.assertEqual('Blur', self.groups[0]['caption'])
+        self.assertEqual(11, self.groups[0]['message_id'])
+        self.assertEqual([11, 12, 13], [m['message_id'] for m in self.groups[0]['media_group']])
+        self.assertEqual(0, len(collector))
+
+    def test_single_photo_is_not_collected(self):
+        collector = MediaGroupCollector(self.on_group)
+        self.assertFalse(collector.add({'message_id': 1, 'chat': {'id': 7}, 'photo': []}))
+        self.assertEqual(0, len(collector))
+
+    def test_albums_are_kept_apart(self):
+        collector = MediaGroupCollector(self.on_group, window=60)
+        collector.add(album_photo(1, group='a'))
+        collector.add(album_photo(2, group='b'))
+        collector.add(album_photo(3, group='a', chat_id=8))
+        self.assertEqual(3, len(collector))
+
+        collector.flush_all()
+        self.assertEqual([1, 1, 1], [len(group['media_group']) for group in self.groups])
+
+    def test_full_album_is_handed_over_right_away(self):
+        collector = MediaGroupCollector(self.on_group, window=60, max_size=3)
+        for message_id in range(3):
+            collector.add(album_photo(message_id))
+
+        self.assertEqual(1, len(self.groups))
+        self.assertEqual(3, len(self.groups[0]['media_group']))
+
+    def test_workers_hand_over_an_album_once(self):
+        # Two collectors on one SQLite file stand in for two gunicorn workers
+        with tempfile.TemporaryDirectory() as store_dir:
+            path = os.path.join(store_dir, 'media_groups.sqlite3')
+            first = MediaGroupCollector(self.on_group, window=0.1, store=SQLiteMediaGroupStore(path))
+            second = MediaGroupCollector(self.on_group, window=0.1, store=SQLiteMediaGroupStore(path))
+
+            first.add(album_photo(11))
+            second.add(album_photo(12, caption='Blur'))
+            first.add(album_photo(13))
+            second.add(album_photo(12, caption='Blur'))  # Telegram sent the update again
+
+            self.assertTrue(self.received.wait(5))
+            for collector in (first, second):
+                while len(collector):
+                    time.sleep(0.01)
+
+        self.assertEqual(1, len(self.groups))
+        self.assertEqual('Blur', self.groups[0]['caption'])
+        self.assertEqual([11, 12, 13], [m['message_id'] for m in self.groups[0]['media_group']])
+
+    def test_group_message_without_caption(self):
+        self.assertIsNone(group_message([album_photo(1), album_photo(2)])['caption'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import threading
+from prometheus_client import REGISTRY
+from polybot import metrics
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_timed_records_latency(self):
+        before = sample('polybot_stage_seconds_count', stage='decode', filter='blur')
+        with metrics.timed('decode', 'blur'):
+            pass
+        self.assertEqual(before + 1, sample('polybot_stage_seconds_count', stage='decode', filter='blur'))
+
+    def test_timed_counts_errors(self):
+        before = sample('polybot_stage_errors_total', stage='yolo', filter='predict')
+        with self.assertRaises(RuntimeError):
+            with metrics.timed('yolo', 'predict'):
+                raise RuntimeError('down')
+        self.assertEqual(before + 1, sample('polybot_stage_errors_total', stage='yolo', filter='predict'))
+        self.assertGreater(sample('polybot_stage_seconds_count', stage='yolo', filter='predict'), 0)
+
+    def test_filter_label_is_per_thread(self):
+        metrics.set_filter_label('contour')
+        self.addCleanup(metrics.set_filter_label, '')
+        before = sample('polybot_stage_seconds_count', stage='encode', filter='')
+
+        def other_thread():
+            with metrics.timed('encode'):
+                pass
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+        with metrics.timed('encode'):
+            pass
+
+        self.assertEqual(before + 1, sample('polybot_stage_seconds_count', stage='encode', filter=''))
+        self.assertGreater(sample('polybot_stage_seconds_count', stage='encode', filter='contour'), 0)
+
+    def test_cache_counter(self):
+        before = sample('polybot_cache_lookups_total', cache='result', result='hit')
+        metrics.count_cache('result', True)
+        metrics.count_cache('result', False)
+        self.assertEqual(before + 1, sample('polybot_cache_lookups_total', cache='result', result='hit'))
+
+    def test_render(self):
+        body, content_type = metrics.render()
+        self.assertIn(b'polybot_stage_seconds', body)
+        self.assertTrue(content_type.startswith('text/plain'))
+
+    def test_render_adds_up_worker_processes(self):
+        # Like gunicorn workers, each process counts into its own file in the multiprocess dir
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=metrics_dir)
+            for _ in range(2):
+                subprocess.run([sys.executable, '-c', 'from polybot import metrics; metrics.count_request("blur")'],
+                               env=env, cwd=root, check=True)
+            code = 'from polybot import metrics; print(metrics.render()[0].decode())'
+            body = subprocess.run([sys.executable, '-c', code], env=env, cwd=root, check=True,
+                                  capture_output=True, text=True).stdout
+
+        self.assertIn('polybot_requests_total{filter="blur"} 2.0', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
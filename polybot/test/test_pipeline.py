@@ -0,0 +1,69 @@
+import unittest
+from polybot.img_proc import Img
+from polybot.bot import parse_caption, filter_operations
+import os
+
+img_path = 'polybot/test/beatles.jpeg' if '/polybot/test' not in os.getcwd() else 'beatles.jpeg'
+
+
+class TestImgPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.img = Img(img_path)
+        self.expected_img = Img(img_path)
+
+    def test_pipeline_is_lazy(self):
+        original = self.img.data
+        pipeline = self.img.pipeline().blur(8).contour()
+        self.assertEqual(original, self.img.data)
+        self.assertEqual(len(pipeline.steps), 2)
+
+    def test_pipeline_matches_sequential_filters(self):
+        self.img.pipeline().blur(8).contour().segment(20).rotate().run()
+
+        self.expected_img.blur(8)
+        self.expected_img.contour()
+        self.expected_img.segment(20)
+        self.expected_img.rotate()
+
+        self.assertEqual(self.expected_img.data, self.img.data)
+
+    def test_run_pipeline_steps(self):
+        self.img.run_pipeline([('contour',), ('segment', 50)])
+
+        self.expected_img.contour()
+        self.expected_img.segment(50)
+
+        self.assertEqual(self.expected_img.data, self.img.data)
+
+    def test_unknown_operation(self):
+        with self.assertRaises(ValueError):
+            self.img.pipeline().add('concat')
+
+
+class TestCaptionParsing(unittest.TestCase):
+
+    def test_single_filter(self):
+        self.assertEqual(parse_caption('Blur 8'), [('blur', ['8'])])
+
+    def test_chained_filters(self):
+        steps = parse_caption('blur 8 | Contour | segment 100')
+        self.assertEqual(steps, [('blur', ['8']), ('contour', []), ('segment', ['100'])])
+
+    def test_unknown_filter(self):
+        self.assertIsNone(parse_caption('blur 8 | sharpen'))
+
+    def test_filter_operations(self):
+        self.assertEqual(filter_operations('blur', ['8']), [('blur', 8, 'valid')])
+        self.assertEqual(filter_operations('rotate', ['2']), [('rotate', 2)])
+        self.assertEqual(filter_operations('rotate', ['5']), [('rotate', 1)])
+        self.assertEqual(filter_operations('rotate', ['270', 'deg']), [('rotate', 3)])
+        self.assertEqual(filter_operations('flip', ['vertical']), [('flip_vertical',)])
+        self.assertEqual(filter_operations('segment', []), [('segment', 128)])
+        self.assertEqual(filter_operations('salt and pepper', []), [('salt_n_pepper',)])
+        self.assertEqual(filter_operations('gaussian', ['4.5']), [('gaussian', 4.5)])
+        self.assertEqual(filter_operations('speckle', ['lots']), [('speckle',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
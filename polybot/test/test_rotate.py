@@ -25,6 +25,45 @@ class TestImgConcat(unittest.TestCase):
 
         self.assertEqual(expected_img, self.img.data)
 
+    def test_turns_match_repeated_rotation(self):
+        for turns in range(1, 4):
+            expected = Img(img_path)
+            for _ in range(turns):
+                expected.rotate()
+            img = Img(img_path)
+            img.rotate(turns)
+            self.assertEqual(expected.data, img.data)
+
+    def test_full_turns_are_identity(self):
+        original = self.img.data
+        self.img.rotate(4)
+        self.assertEqual(original, self.img.data)
+        self.img.rotate(angle=-360)
+        self.assertEqual(original, self.img.data)
+
+    def test_angle(self):
+        expected = Img(img_path)
+        expected.rotate(3)
+        self.img.rotate(angle=-90)
+        self.assertEqual(expected.data, self.img.data)
+
+    def test_angle_must_be_quarter_turns(self):
+        with self.assertRaises(ValueError):
+            self.img.rotate(angle=45)
+
+    def test_rotate_is_transpose_then_flip(self):
+        expected = Img(img_path)
+        expected.transpose()
+        expected.flip_horizontal()
+        self.img.rotate()
+        self.assertEqual(expected.data, self.img.data)
+
+    def test_pipeline_folds_rotations(self):
+        pipeline = self.img.pipeline().rotate().rotate(2).rotate()
+        self.assertEqual([], pipeline._fold_rotations())
+        pipeline.run()
+        self.assertEqual(self.original_dimension, (len(self.img.data), len(self.img.data[0])))
+
 
 if __name__ == '__main__':
     unittest.main()
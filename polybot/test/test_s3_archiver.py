@@ -0,0 +1,54 @@
+import unittest
+import tempfile
+import os
+from unittest.mock import Mock
+from prometheus_client import REGISTRY
+from polybot.s3_archiver import S3Archiver
+
+
+class TestS3Archiver(unittest.TestCase):
+
+    def test_upload_runs_in_background(self):
+        upload = Mock(return_value='images/a.jpg')
+        archiver = S3Archiver(upload, backoff=0)
+
+        self.assertTrue(archiver.archive(b'jpeg', 'images/a.jpg'))
+        archiver.shutdown()
+
+        upload.assert_called_once_with(b'jpeg', 'images/a.jpg')
+        self.assertEqual(archiver.metrics['uploaded'], 1)
+
+    def test_failed_upload_is_retried(self):
+        upload = Mock(side_effect=[None, RuntimeError('endpoint down'), 'images/a.jpg'])
+        archiver = S3Archiver(upload, retries=3, backoff=0)
+
+        archiver.archive(b'jpeg', 'images/a.jpg')
+        archiver.shutdown()
+
+        self.assertEqual(upload.call_count, 3)
+        self.assertEqual(archiver.metrics['retried'], 2)
+        self.assertEqual(archiver.metrics['uploaded'], 1)
+
+    def test_failures_are_counted(self):
+        failed = REGISTRY.get_sample_value('polybot_archive_uploads_total', {'result': 'failed'}) or 0
+        archiver = S3Archiver(Mock(return_value=None), retries=1, backoff=0)
+
+        archiver.archive(b'jpeg', 'images/a.jpg')
+        archiver.shutdown()
+
+        self.assertEqual(archiver.metrics['failed'], 1)
+        self.assertEqual(failed + 1, REGISTRY.get_sample_value('polybot_archive_uploads_total', {'result': 'failed'}))
+
+    def test_source_file_is_removed_after_upload(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'jpeg')
+
+        archiver = S3Archiver(Mock(return_value='images/a.jpg'))
+        archiver.archive(f.name, 'images/a.jpg', remove_after=True)
+        archiver.shutdown()
+
+        self.assertFalse(os.path.exists(f.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
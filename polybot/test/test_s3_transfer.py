@@ -0,0 +1,54 @@
+import unittest
+import os
+import boto3
+from unittest.mock import patch
+from polybot.s3_transfer import BatchTransfer, build_transfer_config, MB
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+
+class TestTransferConfig(unittest.TestCase):
+
+    def test_settings(self):
+        config = build_transfer_config(multipart_threshold=16 * MB, multipart_chunksize=4 * MB, max_concurrency=4)
+        self.assertEqual(config.multipart_threshold, 16 * MB)
+        self.assertEqual(config.multipart_chunksize, 4 * MB)
+        self.assertEqual(config.max_concurrency, 4)
+
+    def test_single_stream_disables_threads(self):
+        self.assertFalse(build_transfer_config(max_concurrency=1).use_threads)
+
+
+@unittest.skipUnless(mock_aws, 'moto is not installed')
+class TestBatchTransfer(unittest.TestCase):
+
+    def setUp(self):
+        env = patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'test', 'AWS_SECRET_ACCESS_KEY': 'test'})
+        env.start()
+        self.addCleanup(env.stop)
+        self.mock = mock_aws()
+        self.mock.start()
+        self.client = boto3.client('s3', region_name='us-east-1')
+        self.client.create_bucket(Bucket='polybot-test')
+        self.batch = BatchTransfer(self.client, 'polybot-test', build_transfer_config(), workers=4)
+
+    def tearDown(self):
+        self.batch.shutdown()
+        self.mock.stop()
+
+    def test_round_trip(self):
+        items = [(os.urandom(1024), f'images/{i}.jpg') for i in range(8)]
+
+        self.assertEqual(self.batch.upload_many(items), [key for _, key in items])
+        self.assertEqual(self.batch.download_many([key for _, key in items]), [data for data, _ in items])
+
+    def test_missing_objects_are_none(self):
+        self.batch.upload_many([(b'jpeg', 'images/a.jpg')])
+        self.assertEqual(self.batch.download_many(['images/a.jpg', 'images/missing.jpg']), [b'jpeg', None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from polybot.img_proc import Img
+from polybot.img_proc import Img, noise_indices
+import numpy as np
 import os
 
 img_path = 'polybot/test/beatles.jpeg' if '/polybot/test' not in os.getcwd() else 'beatles.jpeg'
@@ -37,5 +38,57 @@ class TestImgConcat(unittest.TestCase):
         self.assertGreaterEqual(untouched_pixel_percentage, 0.70)
 
 
+class TestSeededNoise(unittest.TestCase):
+
+    def setUp(self):
+        self.img = Img(img_path)
+        # A flat gray image, so every white or black pixel is noise
+        self.img.pixels = np.full_like(self.img.pixels, 128)
+        self.size = self.img.pixels.size
+
+    def test_exact_noise_counts(self):
+        self.img.salt_n_pepper(0.05, 0.02, seed=7)
+        self.assertEqual(int(self.size * 0.05), int(np.count_nonzero(self.img.pixels == 255)))
+        self.assertEqual(int(self.size * 0.02), int(np.count_nonzero(self.img.pixels == 0)))
+
+    def test_salt_and_pepper_do_not_overlap(self):
+        salt, pepper = noise_indices(100, 0.5, 0.5, seed=3)
+        self.assertEqual(list(range(100)), sorted(np.concatenate([salt, pepper]).tolist()))
+
+    def test_same_seed_same_noise(self):
+        other = Img.from_array(self.img.pixels)
+        self.img.salt_n_pepper(seed=42)
+        other.salt_n_pepper(seed=np.random.default_rng(42))
+        np.testing.assert_array_equal(self.img.pixels, other.pixels)
+
+    def test_list_engine_matches(self):
+        list_img = Img(img_path, engine='list')
+        list_img.data = self.img.pixels.tolist()
+        self.img.salt_n_pepper(seed=5)
+        list_img.salt_n_pepper(seed=5)
+        self.assertEqual(self.img.data, list_img.data)
+
+    def test_invalid_probabilities(self):
+        with self.assertRaises(ValueError):
+            self.img.salt_n_pepper(0.7, 0.4)
+
+    def test_gaussian(self):
+        self.img.gaussian(10, seed=1)
+        self.assertAlmostEqual(10, float(self.img.pixels.std()), delta=0.5)
+        self.assertAlmostEqual(128, float(self.img.pixels.mean()), delta=0.5)
+
+    def test_speckle(self):
+        self.img.speckle(0.01, seed=1)
+        self.assertAlmostEqual(12.8, float(self.img.pixels.std()), delta=0.5)
+
+    def test_noise_in_pipeline_is_reproducible(self):
+        other = Img.from_array(self.img.pixels)
+        self.img.pipeline().gaussian(5, 9).speckle(0.02, 9).salt_n_pepper(0.01, 0.01, 9).run()
+        other.gaussian(5, 9)
+        other.speckle(0.02, 9)
+        other.salt_n_pepper(0.01, 0.01, 9)
+        np.testing.assert_array_equal(other.pixels, self.img.pixels)
+
+
 if __name__ == '__main__':
     unittest.main()
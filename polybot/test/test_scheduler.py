@@ -0,0 +1,279 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from polybot.bot import estimate_cost
+from polybot.scheduler import FairScheduler, MemoryChatLimits, SQLiteChatLimits, TokenBucket
+
+
+def by_chat(chat, job):
+    return chat
+
+
+def unit_cost(chat, job):
+    return 1
+
+
+class TestFairScheduler(unittest.TestCase):
+
+    def test_jobs_run_on_workers(self):
+        results = []
+        jobs = FairScheduler(lambda chat, job: results.append(job), by_chat, unit_cost, workers=2, rate=1000)
+
+        for i in range(5):
+            self.assertTrue(jobs.submit(i % 2, i))
+        jobs.shutdown()
+
+        self.assertEqual(sorted(results), [0, 1, 2, 3, 4])
+
+    def test_chats_take_turns(self):
+        release = threading.Event()
+        started = threading.Event()
+        results = []
+
+        def handler(chat, job):
+            if job == 'a0':
+                started.set()
+                release.wait()
+            results.append(job)
+
+        jobs = FairScheduler(handler, by_chat, unit_cost, workers=1, rate=1000)
+        jobs.submit('a', 'a0')
+        started.wait(5)
+        for i in range(1, 4):
+            jobs.submit('a', f'a{i}')
+        jobs.submit('b', 'b0')
+        jobs.submit('b', 'b1')
+
+        release.set()
+        jobs.shutdown()
+
+        self.assertEqual(results, ['a0', 'a1', 'b0', 'a2', 'b1', 'a3'])
+
+    def test_expensive_chat_is_throttled(self):
+        finished = {}
+        lock = threading.Lock()
+
+        def handler(chat, job):
+            with lock:
+                finished[job] = time.monotonic()
+
+        # Each of chat a's jobs uses the whole bucket, the next one waits 0.2s for it to refill
+        jobs = FairScheduler(handler, by_chat, lambda chat, job: 2, workers=2, rate=10, burst=2)
+        for i in range(3):
+            jobs.submit('a', f'a{i}')
+        jobs.submit('b', 'b0')
+
+        deadline = time.monotonic() + 5
+        while len(finished) < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        jobs.shutdown()
+
+        self.assertLess(finished['b0'], finished['a1'])
+        self.assertGreaterEqual(finished['a2'] - finished['a1'], 0.15)
+
+    def test_full_chat_queue_rejects_jobs(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def handler(chat, job):
+            started.set()
+            release.wait()
+
+        jobs = FairScheduler(handler, by_chat, unit_cost, workers=2, rate=1000, max_pending=1)
+        self.assertTrue(jobs.submit('a', 'running'))
+        started.wait(5)
+        self.assertTrue(jobs.submit('a', 'queued'))
+        self.assertFalse(jobs.submit('a', 'rejected'))
+        self.assertTrue(jobs.submit('b', 'other chat'))
+
+        release.set()
+        jobs.shutdown()
+
+    def test_chat_jobs_run_in_order(self):
+        results = []
+
+        def handler(chat, job):
+            time.sleep(0.01 if job % 2 == 0 else 0)
+            results.append(job)
+
+        jobs = FairScheduler(handler, by_chat, unit_cost, workers=4, rate=1000, burst=100)
+        for i in range(6):
+            jobs.submit('a', i)
+        jobs.shutdown()
+
+        self.assertEqual(results, list(range(6)))
+
+    def test_shutdown_drains_without_rate_limit(self):
+        results = []
+        jobs = FairScheduler(lambda chat, job: results.append(job), by_chat, unit_cost, workers=1, rate=0.001, burst=1)
+        for i in range(3):
+            jobs.submit('a', i)
+
+        start = time.monotonic()
+        jobs.shutdown(5)
+
+        self.assertEqual(results, [0, 1, 2])
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertFalse(jobs.submit('a', 3))
+
+    def test_submit_does_not_wait_for_the_limits(self):
+        release = threading.Event()
+
+        class SlowLimits(MemoryChatLimits):
+            def start(self, key, job_id, cost, rate_limited=True):
+                release.wait(5)
+                return super().start(key, job_id, cost, rate_limited)
+
+        results = []
+        jobs = FairScheduler(lambda chat, job: results.append(job), by_chat, unit_cost, workers=1,
+                             limits=SlowLimits(rate=1000, burst=100))
+        jobs.submit('a', 0)
+        time.sleep(0.05)
+
+        start = time.monotonic()
+        self.assertTrue(jobs.submit('b', 1))
+        self.assertLess(time.monotonic() - start, 1)
+        release.set()
+        jobs.shutdown(5)
+
+        self.assertEqual([0, 1], sorted(results))
+
+class TestSQLiteChatLimits(unittest.TestCase):
+    """Two limits on one file stand in for two gunicorn workers"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, 'scheduler.sqlite3')
+
+    def limits(self, **kwargs):
+        return SQLiteChatLimits(self.path, **dict({'rate': 1000, 'burst': 100}, **kwargs))
+
+    def test_pending_limit_is_shared(self):
+        first, second = self.limits(max_pending=1), self.limits(max_pending=1)
+        self.assertTrue(first.reserve('a', 'first-1', 1))
+        self.assertFalse(second.reserve('a', 'second-1', 2))
+        self.assertTrue(second.reserve('b', 'second-2', 3))
+
+    def test_earlier_message_runs_first_on_any_worker(self):
+        first, second = self.limits(max_running=2), self.limits(max_running=2)
+        first.reserve('a', 'first-1', 12)
+        second.reserve('a', 'second-1', 11)
+
+        self.assertEqual((False, first.poll_interval), first.start('a', 'first-1', 1))
+        self.assertEqual((True, None), second.start('a', 'second-1', 1))
+        self.assertEqual((True, None), first.start('a', 'first-1', 1))
+
+    def test_running_limit_is_shared(self):
+        first, second = self.limits(), self.limits()
+        first.reserve('a', 'first-1', 1)
+        second.reserve('a', 'second-1', 2)
+
+        self.assertTrue(first.start('a', 'first-1', 1)[0])
+        self.assertEqual((False, second.poll_interval), second.start('a', 'second-1', 1))
+        first.finish('a', 'first-1')
+        self.assertTrue(second.start('a', 'second-1', 1)[0])
+
+    def test_own_running_job_needs_no_polling(self):
+        limits = self.limits()
+        limits.reserve('a', 'job-1', 1)
+        limits.reserve('a', 'job-2', 2)
+
+        self.assertTrue(limits.start('a', 'job-1', 1)[0])
+        self.assertEqual((False, None), limits.start('a', 'job-2', 1))
+
+    def test_rate_is_shared(self):
+        first, second = self.limits(rate=1, burst=2), self.limits(rate=1, burst=2)
+        first.reserve('a', 'first-1', 1)
+        second.reserve('a', 'second-1', 2)
+
+        self.assertTrue(first.start('a', 'first-1', 2)[0])
+        first.finish('a', 'first-1')
+        started, wait = second.start('a', 'second-1', 2)
+        self.assertFalse(started)
+        self.assertGreater(wait, 1.5)
+
+    def test_jobs_of_a_dead_worker_are_forgotten(self):
+        dead, alive = self.limits(max_pending=1), self.limits(max_pending=1)
+        dead.pid = 2 ** 22 + 1  # above pid_max, no such process
+        dead.reserve('a', 'dead-1', 1)
+
+        self.assertTrue(alive.reserve('a', 'alive-1', 2))
+        self.assertTrue(alive.start('a', 'alive-1', 1)[0])
+
+    def test_schedulers_share_a_chat_rate(self):
+        finished = []
+        lock = threading.Lock()
+
+        def handler(chat, job):
+            with lock:
+                finished.append((job, time.monotonic()))
+
+        schedulers = [FairScheduler(handler, by_chat, lambda chat, job: 2, workers=1,
+                                    limits=self.limits(rate=10, burst=2), position=lambda chat, job: job)
+                      for _ in range(2)]
+        schedulers[0].submit('a', 0)
+        schedulers[1].submit('a', 1)
+
+        deadline = time.monotonic() + 5
+        while len(finished) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for scheduler in schedulers:
+            scheduler.shutdown()
+
+        self.assertEqual([0, 1], [job for job, _ in finished])
+        self.assertGreaterEqual(finished[1][1] - finished[0][1], 0.15)
+
+
+    def test_earlier_message_that_arrives_late_is_not_stuck(self):
+        results = []
+        release = threading.Event()
+
+        def handler(chat, job):
+            release.wait(5)
+            results.append(job)
+
+        jobs = FairScheduler(handler, by_chat, unit_cost, workers=1, limits=self.limits(),
+                             position=lambda chat, job: job)
+        jobs.submit('a', 1)
+        while jobs.pending:
+            time.sleep(0.01)
+        # e.g. the photos of an album handed over after its window, behind a later message
+        jobs.submit('a', 13)
+        jobs.submit('a', 10)
+        release.set()
+        jobs.shutdown(5)
+
+        self.assertEqual([1, 10, 13], results)
+        self.assertEqual(0, jobs.pending)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_job_above_burst_leaves_debt(self):
+        bucket = TokenBucket(rate=1, burst=2)
+        self.assertEqual(0, bucket.wait_time(5))
+        bucket.take(5)
+        self.assertAlmostEqual(4, bucket.wait_time(1), places=1)
+
+
+class TestEstimateCost(unittest.TestCase):
+
+    def test_cost_grows_with_size_and_filters(self):
+        photo = [{'width': 90, 'height': 90}, {'width': 4000, 'height': 3000}]
+        self.assertAlmostEqual(12, estimate_cost({'photo': photo, 'caption': 'Blur 100'}))
+        self.assertAlmostEqual(24, estimate_cost({'photo': photo, 'caption': 'blur | contour'}))
+        self.assertLess(estimate_cost({'photo': photo, 'caption': 'rotate'}), 12)
+        self.assertAlmostEqual(0.1, estimate_cost({'photo': photo}))
+        self.assertAlmostEqual(0.1, estimate_cost({'text': 'hello'}))
+
+    def test_album_costs_all_its_photos(self):
+        photo = [{'width': 1000, 'height': 1000}]
+        album = {'photo': photo, 'caption': 'contour', 'media_group': [{'photo': photo}, {'photo': photo, 'caption': None}]}
+        self.assertAlmostEqual(2, estimate_cost(album))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import os
+import tempfile
+from polybot.sqlite_store import transaction
+
+
+class TestTransaction(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, 'store.sqlite3')
+        with transaction(self.path) as db:
+            db.execute('CREATE TABLE items (name TEXT)')
+
+    def count(self):
+        with transaction(self.path) as db:
+            return db.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def test_block_is_committed(self):
+        with transaction(self.path) as db:
+            db.execute("INSERT INTO items VALUES ('a')")
+
+        self.assertEqual(1, self.count())
+
+    def test_block_that_raises_is_rolled_back(self):
+        with self.assertRaises(ValueError):
+            with transaction(self.path) as db:
+                db.execute("INSERT INTO items VALUES ('a')")
+                raise ValueError('failed')
+
+        self.assertEqual(0, self.count())
+
+    def test_file_uses_wal(self):
+        with transaction(self.path) as db:
+            self.assertEqual('wal', db.execute('PRAGMA journal_mode').fetchone()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,14 @@
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import patch, Mock, mock_open, MagicMock
-from polybot.bot import ImageProcessingBot
+from unittest.mock import patch, Mock, MagicMock
+from polybot.bot import Bot, ImageProcessingBot, PREVIEW_CAPTION, document_as_photo, estimate_cost, preview_size, scale_operations, select_photo_size, size_policy
+from polybot.tiled import TiledImg
+from prometheus_client import REGISTRY
+from polybot.media_group import group_message
 import os
 
 img_path = 'polybot/test/beatles.jpeg' if '/polybot/test' not in os.getcwd() else 'beatles.jpeg'
@@ -50,8 +58,15 @@ class TestBot(unittest.TestCase):
 
     @patch('telebot.TeleBot')
     def setUp(self, mock_telebot):
-        bot = ImageProcessingBot(token='bot_token', telegram_chat_url='webhook_url')
+        # Placeholder credentials for the constructor, nothing below reaches AWS
+        env = patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing',
+                                      'S3_BUCKET_NAME': 'polybot-test'})
+        env.start()
+        self.addCleanup(env.stop)
+
+        bot = ImageProcessingBot(token='bot_token', telegram_chat_url='webhook_url', webhook_registration='skip')
         bot.telegram_bot_client = mock_telebot.return_value
+        bot.s3_client = MagicMock()
 
         mock_file = Mock()
         mock_file.file_path = 'photos/beatles.jpeg'
@@ -71,9 +86,201 @@ class TestBot(unittest.TestCase):
             mock_method.assert_called_once()
             self.bot.telegram_bot_client.send_photo.assert_called_once()
 
-    @patch('builtins.open', new_callable=mock_open)
-    def test_contour_with_exception(self, mock_open):
-        mock_open.side_effect = OSError("Read-only file system")
+    @patch('polybot.bot.PHOTO_SPILL_BYTES', 1)
+    def test_large_photo_is_spilled_to_disk(self):
+        mock_msg['caption'] = 'Segment'
+
+        photo, _ = self.bot.download_user_photo_data(mock_msg)
+        self.assertTrue(os.path.exists(photo))
+        os.remove(photo)
+
+        # The spill file is handed to the background archiver, which deletes it after the upload
+        with patch('polybot.s3_archiver.os.remove', wraps=os.remove) as mock_remove:
+            self.bot.handle_message(mock_msg)
+            self.bot.archiver.shutdown()
+            mock_remove.assert_called_once()
+        self.bot.telegram_bot_client.send_photo.assert_called_once()
+
+    def test_concat_keeps_first_image_locally(self):
+        mock_msg['caption'] = 'Concat'
+
+        self.bot.handle_message(mock_msg)
+        self.bot.s3_client = Mock()
+        self.bot.handle_message(mock_msg)
+
+        self.bot.s3_client.download_fileobj.assert_not_called()
+        self.bot.telegram_bot_client.send_photo.assert_called_once()
+        self.assertNotIn(mock_msg['chat']['id'], self.bot.concat_buffer)
+
+    def album(self, caption, count=3):
+        # Every photo of the album has its own file_unique_id, only the first one carries the caption
+        return group_message([
+            dict(mock_msg, message_id=100 + i, media_group_id='album', caption=caption if i == 0 else None,
+                 photo=[dict(size, file_unique_id=f"{size['file_unique_id']}-{i}") for size in mock_msg['photo']])
+            for i in range(count)
+        ])
+
+    def test_album_is_filtered_and_sent_as_one_album(self):
+        self.bot.telegram_bot_client.send_media_group.return_value = [Mock(), Mock(), Mock()]
+
+        self.bot.handle_message(self.album('Contour'))
+
+        chat_id, media = self.bot.telegram_bot_client.send_media_group.call_args[0]
+        self.assertEqual(mock_msg['chat']['id'], chat_id)
+        self.assertEqual(3, len(media))
+        self.bot.telegram_bot_client.send_photo.assert_not_called()
+        texts = [call[0][1] for call in self.bot.telegram_bot_client.send_message.call_args_list]
+        self.assertEqual(1, sum(text.startswith('Hello') for text in texts))
+
+    def test_album_concat_makes_one_grid(self):
+        self.bot.handle_message(self.album('Concat'))
+
+        self.assertEqual(3, self.bot.telegram_bot_client.get_file.call_count)
+        self.bot.telegram_bot_client.send_photo.assert_called_once()
+        self.assertNotIn(mock_msg['chat']['id'], self.bot.concat_buffer)
+        texts = [call[0][1] for call in self.bot.telegram_bot_client.send_message.call_args_list]
+        self.assertIn('3 images concatenated successfully!', texts)
+
+    @patch('polybot.bot.PREVIEW_MIN_PIXELS', 1)
+    def test_heavy_filter_sends_preview_first(self):
+        mock_msg['caption'] = 'Blur 8 | Contour'
+
+        self.bot.handle_message(mock_msg)
+
+        preview_call, full_call = self.bot.telegram_bot_client.send_photo.call_args_list
+        self.assertEqual(PREVIEW_CAPTION, preview_call.kwargs['caption'])
+        self.assertNotIn('caption', full_call.kwargs)
+        requested = [call.args[0] for call in self.bot.telegram_bot_client.get_file.call_args_list]
+        self.assertEqual([mock_msg['photo'][1]['file_id'], mock_msg['photo'][-1]['file_id']], requested)
+
+    @patch('polybot.bot.PREVIEW_MIN_PIXELS', 1)
+    def test_light_filter_has_no_preview(self):
+        mock_msg['caption'] = 'Contour'
+
+        self.bot.handle_message(mock_msg)
+
+        self.bot.telegram_bot_client.send_photo.assert_called_once()
+
+    def test_preview_size_and_scaling(self):
+        self.assertEqual(mock_msg['photo'][1], preview_size(mock_msg['photo'], max_side=400))
+        self.assertIsNone(preview_size(mock_msg['photo'], max_side=50))
+        self.assertEqual([('blur', 2, 'edge'), ('contour',)], scale_operations([('blur', 8, 'edge'), ('contour',)], 0.25))
+        self.assertEqual([('blur', 1, 'valid')], scale_operations([('blur', 2, 'valid')], 0.1))
+
+    @patch('polybot.bot.PHOTO_SIZE_POLICY', {'segment': {'min_side': 300}})
+    def test_size_policy_downloads_smaller_photo(self):
+        mock_msg['caption'] = 'Segment'
+
+        self.bot.handle_message(mock_msg)
+
+        self.bot.telegram_bot_client.get_file.assert_called_once_with(mock_msg['photo'][1]['file_id'])
+        self.bot.telegram_bot_client.send_photo.assert_called_once()
+
+    @patch('polybot.bot.PHOTO_SIZE_POLICY', {'default': {'max_pixels': 10000}})
+    def test_size_policy_downscales_on_load(self):
+        mock_msg['caption'] = 'Blur 16'
+
+        with patch('polybot.img_proc.Img.blur') as mock_blur:
+            self.bot.handle_message(mock_msg)
+
+        self.assertEqual(2, mock_blur.call_args.args[0])
+
+    def test_size_policy_rules(self):
+        policy = {'segment': {'min_side': 800}, 'contour': {'min_side': 1280, 'max_pixels': 4000000}}
+        self.assertEqual({'min_side': 1280, 'max_pixels': None}, size_policy([('segment', 128), ('contour',)], policy))
+        self.assertEqual({'min_side': None, 'max_pixels': None}, size_policy([('segment', 128), ('blur', 8)], policy))
+        self.assertEqual(mock_msg['photo'][1], select_photo_size(mock_msg['photo'], 320))
+        self.assertEqual(mock_msg['photo'][-1], select_photo_size(mock_msg['photo'], 2560))
+        self.assertEqual(mock_msg['photo'][-1], select_photo_size(mock_msg['photo']))
+
+    def document(self, caption, mime_type='image/jpeg', file_size=4_000_000):
+        msg = {key: value for key, value in mock_msg.items() if key != 'photo'}
+        return dict(msg, caption=caption, document={'file_id': 'document-id', 'file_unique_id': 'document-unique-id',
+                                                    'file_name': 'beatles.jpeg', 'mime_type': mime_type, 'file_size': file_size})
+
+    @patch('polybot.bot.TILED_MIN_PIXELS', 1)
+    def test_large_document_is_filtered_band_by_band(self):
+        with patch('polybot.bot.TiledImg', wraps=TiledImg) as mock_tiled, patch('polybot.img_proc.Img.blur') as mock_blur:
+            self.bot.handle_message(self.document('Blur 4'))
+
+            mock_tiled.assert_called_once()
+            mock_blur.assert_not_called()
+        self.bot.telegram_bot_client.get_file.assert_called_once_with('document-id')
+        photo = self.bot.telegram_bot_client.send_photo.call_args[0][1]
+        self.assertTrue(photo.file.getvalue().startswith(b'\xff\xd8'))
+
+    def test_small_photo_is_not_tiled(self):
+        mock_msg['caption'] = 'Blur 4'
+        with patch('polybot.bot.TiledImg') as mock_tiled:
+            self.bot.handle_message(mock_msg)
+            mock_tiled.assert_not_called()
+        self.bot.telegram_bot_client.send_photo.assert_called_once()
+
+    @patch('polybot.bot.TILED_MIN_PIXELS', 10_000)
+    def test_large_document_is_downscaled_for_other_filters(self):
+        with patch('polybot.img_proc.Img.rotate', autospec=True) as mock_rotate:
+            self.bot.handle_message(self.document('Rotate'))
+
+            img = mock_rotate.call_args[0][0]
+            self.assertLessEqual(img.pixels.shape[0] * img.pixels.shape[1], 10_000)
+        self.bot.telegram_bot_client.send_photo.assert_called_once()
+
+    @patch('polybot.bot.MAX_IMAGE_PIXELS', 100_000)
+    def test_document_over_pixel_limit_is_refused(self):
+        self.bot.handle_message(self.document('Blur'))
+
+        self.bot.telegram_bot_client.send_photo.assert_not_called()
+        self.assertIn('megapixels', self.bot.telegram_bot_client.send_message.call_args[0][1])
+
+    def test_document_over_download_limit_is_refused(self):
+        self.bot.handle_message(self.document('Blur', file_size=30 * 1024 * 1024))
+
+        self.bot.telegram_bot_client.get_file.assert_not_called()
+        self.assertIn('20MB', self.bot.telegram_bot_client.send_message.call_args[0][1])
+
+    def test_only_image_documents_are_photos(self):
+        self.assertNotIn('photo', document_as_photo(self.document('Blur', mime_type='application/pdf')))
+        self.assertEqual(0, document_as_photo(self.document('Blur'))['photo'][0]['width'])
+        self.assertAlmostEqual(8, estimate_cost(self.document('Blur')))
+
+    def test_repeated_filter_is_served_from_cache(self):
+        mock_msg['caption'] = 'Contour'
+        hits = REGISTRY.get_sample_value('polybot_cache_lookups_total', {'cache': 'result', 'result': 'hit'}) or 0
+
+        self.bot.handle_message(mock_msg)
+        self.bot.handle_message(mock_msg)
+
+        self.bot.telegram_bot_client.download_file.assert_called_once()
+        self.assertEqual(self.bot.telegram_bot_client.send_photo.call_count, 2)
+        self.assertEqual(hits + 1, REGISTRY.get_sample_value('polybot_cache_lookups_total', {'cache': 'result', 'result': 'hit'}))
+
+    @patch.dict(os.environ, {'YOLO_URL': 'http://yolo.local/predict'})
+    def test_repeated_prediction_is_served_from_cache(self):
+        self.bot.http_session = Mock()
+        mock_post = self.bot.http_session.post
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {'detections': [{'label': 'person', 'confidence': 0.9}]}
+        mock_msg['caption'] = 'Predict'
+
+        self.bot.handle_message(mock_msg)
+        self.bot.handle_message(mock_msg)
+
+        mock_post.assert_called_once()
+        self.assertIn('person', self.bot.telegram_bot_client.send_message.call_args[0][1])
+
+    def test_failed_upload_is_counted(self):
+        from botocore.exceptions import ClientError
+
+        errors = REGISTRY.get_sample_value('polybot_stage_errors_total', {'stage': 's3_upload', 'filter': ''}) or 0
+        self.bot.s3_client.upload_fileobj.side_effect = ClientError({'Error': {'Code': '500'}}, 'PutObject')
+
+        self.assertIsNone(self.bot.upload_to_s3(b'jpeg'))
+        self.assertEqual(errors + 1, REGISTRY.get_sample_value('polybot_stage_errors_total', {'stage': 's3_upload', 'filter': ''}))
+
+    @patch('polybot.img_proc.Img.encode')
+    def test_contour_with_exception(self, mock_encode):
+        # Photos are processed in memory, so the failure is raised where the result used to be written
+        mock_encode.side_effect = OSError("Read-only file system")
         mock_msg['caption'] = 'Contour'
         retry_keywords = [
             "error", "failed", "issue", "problem", "try again", "retry", "wrong",
@@ -100,5 +307,78 @@ class TestBot(unittest.TestCase):
         self.assertTrue(contains_retry, f"Error message was not sent to the user. Make sure your message contains one of {retry_keywords}")
 
 
+@patch('polybot.bot.TELEGRAM_CERT_PATH', 'no-such-cert.crt')
+class TestWebhookRegistration(unittest.TestCase):
+
+    def setUp(self):
+        self.bot = Bot(token='bot_token', telegram_chat_url='https://bot.example', webhook_registration='skip')
+        self.bot.webhook_ready.clear()
+        self.bot.telegram_bot_client = MagicMock()
+        self.info = self.bot.telegram_bot_client.get_webhook_info.return_value
+
+    def test_webhook_already_set_is_skipped(self):
+        self.info.url = 'https://bot.example/bot_token/'
+        self.info.has_custom_certificate = False
+
+        self.assertFalse(self.bot.register_webhook())
+        self.bot.telegram_bot_client.set_webhook.assert_not_called()
+        self.assertTrue(self.bot.webhook_ready.is_set())
+
+    def test_webhook_is_set_without_removing_it_first(self):
+        self.info.url = 'https://old.example/bot_token/'
+
+        self.assertTrue(self.bot.register_webhook())
+        self.bot.telegram_bot_client.set_webhook.assert_called_once_with(url='https://bot.example/bot_token/', timeout=60)
+        self.bot.telegram_bot_client.remove_webhook.assert_not_called()
+        self.assertTrue(self.bot.webhook_ready.is_set())
+
+    @patch('polybot.bot.time.sleep')
+    def test_background_registration_retries(self, mock_sleep):
+        self.info.url = 'https://old.example/bot_token/'
+        self.bot.telegram_bot_client.set_webhook.side_effect = [ConnectionError('timed out'), True]
+
+        self.bot._register_in_background()
+        self.assertEqual(2, self.bot.telegram_bot_client.set_webhook.call_count)
+        mock_sleep.assert_called_once_with(1.0)
+        self.assertTrue(self.bot.webhook_ready.is_set())
+
+    def test_workers_take_turns_to_register(self):
+        webhook = {'url': ''}
+
+        def set_webhook(url, timeout):
+            time.sleep(0.05)
+            webhook['url'] = url
+
+        clients = []
+        for _ in range(3):
+            client = MagicMock()
+            client.get_webhook_info.side_effect = lambda: Mock(url=webhook['url'], has_custom_certificate=False)
+            client.set_webhook.side_effect = set_webhook
+            clients.append(client)
+        bots = [Bot(token='bot_token', telegram_chat_url='https://bot.example', webhook_registration='skip') for _ in clients]
+        for bot, client in zip(bots, clients):
+            bot.telegram_bot_client = client
+
+        with tempfile.TemporaryDirectory() as lock_dir, \
+                patch('polybot.bot.WEBHOOK_LOCK_PATH', os.path.join(lock_dir, 'webhook.lock')):
+            threads = [threading.Thread(target=bot.register_webhook) for bot in bots]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(1, sum(client.set_webhook.call_count for client in clients))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Bot(token='bot_token', telegram_chat_url='https://bot.example', webhook_registration='later')
+
+    def test_heavy_modules_are_imported_on_first_use(self):
+        code = 'import sys, polybot.bot; print(sorted(m for m in ("boto3", "telebot", "PIL") if m in sys.modules))'
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        self.assertEqual('[]', result.stdout.strip())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from polybot.img_proc import Img, BLUR_MODES
+from polybot.tiled import TiledImg, image_size
+
+img_path = 'polybot/test/beatles.jpeg' if '/polybot/test' not in os.getcwd() else 'beatles.jpeg'
+
+
+class TestTiledImg(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp()
+        # A band size that does not divide the height, so the last band is partial
+        self.tiled = TiledImg(img_path, band_rows=37, scratch_dir=self.scratch_dir)
+        self.img = Img(img_path)
+
+    def tearDown(self):
+        self.tiled.close()
+        os.rmdir(self.scratch_dir)
+
+    def test_decode_matches_img(self):
+        np.testing.assert_array_equal(self.img.pixels, self.tiled.pixels)
+
+    def test_blur_matches_img(self):
+        for mode in BLUR_MODES:
+            with TiledImg(img_path, band_rows=37, scratch_dir=self.scratch_dir) as tiled:
+                img = Img(img_path)
+                tiled.blur(9, mode)
+                img.blur(9, mode)
+                np.testing.assert_array_equal(img.pixels, tiled.pixels)
+
+    def test_chained_filters_match_img(self):
+        for operation, *args in [('blur', 5), ('contour',), ('segment', 20)]:
+            getattr(self.tiled, operation)(*args)
+            getattr(self.img, operation)(*args)
+        np.testing.assert_array_equal(self.img.pixels, self.tiled.pixels)
+
+    def test_only_one_scratch_file_is_kept(self):
+        self.tiled.blur(3)
+        self.tiled.contour()
+        self.assertEqual(1, len(os.listdir(self.scratch_dir)))
+
+    def test_encode_returns_jpeg_and_cleans_up(self):
+        data = self.tiled.encode()
+        self.assertTrue(data.startswith(b'\xff\xd8'))
+        self.assertEqual(1, len(os.listdir(self.scratch_dir)))
+
+    def test_from_bytes(self):
+        with open(img_path, 'rb') as f:
+            with TiledImg(f.read(), scratch_dir=self.scratch_dir) as tiled:
+                np.testing.assert_array_equal(self.img.pixels, tiled.pixels)
+
+    def test_image_size_reads_the_header(self):
+        height, width = self.img.pixels.shape
+        with open(img_path, 'rb') as f:
+            self.assertEqual((width, height), image_size(f.read()))
+        self.assertEqual((width, height), image_size(img_path))
@@ -0,0 +1,164 @@
+import io
+import os
+import tempfile
+import numpy as np
+from polybot.codec import get_codec
+from polybot.img_proc import BLUR_MODES, box_sum, contour_kernel, rgb2gray, segment_kernel
+
+TILED_BAND_ROWS = int(os.getenv('TILED_BAND_ROWS', 256))
+# Operations TiledImg can stream, everything else needs the whole image in memory
+TILED_OPERATIONS = ('blur', 'contour', 'segment')
+
+
+def image_size(source):
+    """
+    (width, height) of an encoded image, read from its header without decoding it
+
+    Parameters:
+    source (str or bytes): Path or encoded bytes of the image
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source) as image:
+        return image.size
+
+
+def _padded_rows(start, stop, height, mode):
+    """
+    Source rows for padded rows start..stop, where padded row 0 is source row 0.
+    Rows that fall in a 'constant' padding are -1.
+    """
+    rows = np.arange(start, stop)
+    if mode == 'edge':
+        return np.clip(rows, 0, height - 1)
+    if mode == 'reflect':
+        period = 2 * (height - 1) if height > 1 else 1
+        rows = np.abs(rows) % period
+        return np.where(rows >= height, period - rows, rows)
+    return np.where((rows >= 0) & (rows < height), rows, -1)
+
+
+class TiledImg:
+    """
+    Grayscale image kept in a memory-mapped scratch file and filtered band by band
+
+    Only one band of rows (plus the overlap a filter needs) is in memory at a time, so filter memory
+    stays bounded regardless of the image size. Decoding is not: Pillow holds the whole image once in
+    the mode it is stored in, e.g. 3 bytes per pixel for a JPEG, before it is converted to float32
+    grayscale one band at a time, so callers cap the pixel count (see MAX_IMAGE_PIXELS in polybot.bot).
+
+    Parameters:
+    source (str or bytes): Path or encoded bytes of the image
+    band_rows (int): Rows processed per band
+    scratch_dir (str, optional): Directory for the scratch files, defaults to the system temp dir
+    """
+
+    def __init__(self, source, band_rows=TILED_BAND_ROWS, scratch_dir=None):
+        self.band_rows = band_rows
+        self.scratch_dir = scratch_dir
+        self.pixels = None
+
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+
+        from PIL import Image
+
+        with Image.open(source) as image:
+            width, height = image.size
+            self._replace(self._scratch((height, width)))
+            for start in range(0, height, band_rows):
+                stop = min(start + band_rows, height)
+                band = image.crop((0, start, width, stop))
+                self.pixels[start:stop] = rgb2gray(np.asarray(band.convert('RGB')))
+
+    def _scratch_name(self):
+        scratch = tempfile.NamedTemporaryFile(dir=self.scratch_dir, suffix='.pixels', delete=False)
+        scratch.close()
+        return scratch.name
+
+    def _scratch(self, shape):
+        return np.memmap(self._scratch_name(), dtype=np.float32, mode='w+', shape=shape)
+
+    def _replace(self, pixels):
+        old = self.pixels
+        self.pixels = pixels
+        if old is not None:
+            filename = old.filename
+            del old
+            os.remove(filename)
+
+    def _bands(self, height):
+        for start in range(0, height, self.band_rows):
+            yield start, min(start + self.band_rows, height)
+
+    def _map_rows(self, kernel, width):
+        height = self.pixels.shape[0]
+        out = self._scratch((height, width))
+        for start, stop in self._bands(height):
+            out[start:stop] = kernel(self.pixels[start:stop])
+        self._replace(out)
+
+    def contour(self):
+        self._map_rows(contour_kernel(), self.pixels.shape[1] - 1)
+
+    def segment(self, threshold=128):
+        self._map_rows(segment_kernel(threshold), self.pixels.shape[1])
+
+    def blur(self, blur_level=16, mode='valid'):
+        """
+        Same result as Img.blur, each band reads blur_level - 1 extra rows of overlap
+        """
+        if blur_level < 1:
+            raise ValueError("Blur level must be a positive integer")
+        if mode not in BLUR_MODES:
+            raise ValueError(f"Blur mode must be one of {BLUR_MODES}")
+
+        height, width = self.pixels.shape
+        if mode == 'valid':
+            before = after = 0
+            out_shape = (max(height - blur_level + 1, 0), max(width - blur_level + 1, 0))
+        else:
+            before = (blur_level - 1) // 2
+            after = blur_level - 1 - before
+            out_shape = (height, width)
+
+        out = self._scratch(out_shape)
+        for start, stop in self._bands(out_shape[0]):
+            rows = _padded_rows(start - before, stop + blur_level - 1 - before, height, mode)
+            band = self.pixels[np.maximum(rows, 0)]
+            band[rows < 0] = 0
+            if mode != 'valid':
+                band = np.pad(band, ((0, 0), (before, after)), mode=mode)
+            out[start:stop] = np.floor_divide(box_sum(band, blur_level), blur_level ** 2)
+        self._replace(out)
+
+    def encode(self, format='jpeg', **options):
+        """
+        Encode as single-channel grayscale, stretched to 0-255 like Img.encode
+        """
+        height, width = self.pixels.shape
+        low, high = np.inf, -np.inf
+        for start, stop in self._bands(height):
+            band = self.pixels[start:stop]
+            low, high = min(low, band.min()), max(high, band.max())
+        scale = 255 / (high - low) if high > low else 0
+
+        gray = np.memmap(self._scratch_name(), dtype=np.uint8, mode='w+', shape=(height, width))
+        try:
+            for start, stop in self._bands(height):
+                gray[start:stop] = np.round((self.pixels[start:stop] - low) * scale)
+            return get_codec().encode_gray8(gray, format, **options)
+        finally:
+            filename = gray.filename
+            del gray
+            os.remove(filename)
+
+    def close(self):
+        """Remove the scratch file"""
+        self._replace(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()